@@ -1,12 +1,48 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import sqlite3
-from datetime import datetime
+import os
+import sys
+import threading
+import importlib.util
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
 from typing import Optional, List, Tuple
 
+from db_schema import LOCAL_NOW_SQL, TRACKED_TABLES, connect, upgrade_schema
+from audit_journal import journal_entries, prune_journal
+from pricing import CUSTOMER_TIERS, PROMOTION_KINDS, PricingEngine, describe_promotion
+from receipts import FORMATS, generate_invoices, make_pool, submit_receipt
+from customer_history import PAGE_SIZE, customer_summary, purchase_page
+from price_history import price_as_of, price_history
+from sales_archive import archive_sales, lifetime_totals
+from change_tracker import CHANGE_POLL_MS, CHANGE_PRUNE_MS, ChangeTracker, changed_ids, prune_changes
+from backup_db import (BACKUP_INTERVAL_MS, backup_database, list_backups,
+                       restore_backup, rotate_backups)
+from startup import StartupProfiler, load_snapshot, save_snapshot
+from row_store import RowStore
+from write_queue import WriteQueue
+from query_cache import QueryCache
+from replica import Replica
+from ui_metrics import UIMetrics, measured, metrics_log_path
+from customer_match import find_by_phone, find_duplicates, merge_duplicates, phone_key, phone_search_range
+from categories import add_category, category_tree, delete_category, subtree_filter, subtree_ids
+from sync import SYNC_INTERVAL_MS, SYNC_PORT, sync_with_peer
+from stores import StoreGroup, load_stores, save_stores
+from maintenance import (IDLE_SECONDS, MAINTENANCE_INTERVAL_MS, database_stats,
+                         enable_incremental_vacuum, read_maintenance_log, run_maintenance)
+
+# Demand forecasting needs NumPy; the dashboard works without it. The module
+# is imported on first use so NumPy's import cost stays out of startup.
+FORECAST_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
 class StoreInventoryApp:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None):
         self.root = root
+        self.profiler = profiler or StartupProfiler(False)
         self.root.title("Store Inventory Management System")
         self.root.geometry("1200x700")
         self.root.minsize(1000, 600)
@@ -30,11 +66,218 @@ class StoreInventoryApp:
         
         self.db_name = 'store_inventory.db'
         self.current_frame = None
-        
+        self.backup_thread = None
+        self.last_backup = None
+        self.forecast_thread = None
+        self.last_forecast = None
+        self.receipt_pool = None
+        self.invoice_thread = None
+        self.last_invoices = None
+        self.change_tracker = None
+        self.maintenance_thread = None
+        self.store_group = None
+        # Head office to sync with, as host[:port]; unset means no syncing
+        self.sync_peer = os.environ.get('STORE_SYNC_PEER')
+        self.sync_thread = None
+        self.last_sync = None
+        # STORE_READ_REPLICA=1 serves list and report queries from memory
+        self.replica = None
+        self.replica_error = None
+        # Bumped when the database file is replaced; a replica seeded from
+        # an older file is thrown away instead of attached
+        self.replica_generation = 0
+        self.last_maintenance = None
+        self.last_activity = time.monotonic()
+        # (widget, handler) for the screen that wants live row updates
+        self.live_view = None
+        # What the tables show, keyed by row id (the Treeview iid), so dialogs
+        # don't parse display strings or re-query; the product and customer
+        # stores double as the catalog for the sale dialogs
+        self.product_rows = RowStore((('name', str), ('price', 'd'), ('id_category', 'q')))
+        self.customer_rows = RowStore((('name', str), ('phone', str), ('tier', str)))
+        self.sale_rows = RowStore((('id_product', 'q'), ('id_customer', 'q'), ('product', str),
+                                   ('customer', str), ('quantity', 'q'), ('total', 'd')))
+        
+        self.prepare_database()
+        self.write_queue = WriteQueue(self.db_name)
+        self.query_cache = QueryCache(self.db_name)
+        self.ui_metrics = UIMetrics(self.root, metrics_log_path(self.db_name),
+                                    lambda: self.query_cache.compute_seconds)
+        # STORE_UI_METRICS=1 measures from the first screen on
+        if os.environ.get('STORE_UI_METRICS') == '1':
+            self.ui_metrics.enable()
+        if os.environ.get('STORE_READ_REPLICA') == '1':
+            self.start_replica()
+        self.profiler.mark("prepare database")
         self.setup_styles()
+        self.profiler.mark("styles")
         self.create_main_layout()
+        self.profiler.mark("main layout")
+        # Only the dashboard shell is built here; its figures load on a worker
+        # thread and the other screens are built when first opened
         self.show_dashboard()
+        self.profiler.mark("dashboard shell")
+        self.root.after_idle(lambda: self.profiler.mark("first paint"))
+        self.root.after(BACKUP_INTERVAL_MS, self.scheduled_backup)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        self.root.after(30000, self.prune_change_log)
+        self.root.after(MAINTENANCE_INTERVAL_MS, self.scheduled_maintenance)
+        if self.sync_peer:
+            self.root.after(SYNC_INTERVAL_MS, self.scheduled_sync)
+        # Any key or click counts as activity; maintenance only runs when idle
+        self.root.bind_all('<Any-KeyPress>', self.note_activity, add='+')
+        self.root.bind_all('<Any-ButtonPress>', self.note_activity, add='+')
+        self.root.bind_all('<Control-Shift-M>', lambda event: self.ui_metrics.toggle())
+        
+    def prepare_database(self):
+        try:
+            conn = self.get_db_connection()
+            upgrade_schema(conn)
+            conn.close()
+            self.change_tracker = ChangeTracker(self.db_name)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to upgrade database: {e}")
+    
+    def start_replica(self):
+        # Seeding copies the whole file on a worker thread; until it is done
+        # reads go to the file. The replica is attached on the Tk thread, so
+        # database_replaced() can't run between the check and the attach.
+        generation = self.replica_generation
+        result = {}
+        
+        def run():
+            try:
+                result['replica'] = Replica(self.db_name)
+            except sqlite3.Error as e:
+                result['error'] = str(e)
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                self.root.after(100, poll)
+                return
+            replica = result.get('replica')
+            if generation != self.replica_generation:
+                # Seeded from a file that has since been replaced
+                if replica is not None:
+                    replica.close()
+                return
+            if replica is None:
+                self.replica_error = result['error']
+                return
+            replica.start()
+            self.query_cache.attach_replica(replica)
+            self.replica = replica
         
+        self.root.after(100, poll)
+    
+    def replica_status_text(self):
+        if self.replica is None:
+            if self.replica_error:
+                return f"Read replica failed to start: {self.replica_error}"
+            if os.environ.get('STORE_READ_REPLICA') == '1':
+                return "Read replica is loading"
+            return "Read replica is off (set STORE_READ_REPLICA=1)"
+        stats = self.replica.stats()
+        text = (f"Read replica: {stats['memory_bytes'] / (1024 * 1024):.1f} MB in memory, "
+                f"seeded in {stats['seed_ms']:.0f} ms, {stats['applied']} changes applied, "
+                f"lag {stats['last_lag_ms']:.0f} ms (p95 {stats['lag_p95_ms']:.0f}, "
+                f"max {stats['max_lag_ms']:.0f}), {stats['reseeds']} reseeds")
+        if stats['last_error']:
+            text += f"\nLast catch-up failed: {stats['last_error']}"
+        return text
+    
+    def prune_change_log(self):
+        # A queued write like any other; the Tk thread doesn't wait for it,
+        # and a failed prune is simply retried next time
+        try:
+            self.write_queue.submit(prune_changes)
+        except sqlite3.Error:
+            pass
+        self.root.after(CHANGE_PRUNE_MS, self.prune_change_log)
+    
+    def poll_changes(self):
+        # Picks up commits from other tills and hands the changed rows to the
+        # open screen instead of reloading it
+        try:
+            if self.change_tracker:
+                changes = self.change_tracker.poll()
+                if changes is None:
+                    # The file was replaced under us (a backup restored)
+                    self.database_replaced()
+                elif changes:
+                    self.sync_row_stores(changes)
+                if changes and self.live_view and self.live_view[0].winfo_exists():
+                    self.live_view[1](changes)
+        except sqlite3.Error:
+            pass
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        
+    def database_replaced(self):
+        # Everything that follows the file through its ChangeLog or journal
+        # starts over; screens showing rows from the old file are rebuilt
+        self.replica_generation += 1
+        replica, self.replica = self.replica, None
+        self.query_cache.reset()
+        if replica is not None:
+            replica.close()
+        if replica is not None or os.environ.get('STORE_READ_REPLICA') == '1':
+            self.replica_error = None
+            self.start_replica()
+        if self.change_tracker:
+            self.change_tracker.close()
+        self.change_tracker = ChangeTracker(self.db_name)
+        for store in (self.product_rows, self.customer_rows, self.sale_rows):
+            store.clear()
+        self.show_dashboard()
+    
+    def catalog_sources(self):
+        # (store, table, query reading the store's columns after the id)
+        return ((self.product_rows, 'Product',
+                 "SELECT id_product, name, price, COALESCE(id_category, 0) FROM Product"),
+                (self.customer_rows, 'Customer', "SELECT id_customer, name, phone, tier FROM Customer"))
+    
+    def catalog_row(self, table, row_id):
+        # The row as its store holds it, read from the database when the
+        # store doesn't have it (cleared after a large change, or never
+        # loaded); None if the row no longer exists
+        for store, source_table, query in self.catalog_sources():
+            if source_table != table:
+                continue
+            row = store.get(row_id)
+            if row is not None:
+                return row
+            conn = self.get_db_connection()
+            found = conn.execute(f"{query} WHERE {TRACKED_TABLES[table]} = ?", (row_id,)).fetchone()
+            conn.close()
+            return found[1:] if found else None
+        raise KeyError(table)
+    
+    def row_gone(self, what, refresh):
+        messagebox.showerror("Not Found", f"This {what} no longer exists")
+        refresh()
+    
+    def sync_row_stores(self, changes):
+        # Keep the catalog stores current whichever screen is open
+        for store, table, query in self.catalog_sources():
+            ids = changed_ids(changes, table)
+            if not ids or not (len(store) or store.complete):
+                continue
+            if len(ids) > 500:
+                store.clear()
+                continue
+            key = TRACKED_TABLES[table]
+            conn = self.get_db_connection()
+            rows = conn.execute(f"{query} WHERE {key} IN ({','.join('?' * len(ids))})",
+                                list(ids)).fetchall()
+            conn.close()
+            for row in rows:
+                store.put(row[0], row[1:])
+            for row_id in ids - {row[0] for row in rows}:
+                store.remove(row_id)
+    
     def setup_styles(self):
         style = ttk.Style()
         style.theme_use('clam')
@@ -120,7 +363,13 @@ class StoreInventoryApp:
             ("📊 Dashboard", self.show_dashboard),
             ("📦 Products", self.show_products),
             ("👥 Customers", self.show_customers),
-            ("💰 Sales", self.show_sales)
+            ("💰 Sales", self.show_sales),
+            ("🏷 Promotions", self.show_promotions),
+            ("📜 Journal", self.show_journal),
+            ("🏬 Stores", self.show_stores),
+            ("💾 Backups", self.show_backups),
+            ("🛠 Maintenance", self.show_maintenance),
+            ("🔬 Diagnostics", self.show_diagnostics)
         ]
         
         for text, command in nav_buttons:
@@ -132,13 +381,22 @@ class StoreInventoryApp:
         self.main_container = ttk.Frame(self.root, style='Main.TFrame')
         self.main_container.pack(side='right', fill='both', expand=True)
         
+    @measured('teardown')
     def clear_main_container(self):
+        self.live_view = None
         for widget in self.main_container.winfo_children():
             widget.destroy()
             
     def get_db_connection(self):
-        return sqlite3.connect(self.db_name)
+        return connect(self.db_name)
+    
+    def execute_write(self, sql, params=()):
+        # Goes through the group-commit queue: committed at once, or with
+        # whatever else was queued meanwhile, and only returns once on disk.
+        # Returns the lastrowid; errors are raised here as sqlite3.Error.
+        return self.write_queue.execute(sql, params)
     
+    @measured('build')
     def show_dashboard(self):
         self.clear_main_container()
         
@@ -154,60 +412,208 @@ class StoreInventoryApp:
         tk.Label(header, text=current_time, bg=self.colors['light'],
                 fg=self.colors['secondary'], font=('Segoe UI', 11)).pack(side='right')
         
+        # Restock suggestions, packed first so the cards shrink before it does
+        restock_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        restock_frame.pack(side='bottom', fill='x', padx=30, pady=(0, 30))
+        restock = self.build_restock_panel(restock_frame)
+        
         # Statistics cards
         stats_frame = tk.Frame(self.main_container, bg=self.colors['light'])
         stats_frame.pack(fill='both', expand=True, padx=30, pady=10)
         
-        try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get statistics
-            cursor.execute("SELECT COUNT(*) FROM Product")
-            total_products = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM Customer")
-            total_customers = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM Sale")
-            total_sales = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT SUM(total_price) FROM Sale")
-            total_revenue = cursor.fetchone()[0] or 0
-            
-            conn.close()
+        # Draw the last figures this till saw, then load live ones in the background
+        snapshot = load_snapshot(self.db_name)
+        stats = self.dashboard_stats(snapshot.get('counts') if snapshot else None)
+        value_labels = []
+        
+        for i, (label, value, color, icon) in enumerate(stats):
+            card = tk.Frame(stats_frame, bg=color, relief='flat', bd=0)
+            card.grid(row=i//2, column=i%2, padx=15, pady=15, sticky='nsew')
             
-            stats = [
-                ("Total Products", total_products, self.colors['card1'], "📦"),
-                ("Total Customers", total_customers, self.colors['card2'], "👥"),
-                ("Total Sales", total_sales, self.colors['card3'], "💰"),
-                ("Total Revenue", f"${total_revenue:.2f}", self.colors['card4'], "💵")
-            ]
+            content_frame = tk.Frame(card, bg=color)
+            content_frame.pack(expand=True, pady=40, padx=30)
             
-            for i, (label, value, color, icon) in enumerate(stats):
-                card = tk.Frame(stats_frame, bg=color, relief='flat', bd=0)
-                card.grid(row=i//2, column=i%2, padx=15, pady=15, sticky='nsew')
-                
-                content_frame = tk.Frame(card, bg=color)
-                content_frame.pack(expand=True, pady=40, padx=30)
-                
-                tk.Label(content_frame, text=icon, bg=color, fg=self.colors['white'],
-                        font=('Segoe UI', 32)).pack()
-                
-                tk.Label(content_frame, text=str(value), bg=color, fg=self.colors['white'],
-                        font=('Segoe UI', 28, 'bold')).pack(pady=(10, 5))
-                
-                tk.Label(content_frame, text=label, bg=color, fg=self.colors['white'],
-                        font=('Segoe UI', 12)).pack()
+            tk.Label(content_frame, text=icon, bg=color, fg=self.colors['white'],
+                    font=('Segoe UI', 32)).pack()
             
-            stats_frame.grid_rowconfigure(0, weight=1)
-            stats_frame.grid_rowconfigure(1, weight=1)
-            stats_frame.grid_columnconfigure(0, weight=1)
-            stats_frame.grid_columnconfigure(1, weight=1)
+            value_label = tk.Label(content_frame, text=str(value), bg=color, fg=self.colors['white'],
+                                  font=('Segoe UI', 28, 'bold'))
+            value_label.pack(pady=(10, 5))
+            value_labels.append(value_label)
             
+            tk.Label(content_frame, text=label, bg=color, fg=self.colors['white'],
+                    font=('Segoe UI', 12)).pack()
+        
+        stats_frame.grid_rowconfigure(0, weight=1)
+        stats_frame.grid_rowconfigure(1, weight=1)
+        stats_frame.grid_columnconfigure(0, weight=1)
+        stats_frame.grid_columnconfigure(1, weight=1)
+        
+        def apply_counts(counts):
+            for value_label, stat in zip(value_labels, self.dashboard_stats(counts)):
+                value_label.config(text=str(stat[1]))
+        
+        self.live_view = (stats_frame, lambda changes: self.refresh_dashboard(stats_frame, apply_counts))
+        self.refresh_dashboard(stats_frame, apply_counts, restock)
+    
+    def query_dashboard_counts(self):
+        # Runs on a worker thread; the query cache is safe to share
+        total_products = self.query_cache.query("SELECT COUNT(*) FROM Product")[0][0]
+        total_customers = self.query_cache.query("SELECT COUNT(*) FROM Customer")[0][0]
+        
+        # Includes archived periods via their recorded totals
+        total_sales, total_revenue = self.query_cache.cached(('lifetime_totals',), lifetime_totals)
+        
+        return [total_products, total_customers, total_sales, total_revenue]
+    
+    def dashboard_stats(self, counts=None):
+        # Card definitions; "..." until the first figures are known
+        if counts:
+            total_products, total_customers, total_sales, total_revenue = counts
+            total_revenue = f"${total_revenue:.2f}"
+        else:
+            total_products = total_customers = total_sales = total_revenue = "..."
+        
+        return [
+            ("Total Products", total_products, self.colors['card1'], "📦"),
+            ("Total Customers", total_customers, self.colors['card2'], "👥"),
+            ("Total Sales", total_sales, self.colors['card3'], "💰"),
+            ("Total Revenue", total_revenue, self.colors['card4'], "💵")
+        ]
+    
+    def refresh_dashboard(self, widget, apply_counts, restock=None):
+        result = {}
+        
+        def run():
+            try:
+                result['counts'] = self.query_dashboard_counts()
+                if restock:
+                    result['restock'] = self.query_restock()
+            except sqlite3.Error as e:
+                result['error'] = e
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                self.root.after(30, poll)
+                return
+            self.profiler.mark("dashboard data")
+            self.profiler.report()
+            if 'error' in result:
+                if widget.winfo_exists():
+                    messagebox.showerror("Database Error", f"Failed to load statistics: {result['error']}")
+                return
+            save_snapshot(self.db_name, {'counts': result['counts'],
+                                         'saved_at': datetime.now().isoformat(timespec='seconds')})
+            if not widget.winfo_exists():
+                return
+            apply_counts(result['counts'])
+            if restock:
+                self.fill_restock(*restock, result['restock'])
+        
+        self.root.after(30, poll)
+    
+    def build_restock_panel(self, parent):
+        title_row = tk.Frame(parent, bg=self.colors['light'])
+        title_row.pack(fill='x', pady=(0, 10))
+        
+        tk.Label(title_row, text="Restock Suggestions", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 14, 'bold')).pack(side='left')
+        
+        if not FORECAST_AVAILABLE:
+            tk.Label(parent, text="Install NumPy to enable demand forecasting",
+                    bg=self.colors['light'], fg=self.colors['secondary'],
+                    font=('Segoe UI', 10)).pack(anchor='w')
+            return None
+        
+        status_label = tk.Label(title_row, text="Loading...", bg=self.colors['light'],
+                               fg=self.colors['secondary'], font=('Segoe UI', 10))
+        status_label.pack(side='left', padx=15)
+        
+        ttk.Button(title_row, text="↻ Recompute",
+                  command=lambda: self.recompute_forecast(tree, status_label),
+                  style='Action.TButton').pack(side='right')
+        
+        tree = ttk.Treeview(parent, columns=('Product', 'MA7', 'MA28', 'Reorder', 'Order'),
+                           show='headings', height=5)
+        tree.pack(fill='x')
+        
+        tree.heading('Product', text='Product')
+        tree.heading('MA7', text='7-day avg/day')
+        tree.heading('MA28', text='28-day avg/day')
+        tree.heading('Reorder', text='Reorder Point')
+        tree.heading('Order', text='Suggested Order')
+        
+        tree.column('Product', width=250, anchor='w')
+        tree.column('MA7', width=120, anchor='e')
+        tree.column('MA28', width=120, anchor='e')
+        tree.column('Reorder', width=120, anchor='e')
+        tree.column('Order', width=130, anchor='e')
+        
+        return tree, status_label
+    
+    def query_restock(self):
+        import forecast
+        conn = self.get_db_connection()
+        rows = forecast.top_reorders(conn)
+        conn.close()
+        return rows
+    
+    @measured('populate')
+    def load_restock(self, tree, status_label):
+        try:
+            rows = self.query_restock()
         except sqlite3.Error as e:
-            messagebox.showerror("Database Error", f"Failed to load statistics: {e}")
+            status_label.config(text=f"Failed to load forecast: {e}")
+            return
+        self.fill_restock(tree, status_label, rows)
+    
+    def fill_restock(self, tree, status_label, rows):
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        for product_id, name, ma7, ma28, reorder_point, suggested_order, computed_at in rows:
+            tree.insert('', 'end', iid=str(product_id),
+                       values=(name, f"{ma7:.2f}", f"{ma28:.2f}", f"{reorder_point:.1f}", suggested_order))
+        
+        if rows:
+            status_label.config(text=f"Computed {rows[0][6]}")
+        else:
+            status_label.config(text="No forecast yet - press Recompute")
+    
+    def recompute_forecast(self, tree, status_label):
+        if self.forecast_thread and self.forecast_thread.is_alive():
+            return
+        
+        def run():
+            import forecast
+            try:
+                self.last_forecast = forecast.refresh_forecast(self.db_name)
+            except sqlite3.Error as e:
+                self.last_forecast = e
+        
+        self.forecast_thread = threading.Thread(target=run, daemon=True)
+        self.forecast_thread.start()
+        status_label.config(text="Forecasting...")
+        
+        def poll():
+            if self.forecast_thread.is_alive():
+                self.root.after(200, poll)
+                return
+            if not tree.winfo_exists():
+                return
+            if isinstance(self.last_forecast, Exception):
+                status_label.config(text=f"Forecast failed: {self.last_forecast}")
+                return
+            self.load_restock(tree, status_label)
+            count, seconds = self.last_forecast
+            status_label.config(text=f"Forecast {count} products in {seconds:.2f}s")
+        
+        self.root.after(200, poll)
     
+    @measured('build')
     def show_products(self):
         self.clear_main_container()
         
@@ -250,9 +656,38 @@ class StoreInventoryApp:
                   command=lambda: self.delete_product(tree),
                   style='Delete.TButton').pack(side='left', padx=5)
         
+        body = tk.Frame(self.main_container, bg=self.colors['light'])
+        body.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        # Category browser; selecting a category shows its whole subtree
+        category_frame = tk.Frame(body, bg=self.colors['light'], width=300)
+        category_frame.pack(side='left', fill='y', padx=(0, 15))
+        category_frame.pack_propagate(False)
+        
+        category_buttons = tk.Frame(category_frame, bg=self.colors['light'])
+        category_buttons.pack(side='bottom', fill='x', pady=(10, 0))
+        
+        ttk.Button(category_buttons, text="➕ Category",
+                  command=lambda: self.add_category_dialog(category_tree_view),
+                  style='Action.TButton').pack(side='left', padx=(0, 5))
+        
+        ttk.Button(category_buttons, text="🗑",
+                  command=lambda: self.delete_category(category_tree_view),
+                  style='Delete.TButton').pack(side='left')
+        
+        category_tree_view = ttk.Treeview(category_frame, columns=('Products', 'Revenue'),
+                                          show='tree headings', selectmode='browse')
+        category_tree_view.pack(fill='both', expand=True)
+        category_tree_view.heading('#0', text='Category')
+        category_tree_view.heading('Products', text='Products')
+        category_tree_view.heading('Revenue', text='Revenue')
+        category_tree_view.column('#0', width=140)
+        category_tree_view.column('Products', width=65, anchor='e')
+        category_tree_view.column('Revenue', width=85, anchor='e')
+        
         # Table
-        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
-        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        table_frame = tk.Frame(body, bg=self.colors['white'])
+        table_frame.pack(side='left', fill='both', expand=True)
         
         scrollbar = ttk.Scrollbar(table_frame)
         scrollbar.pack(side='right', fill='y')
@@ -270,38 +705,185 @@ class StoreInventoryApp:
         tree.column('Name', width=300, anchor='w')
         tree.column('Price', width=150, anchor='e')
         
+        def selected_category():
+            selection = category_tree_view.selection()
+            return int(selection[0]) if selection and selection[0] != 'all' else None
+        
         def search_products(*args):
-            self.load_products(tree, search_var.get())
+            self.load_products(tree, search_var.get(), selected_category())
         
         search_var.trace('w', search_products)
+        category_tree_view.bind('<<TreeviewSelect>>', search_products)
+        
+        def apply_changes(changes):
+            self.apply_product_changes(tree, changes, search_var.get(), selected_category())
+            if changed_ids(changes, 'Product') or changed_ids(changes, 'Sale'):
+                self.load_categories(category_tree_view)
         
+        self.load_categories(category_tree_view)
         self.load_products(tree)
+        self.live_view = (tree, apply_changes)
+    
+    @measured('populate')
+    def load_categories(self, tree):
+        selection = tree.selection()
+        opened = {item for item in self.all_tree_items(tree) if tree.item(item, 'open')}
+        tree.delete(*tree.get_children())
+        
+        try:
+            conn = self.get_db_connection()
+            categories = category_tree(conn)
+            total = conn.execute("SELECT COUNT(*) FROM Product").fetchone()[0]
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load categories: {e}")
+            return
+        
+        tree.insert('', 'end', iid='all', text="All products", values=(total, ""), open=True)
+        for category_id, name, parent_id, depth, products, revenue in categories:
+            iid = str(category_id)
+            tree.insert(str(parent_id) if parent_id else 'all', 'end', iid=iid, text=name,
+                       values=(products, f"${revenue:.2f}"), open=iid in opened)
+        
+        if selection and tree.exists(selection[0]):
+            tree.selection_set(selection[0])
+    
+    def all_tree_items(self, tree, parent=''):
+        for item in tree.get_children(parent):
+            yield item
+            yield from self.all_tree_items(tree, item)
+    
+    def category_choices(self):
+        # [(id or None, label)] for the product dialogs, indented by depth
+        conn = self.get_db_connection()
+        categories = category_tree(conn)
+        conn.close()
+        return [(None, "(No category)")] + [
+            (category_id, "    " * depth + name) for category_id, name, _, depth, _, _ in categories]
+    
+    def category_combo(self, form_frame, row, current=None):
+        # Category picker for the product dialogs; selected_id() gives the id
+        choices = self.category_choices()
+        
+        tk.Label(form_frame, text="Category:", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=row, column=0, sticky='w', pady=(0, 5))
+        
+        combo = ttk.Combobox(form_frame, state='readonly', width=28, font=('Segoe UI', 11),
+                            values=[label for _, label in choices])
+        combo.grid(row=row + 1, column=0, pady=(0, 20))
+        ids = [category_id for category_id, _ in choices]
+        combo.current(ids.index(current) if current in ids else 0)
+        combo.selected_id = lambda: ids[combo.current()] if combo.current() >= 0 else None
+        return combo
+    
+    def add_category_dialog(self, tree):
+        selection = tree.selection()
+        parent_id = int(selection[0]) if selection and selection[0] != 'all' else None
+        parent_name = tree.item(selection[0], 'text') if parent_id else None
+        
+        prompt = f"New category under '{parent_name}':" if parent_name else "New top-level category:"
+        name = simpledialog.askstring("Add Category", prompt, parent=self.root)
+        if not name or not name.strip():
+            return
+        
+        try:
+            self.write_queue.write(lambda conn: add_category(conn, name.strip(), parent_id))
+            self.load_categories(tree)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to add category: {e}")
+    
+    def delete_category(self, tree):
+        selection = tree.selection()
+        if not selection or selection[0] == 'all':
+            messagebox.showwarning("Selection Error", "Please select a category to delete")
+            return
+        
+        name = tree.item(selection[0], 'text')
+        if messagebox.askyesno("Confirm Delete",
+                              f"Delete category '{name}'?\nIts products move to the parent category."):
+            try:
+                category_id = int(selection[0])
+                self.write_queue.write(lambda conn: delete_category(conn, category_id))
+                tree.selection_set('all')
+                self.load_categories(tree)
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to delete category: {e}")
         
-    def load_products(self, tree, search_term=''):
+    @measured('populate')
+    def load_products(self, tree, search_term='', category_id=None):
         for item in tree.get_children():
             tree.delete(item)
         
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
+            conditions, params = [], []
             if search_term:
-                cursor.execute("SELECT id_product, name, price FROM Product WHERE name LIKE ?",
-                             (f'%{search_term}%',))
+                conditions.append("p.name LIKE ?")
+                params.append(f'%{search_term}%')
+            if category_id:
+                condition, category_params = subtree_filter(category_id)
+                conditions.append(condition)
+                params.extend(category_params)
+            
+            query = "SELECT p.id_product, p.name, p.price, COALESCE(p.id_category, 0) FROM Product p"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
             else:
-                cursor.execute("SELECT id_product, name, price FROM Product")
+                self.product_rows.clear()
             
-            for row in cursor.fetchall():
-                tree.insert('', 'end', values=(row[0], row[1], f"${row[2]:.2f}"))
+            for row in self.query_cache.query(query, params):
+                self.product_rows.put(row[0], row[1:])
+                tree.insert('', 'end', iid=str(row[0]), values=(row[0], row[1], f"${row[2]:.2f}"))
             
-            conn.close()
+            if not conditions:
+                self.product_rows.complete = True
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Failed to load products: {e}")
     
+    @measured('update')
+    def apply_row_changes(self, tree, ids, rows, index='end'):
+        # Upsert the re-queried rows; ids that came back empty were deleted
+        # or no longer match the current filter
+        found = set()
+        for row_id, values in rows:
+            iid = str(row_id)
+            found.add(iid)
+            if tree.exists(iid):
+                tree.item(iid, values=values)
+            else:
+                tree.insert('', index, iid=iid, values=values)
+        
+        for row_id in ids:
+            iid = str(row_id)
+            if iid not in found and tree.exists(iid):
+                tree.delete(iid)
+    
+    def apply_product_changes(self, tree, changes, search_term='', category_id=None):
+        # sync_row_stores has already refreshed the changed rows
+        ids = changed_ids(changes, 'Product')
+        if not ids:
+            return
+        if len(ids) > 500 or not self.product_rows.complete:
+            self.load_products(tree, search_term, category_id)
+            return
+        
+        categories = None
+        if category_id:
+            conn = self.get_db_connection()
+            categories = subtree_ids(conn, category_id)
+            conn.close()
+        
+        term = search_term.lower()
+        rows = []
+        for product_id in ids:
+            row = self.product_rows.get(product_id)
+            if row and term in row[0].lower() and (categories is None or row[2] in categories):
+                rows.append((product_id, (product_id, row[0], f"${row[1]:.2f}")))
+        self.apply_row_changes(tree, ids, rows)
+    
     def add_product_dialog(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Add Product")
-        dialog.geometry("400x250")
+        dialog.geometry("400x320")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -330,6 +912,8 @@ class StoreInventoryApp:
         price_entry = ttk.Entry(form_frame, width=30, font=('Segoe UI', 11))
         price_entry.grid(row=3, column=0, pady=(0, 20))
         
+        category_combo = self.category_combo(form_frame, 4)
+        
         def save_product():
             name = name_entry.get().strip()
             price_str = price_entry.get().strip()
@@ -344,11 +928,8 @@ class StoreInventoryApp:
                     messagebox.showwarning("Input Error", "Price cannot be negative")
                     return
                 
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Product (name, price) VALUES (?, ?)", (name, price))
-                conn.commit()
-                conn.close()
+                self.execute_write("INSERT INTO Product (name, price, id_category) VALUES (?, ?, ?)",
+                             (name, price, category_combo.selected_id()))
                 
                 messagebox.showinfo("Success", "Product added successfully")
                 dialog.destroy()
@@ -359,7 +940,7 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to add product: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=4, column=0, pady=(10, 0))
+        button_frame.grid(row=6, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Save", command=save_product,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
@@ -373,15 +954,20 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a product to edit")
             return
         
-        item = tree.item(selection[0])
-        values = item['values']
-        product_id = values[0]
-        current_name = values[1]
-        current_price = float(values[2].replace('$', ''))
+        product_id = int(selection[0])
+        try:
+            row = self.catalog_row('Product', product_id)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load product: {e}")
+            return
+        if row is None:
+            self.row_gone("product", self.show_products)
+            return
+        current_name, current_price, current_category = row
         
         dialog = tk.Toplevel(self.root)
         dialog.title("Edit Product")
-        dialog.geometry("400x250")
+        dialog.geometry("420x520")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -412,6 +998,8 @@ class StoreInventoryApp:
         price_entry.grid(row=3, column=0, pady=(0, 20))
         price_entry.insert(0, str(current_price))
         
+        category_combo = self.category_combo(form_frame, 4, current_category or None)
+        
         def update_product():
             name = name_entry.get().strip()
             price_str = price_entry.get().strip()
@@ -426,12 +1014,8 @@ class StoreInventoryApp:
                     messagebox.showwarning("Input Error", "Price cannot be negative")
                     return
                 
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("UPDATE Product SET name=?, price=? WHERE id_product=?",
-                             (name, price, product_id))
-                conn.commit()
-                conn.close()
+                self.execute_write("UPDATE Product SET name=?, price=?, id_category=? WHERE id_product=?",
+                             (name, price, category_combo.selected_id(), product_id))
                 
                 messagebox.showinfo("Success", "Product updated successfully")
                 dialog.destroy()
@@ -442,13 +1026,37 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to update product: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=4, column=0, pady=(10, 0))
+        button_frame.grid(row=6, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Update", command=update_product,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
         
         ttk.Button(button_frame, text="Cancel", command=dialog.destroy,
                   style='Delete.TButton', width=12).pack(side='left', padx=5)
+        
+        # Every price this product has had, newest first
+        tk.Label(form_frame, text="Price History:", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=7, column=0, sticky='w', pady=(20, 5))
+        
+        history = ttk.Treeview(form_frame, columns=('From', 'Until', 'Price'), show='headings', height=6)
+        history.heading('From', text='From')
+        history.heading('Until', text='Until')
+        history.heading('Price', text='Price')
+        history.column('From', width=130, anchor='center')
+        history.column('Until', width=130, anchor='center')
+        history.column('Price', width=70, anchor='e')
+        history.grid(row=8, column=0, sticky='ew')
+        
+        try:
+            conn = self.get_db_connection()
+            rows = price_history(conn, product_id)
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load price history: {e}")
+            rows = []
+        for effective_from, effective_until, price in rows:
+            history.insert('', 'end', values=(effective_from or "(earliest)", effective_until or "now",
+                                              f"${price:.2f}"))
     
     def delete_product(self, tree):
         selection = tree.selection()
@@ -456,24 +1064,28 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a product to delete")
             return
         
-        item = tree.item(selection[0])
-        product_id = item['values'][0]
-        product_name = item['values'][1]
+        product_id = int(selection[0])
+        try:
+            row = self.catalog_row('Product', product_id)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load product: {e}")
+            return
+        if row is None:
+            self.row_gone("product", self.show_products)
+            return
+        product_name = row[0]
         
         if messagebox.askyesno("Confirm Delete",
                               f"Are you sure you want to delete '{product_name}'?"):
             try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM Product WHERE id_product=?", (product_id,))
-                conn.commit()
-                conn.close()
+                self.execute_write("DELETE FROM Product WHERE id_product=?", (product_id,))
                 
                 messagebox.showinfo("Success", "Product deleted successfully")
                 self.show_products()
             except sqlite3.Error as e:
                 messagebox.showerror("Database Error", f"Failed to delete product: {e}")
     
+    @measured('build')
     def show_customers(self):
         self.clear_main_container()
         
@@ -516,6 +1128,10 @@ class StoreInventoryApp:
                   command=lambda: self.delete_customer(tree),
                   style='Delete.TButton').pack(side='left', padx=5)
         
+        ttk.Button(button_frame, text="🔗 Duplicates",
+                  command=lambda: self.duplicates_dialog(),
+                  style='SidebarButton.TButton').pack(side='left', padx=5)
+        
         # Table
         table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
         table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
@@ -523,7 +1139,7 @@ class StoreInventoryApp:
         scrollbar = ttk.Scrollbar(table_frame)
         scrollbar.pack(side='right', fill='y')
         
-        tree = ttk.Treeview(table_frame, columns=('ID', 'Name', 'Phone'),
+        tree = ttk.Treeview(table_frame, columns=('ID', 'Name', 'Phone', 'Tier'),
                            show='headings', yscrollcommand=scrollbar.set)
         tree.pack(fill='both', expand=True)
         scrollbar.config(command=tree.yview)
@@ -531,10 +1147,27 @@ class StoreInventoryApp:
         tree.heading('ID', text='ID')
         tree.heading('Name', text='Customer Name')
         tree.heading('Phone', text='Phone')
+        tree.heading('Tier', text='Tier')
         
         tree.column('ID', width=80, anchor='center')
         tree.column('Name', width=300, anchor='w')
         tree.column('Phone', width=200, anchor='w')
+        tree.column('Tier', width=100, anchor='center')
+        
+        # Purchase history pane, shown beside the table once a customer is selected
+        detail_frame = tk.Frame(self.main_container, bg=self.colors['white'], width=420)
+        detail_frame.pack_propagate(False)
+        
+        def on_customer_select(event):
+            selection = tree.selection()
+            if not selection:
+                return
+            if not detail_frame.winfo_ismapped():
+                detail_frame.pack(side='right', fill='y', padx=(0, 30), pady=(0, 30),
+                                  before=table_frame)
+            self.show_customer_history(detail_frame, int(selection[0]))
+        
+        tree.bind('<<TreeviewSelect>>', on_customer_select)
         
         def search_customers(*args):
             self.load_customers(tree, search_var.get())
@@ -542,32 +1175,249 @@ class StoreInventoryApp:
         search_var.trace('w', search_customers)
         
         self.load_customers(tree)
+        self.live_view = (tree, lambda changes: self.apply_customer_changes(tree, changes, search_var.get()))
     
+    @measured('populate')
     def load_customers(self, tree, search_term=''):
         for item in tree.get_children():
             tree.delete(item)
         
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            if search_term:
-                cursor.execute("SELECT id_customer, name, phone FROM Customer WHERE name LIKE ?",
-                             (f'%{search_term}%',))
+            # A number is looked up on the indexed phone key, anything else by name
+            phone_range = phone_search_range(search_term)
+            if phone_range:
+                rows = self.query_cache.query("""
+                    SELECT id_customer, name, phone, tier FROM Customer
+                    WHERE phone_key BETWEEN ? AND ?
+                """, phone_range)
+            elif search_term:
+                rows = self.query_cache.query(
+                    "SELECT id_customer, name, phone, tier FROM Customer WHERE name LIKE ?",
+                    (f'%{search_term}%',))
             else:
-                cursor.execute("SELECT id_customer, name, phone FROM Customer")
+                rows = self.query_cache.query("SELECT id_customer, name, phone, tier FROM Customer")
+                self.customer_rows.clear()
             
-            for row in cursor.fetchall():
-                tree.insert('', 'end', values=row)
+            for row in rows:
+                self.customer_rows.put(row[0], row[1:])
+                tree.insert('', 'end', iid=str(row[0]), values=row)
             
-            conn.close()
+            if not search_term:
+                self.customer_rows.complete = True
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Failed to load customers: {e}")
     
+    def apply_customer_changes(self, tree, changes, search_term=''):
+        # sync_row_stores has already refreshed the changed rows
+        ids = changed_ids(changes, 'Customer')
+        if not ids:
+            return
+        if len(ids) > 500 or not self.customer_rows.complete:
+            self.load_customers(tree, search_term)
+            return
+        
+        term = search_term.lower()
+        phone_range = phone_search_range(search_term)
+        rows = []
+        for customer_id in ids:
+            row = self.customer_rows.get(customer_id)
+            if not row:
+                continue
+            if phone_range:
+                key = phone_key(row[1])
+                matches = key is not None and phone_range[0] <= key <= phone_range[1]
+            else:
+                matches = term in row[0].lower()
+            if matches:
+                rows.append((customer_id, (customer_id,) + row))
+        self.apply_row_changes(tree, ids, rows)
+    
+    def duplicates_dialog(self):
+        try:
+            conn = self.get_db_connection()
+            clusters = find_duplicates(conn)
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to find duplicates: {e}")
+            return
+        
+        if not clusters:
+            messagebox.showinfo("Duplicates", "No likely duplicate customers found")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Duplicate Customers")
+        dialog.geometry("700x450")
+        dialog.configure(bg=self.colors['light'])
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(dialog, text=f"{len(clusters)} groups of likely duplicates. Each group is merged "
+                              "into the customer shown in bold, with all their sales. "
+                              "Double-click a group to leave it out.",
+                bg=self.colors['light'], fg=self.colors['text'], font=('Segoe UI', 10),
+                wraplength=640, justify='left').pack(anchor='w', padx=20, pady=(15, 10))
+        
+        table_frame = tk.Frame(dialog, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=20)
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        tree = ttk.Treeview(table_frame, columns=('Merge', 'Name', 'Phone', 'Tier', 'Purchases'),
+                           show='headings', yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        tree.tag_configure('survivor', font=('Segoe UI', 10, 'bold'))
+        tree.tag_configure('excluded', foreground=self.colors['secondary'])
+        
+        for column, width in (('Merge', 60), ('Name', 240), ('Phone', 150), ('Tier', 80), ('Purchases', 80)):
+            tree.heading(column, text=column)
+            tree.column(column, width=width, anchor='w')
+        
+        # Rows are iid "group" for a group's survivor, "group.member" below it
+        for group, (survivor, *duplicates) in enumerate(clusters):
+            tree.insert('', 'end', iid=str(group), values=("Yes",) + tuple(survivor[1:5]), tags=('survivor',))
+            for member, row in enumerate(duplicates):
+                tree.insert('', 'end', iid=f"{group}.{member}",
+                           values=("", "    " + row[1]) + tuple(row[2:5]))
+        
+        excluded = set()
+        
+        def toggle_groups(event=None):
+            for group in {int(iid.split('.')[0]) for iid in tree.selection()}:
+                skip = group not in excluded
+                if skip:
+                    excluded.add(group)
+                else:
+                    excluded.discard(group)
+                tree.set(str(group), 'Merge', "No" if skip else "Yes")
+                tree.item(str(group), tags=('survivor', 'excluded') if skip else ('survivor',))
+                for member in range(len(clusters[group]) - 1):
+                    tree.item(f"{group}.{member}", tags=('excluded',) if skip else ())
+        
+        tree.bind('<Double-1>', toggle_groups)
+        
+        def merge():
+            chosen = [cluster for group, cluster in enumerate(clusters) if group not in excluded]
+            if not chosen:
+                messagebox.showwarning("Duplicates", "Every group is left out", parent=dialog)
+                return
+            merged_count = sum(len(cluster) - 1 for cluster in chosen)
+            if not messagebox.askyesno("Confirm Merge",
+                                      f"Merge {merged_count} duplicate customers in {len(chosen)} groups?",
+                                      parent=dialog):
+                return
+            try:
+                merged, moved, seconds = self.write_queue.write_alone(
+                    lambda conn: merge_duplicates(self.db_name, chosen, conn))
+                messagebox.showinfo("Success", f"Merged {merged} customers and moved {moved} sales "
+                                               f"in {seconds:.2f}s", parent=dialog)
+                dialog.destroy()
+                self.show_customers()
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to merge customers: {e}", parent=dialog)
+        
+        button_frame = tk.Frame(dialog, bg=self.colors['light'])
+        button_frame.pack(pady=15)
+        
+        ttk.Button(button_frame, text="Include / Leave Out", command=toggle_groups,
+                  style='Action.TButton', width=18).pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="Merge", command=merge,
+                  style='Action.TButton', width=12).pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy,
+                  style='Delete.TButton', width=12).pack(side='left', padx=5)
+    
+    def show_customer_history(self, detail_frame, customer_id):
+        for widget in detail_frame.winfo_children():
+            widget.destroy()
+        
+        try:
+            conn = self.get_db_connection()
+            name_row = conn.execute("SELECT name FROM Customer WHERE id_customer = ?",
+                                    (customer_id,)).fetchone()
+            sale_count, lifetime_spend, last_purchase = customer_summary(conn, customer_id)
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load customer history: {e}")
+            return
+        
+        tk.Label(detail_frame, text=name_row[0] if name_row else f"Customer #{customer_id}",
+                bg=self.colors['white'], fg=self.colors['text'],
+                font=('Segoe UI', 16, 'bold')).pack(anchor='w', padx=15, pady=(15, 10))
+        
+        summary = [
+            ("Lifetime spend", f"${lifetime_spend:.2f}"),
+            ("Purchases", str(sale_count)),
+            ("Last purchase", last_purchase or "-")
+        ]
+        for label, value in summary:
+            row = tk.Frame(detail_frame, bg=self.colors['white'])
+            row.pack(fill='x', padx=15)
+            tk.Label(row, text=label, bg=self.colors['white'], fg=self.colors['secondary'],
+                    font=('Segoe UI', 10)).pack(side='left')
+            tk.Label(row, text=value, bg=self.colors['white'], fg=self.colors['text'],
+                    font=('Segoe UI', 10, 'bold')).pack(side='right')
+        
+        history = ttk.Treeview(detail_frame, columns=('Date', 'Product', 'Quantity', 'Total'),
+                              show='headings', height=PAGE_SIZE)
+        history.heading('Date', text='Date')
+        history.heading('Product', text='Product')
+        history.heading('Quantity', text='Qty')
+        history.heading('Total', text='Total')
+        history.column('Date', width=130, anchor='center')
+        history.column('Product', width=140, anchor='w')
+        history.column('Quantity', width=50, anchor='center')
+        history.column('Total', width=80, anchor='e')
+        
+        pager = tk.Frame(detail_frame, bg=self.colors['white'])
+        pager.pack(side='bottom', fill='x', padx=15, pady=10)
+        history.pack(fill='both', expand=True, padx=15, pady=(15, 0))
+        
+        # Keyset pages: remember the cursor each page started from to go back
+        page_starts = [None]
+        
+        def load_page():
+            for item in history.get_children():
+                history.delete(item)
+            try:
+                conn = self.get_db_connection()
+                rows = purchase_page(conn, customer_id, page_starts[-1])
+                conn.close()
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to load customer history: {e}")
+                return
+            for sale_id, sale_date, product, quantity, total in rows:
+                history.insert('', 'end', iid=str(sale_id),
+                              values=(sale_date or '-', product or '-', quantity, f"${total:.2f}"))
+            newer_button.state(['!disabled'] if len(page_starts) > 1 else ['disabled'])
+            older_button.state(['!disabled'] if len(rows) == PAGE_SIZE else ['disabled'])
+        
+        def newer_page():
+            page_starts.pop()
+            load_page()
+        
+        def older_page():
+            children = history.get_children()
+            if children:
+                page_starts.append(int(children[-1]))
+                load_page()
+        
+        newer_button = ttk.Button(pager, text="◀ Newer", command=newer_page,
+                                 style='Success.TButton')
+        newer_button.pack(side='left')
+        older_button = ttk.Button(pager, text="Older ▶", command=older_page,
+                                 style='Success.TButton')
+        older_button.pack(side='right')
+        
+        load_page()
+    
     def add_customer_dialog(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Add Customer")
-        dialog.geometry("400x250")
+        dialog.geometry("400x330")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -596,9 +1446,18 @@ class StoreInventoryApp:
         phone_entry = ttk.Entry(form_frame, width=30, font=('Segoe UI', 11))
         phone_entry.grid(row=3, column=0, pady=(0, 20))
         
+        tk.Label(form_frame, text="Tier:", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=4, column=0, sticky='w', pady=(0, 5))
+        
+        tier_combo = ttk.Combobox(form_frame, values=CUSTOMER_TIERS, state='readonly',
+                                 width=28, font=('Segoe UI', 11))
+        tier_combo.grid(row=5, column=0, pady=(0, 20))
+        tier_combo.current(0)
+        
         def save_customer():
             name = name_entry.get().strip()
             phone = phone_entry.get().strip()
+            tier = tier_combo.get()
             
             if not name or not phone:
                 messagebox.showwarning("Input Error", "Please fill all fields")
@@ -606,10 +1465,16 @@ class StoreInventoryApp:
             
             try:
                 conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Customer (name, phone) VALUES (?, ?)", (name, phone))
-                conn.commit()
+                existing = find_by_phone(conn, phone)
                 conn.close()
+                if existing and not messagebox.askyesno(
+                        "Possible Duplicate",
+                        f"{existing[0][1]} already has phone number {existing[0][2]}.\n"
+                        "Add a new customer anyway?", parent=dialog):
+                    return
+                
+                self.execute_write("INSERT INTO Customer (name, phone, tier) VALUES (?, ?, ?)",
+                                   (name, phone, tier))
                 
                 messagebox.showinfo("Success", "Customer added successfully")
                 dialog.destroy()
@@ -618,7 +1483,7 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to add customer: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=4, column=0, pady=(10, 0))
+        button_frame.grid(row=6, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Save", command=save_customer,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
@@ -632,15 +1497,20 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a customer to edit")
             return
         
-        item = tree.item(selection[0])
-        values = item['values']
-        customer_id = values[0]
-        current_name = values[1]
-        current_phone = values[2]
+        customer_id = int(selection[0])
+        try:
+            row = self.catalog_row('Customer', customer_id)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load customer: {e}")
+            return
+        if row is None:
+            self.row_gone("customer", self.show_customers)
+            return
+        current_name, current_phone, current_tier = row
         
         dialog = tk.Toplevel(self.root)
         dialog.title("Edit Customer")
-        dialog.geometry("400x250")
+        dialog.geometry("400x330")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -669,23 +1539,28 @@ class StoreInventoryApp:
         
         phone_entry = ttk.Entry(form_frame, width=30, font=('Segoe UI', 11))
         phone_entry.grid(row=3, column=0, pady=(0, 20))
-        phone_entry.insert(0, current_phone)
+        phone_entry.insert(0, current_phone or '')
+        
+        tk.Label(form_frame, text="Tier:", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=4, column=0, sticky='w', pady=(0, 5))
+        
+        tier_combo = ttk.Combobox(form_frame, values=CUSTOMER_TIERS, state='readonly',
+                                 width=28, font=('Segoe UI', 11))
+        tier_combo.grid(row=5, column=0, pady=(0, 20))
+        tier_combo.set(current_tier)
         
         def update_customer():
             name = name_entry.get().strip()
             phone = phone_entry.get().strip()
+            tier = tier_combo.get()
             
             if not name or not phone:
                 messagebox.showwarning("Input Error", "Please fill all fields")
                 return
             
             try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("UPDATE Customer SET name=?, phone=? WHERE id_customer=?",
-                            (name, phone, customer_id))
-                conn.commit()
-                conn.close()
+                self.execute_write("UPDATE Customer SET name=?, phone=?, tier=? WHERE id_customer=?",
+                            (name, phone, tier, customer_id))
                 
                 messagebox.showinfo("Success", "Customer updated successfully")
                 dialog.destroy()
@@ -694,7 +1569,7 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to update customer: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=4, column=0, pady=(10, 0))
+        button_frame.grid(row=6, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Update", command=update_customer,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
@@ -708,24 +1583,28 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a customer to delete")
             return
         
-        item = tree.item(selection[0])
-        customer_id = item['values'][0]
-        customer_name = item['values'][1]
+        customer_id = int(selection[0])
+        try:
+            row = self.catalog_row('Customer', customer_id)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load customer: {e}")
+            return
+        if row is None:
+            self.row_gone("customer", self.show_customers)
+            return
+        customer_name = row[0]
         
         if messagebox.askyesno("Confirm Delete",
                               f"Are you sure you want to delete '{customer_name}'?"):
             try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM Customer WHERE id_customer=?", (customer_id,))
-                conn.commit()
-                conn.close()
+                self.execute_write("DELETE FROM Customer WHERE id_customer=?", (customer_id,))
                 
                 messagebox.showinfo("Success", "Customer deleted successfully")
                 self.show_customers()
             except sqlite3.Error as e:
                 messagebox.showerror("Database Error", f"Failed to delete customer: {e}")
     
+    @measured('build')
     def show_sales(self):
         self.clear_main_container()
         
@@ -755,6 +1634,14 @@ class StoreInventoryApp:
                   command=lambda: self.delete_sale(tree),
                   style='Delete.TButton').pack(side='left', padx=5)
         
+        ttk.Button(button_frame, text="🧾 Invoices",
+                  command=lambda: self.invoices_dialog(),
+                  style='SidebarButton.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🗄 Archive",
+                  command=lambda: self.archive_sales_dialog(),
+                  style='SidebarButton.TButton').pack(side='left', padx=5)
+        
         # Table
         table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
         table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
@@ -780,34 +1667,93 @@ class StoreInventoryApp:
         tree.column('Total', width=150, anchor='e')
         
         self.load_sales(tree)
+        self.live_view = (tree, lambda changes: self.apply_sale_changes(tree, changes))
     
+    @measured('populate')
     def load_sales(self, tree):
         for item in tree.get_children():
             tree.delete(item)
         
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT s.id_sale, p.name, c.name, s.quantity, s.total_price
+            rows = self.query_cache.query("""
+                SELECT s.id_sale, s.id_product, s.id_customer, p.name, c.name, s.quantity, s.total_price
                 FROM Sale s
                 JOIN Product p ON s.id_product = p.id_product
                 JOIN Customer c ON s.id_customer = c.id_customer
                 ORDER BY s.id_sale DESC
             """)
             
-            for row in cursor.fetchall():
-                tree.insert('', 'end', values=(row[0], row[1], row[2], row[3], f"${row[4]:.2f}"))
+            self.sale_rows.clear()
+            for row in rows:
+                self.sale_rows.put(row[0], row[1:])
+                tree.insert('', 'end', iid=str(row[0]),
+                           values=(row[0], row[3], row[4], row[5], f"${row[6]:.2f}"))
             
-            conn.close()
+            self.sale_rows.complete = True
         except sqlite3.Error as e:
             messagebox.showerror("Database Error", f"Failed to load sales: {e}")
     
+    def apply_sale_changes(self, tree, changes):
+        sale_ids = changed_ids(changes, 'Sale')
+        product_ids = changed_ids(changes, 'Product')
+        customer_ids = changed_ids(changes, 'Customer')
+        if not (sale_ids or product_ids or customer_ids):
+            return
+        if len(sale_ids) + len(product_ids) + len(customer_ids) > 500:
+            self.load_sales(tree)
+            return
+        
+        # Renamed products and customers change how their sales are shown
+        conditions = []
+        params = []
+        for column, ids in (('s.id_sale', sale_ids), ('s.id_product', product_ids),
+                            ('s.id_customer', customer_ids)):
+            if ids:
+                conditions.append(f"{column} IN ({','.join('?' * len(ids))})")
+                params.extend(ids)
+        
+        conn = self.get_db_connection()
+        rows = []
+        for row in conn.execute(f"""
+                SELECT s.id_sale, s.id_product, s.id_customer, p.name, c.name, s.quantity, s.total_price
+                FROM Sale s
+                JOIN Product p ON s.id_product = p.id_product
+                JOIN Customer c ON s.id_customer = c.id_customer
+                WHERE {' OR '.join(conditions)}
+                ORDER BY s.id_sale
+            """, params):
+            self.sale_rows.put(row[0], row[1:])
+            rows.append((row[0], (row[0], row[3], row[4], row[5], f"${row[6]:.2f}")))
+        conn.close()
+        for sale_id in sale_ids - {row[0] for row in rows}:
+            self.sale_rows.remove(sale_id)
+        # Newest sales go on top, matching the ORDER BY of load_sales
+        self.apply_row_changes(tree, sale_ids, rows, index=0)
+    
+    def sale_catalog(self, conn):
+        # Products and customers for the sale dialogs, from the row stores
+        # when they hold the whole table
+        if not self.product_rows.complete:
+            self.product_rows.clear()
+            for row in conn.execute("SELECT id_product, name, price, COALESCE(id_category, 0) FROM Product"):
+                self.product_rows.put(row[0], row[1:])
+            self.product_rows.complete = True
+        if not self.customer_rows.complete:
+            self.customer_rows.clear()
+            for row in conn.execute("SELECT id_customer, name, phone, tier FROM Customer"):
+                self.customer_rows.put(row[0], row[1:])
+            self.customer_rows.complete = True
+        
+        products = [(product_id, name, price)
+                    for product_id, (name, price, category_id) in self.product_rows.rows()]
+        customers = [(customer_id, name, tier)
+                     for customer_id, (name, phone, tier) in self.customer_rows.rows()]
+        return products, customers
+    
     def add_sale_dialog(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Add Sale")
-        dialog.geometry("450x350")
+        dialog.geometry("450x390")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -822,13 +1768,8 @@ class StoreInventoryApp:
         # Get products and customers
         try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT id_product, name, price FROM Product")
-            products = cursor.fetchall()
-            
-            cursor.execute("SELECT id_customer, name FROM Customer")
-            customers = cursor.fetchall()
+            products, customers = self.sale_catalog(conn)
+            pricing = PricingEngine.load(conn)
             
             conn.close()
             
@@ -886,21 +1827,32 @@ class StoreInventoryApp:
         # Total price display
         total_label = tk.Label(form_frame, text="Total: $0.00", bg=self.colors['light'],
                               fg=self.colors['success'], font=('Segoe UI', 14, 'bold'))
-        total_label.grid(row=6, column=0, pady=(0, 20))
+        total_label.grid(row=6, column=0)
+        
+        promo_label = tk.Label(form_frame, text="", bg=self.colors['light'],
+                              fg=self.colors['secondary'], font=('Segoe UI', 10))
+        promo_label.grid(row=7, column=0, pady=(0, 15))
+        
+        def price_sale(product_index, customer_index, quantity):
+            product = products[product_index]
+            customer = customers[customer_index] if customer_index >= 0 else (None, None, None)
+            return pricing.price_line(product[0], product[2], quantity, customer[0], customer[2])
         
         def update_total(*args):
             try:
                 quantity = int(quantity_entry.get())
                 product_index = product_combo.current()
                 if product_index >= 0 and quantity > 0:
-                    price = products[product_index][2]
-                    total = price * quantity
+                    total, discount, rule = price_sale(product_index, customer_combo.current(), quantity)
                     total_label.config(text=f"Total: ${total:.2f}")
+                    promo_label.config(text=f"{rule.name}: -${discount:.2f}" if rule else "")
             except ValueError:
                 total_label.config(text="Total: $0.00")
+                promo_label.config(text="")
         
         quantity_entry.bind('<KeyRelease>', update_total)
         product_combo.bind('<<ComboboxSelected>>', update_total)
+        customer_combo.bind('<<ComboboxSelected>>', update_total)
         update_total()
         
         def save_sale():
@@ -919,17 +1871,24 @@ class StoreInventoryApp:
                 
                 product_id = products[product_index][0]
                 customer_id = customers[customer_index][0]
-                price = products[product_index][2]
-                total_price = price * quantity
+                total_price = price_sale(product_index, customer_index, quantity)[0]
                 
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO Sale (id_product, id_customer, quantity, total_price)
-                    VALUES (?, ?, ?, ?)
-                """, (product_id, customer_id, quantity, total_price))
-                conn.commit()
-                conn.close()
+                def insert_sale(conn):
+                    # Dated in the writer by SQLite's clock, as price changes are
+                    sale_id = conn.execute(f"""
+                        INSERT INTO Sale (id_product, id_customer, quantity, total_price, sale_date)
+                        VALUES (?, ?, ?, ?, {LOCAL_NOW_SQL})
+                    """, (product_id, customer_id, quantity, total_price)).lastrowid
+                    sale_date = conn.execute("SELECT sale_date FROM Sale WHERE id_sale = ?",
+                                             (sale_id,)).fetchone()[0]
+                    # The list price as of the sale, not as the dialog loaded it
+                    return sale_id, sale_date, price_as_of(conn, product_id, sale_date)
+                
+                sale_id, sale_date, list_price = self.write_queue.write(insert_sale)
+                
+                self.print_receipt((sale_id, sale_date, customers[customer_index][1],
+                                    products[product_index][1], quantity,
+                                    list_price, total_price))
                 
                 messagebox.showinfo("Success", "Sale added successfully")
                 dialog.destroy()
@@ -940,7 +1899,7 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to add sale: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=7, column=0, pady=(10, 0))
+        button_frame.grid(row=8, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Save", command=save_sale,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
@@ -954,26 +1913,15 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a sale to edit")
             return
         
-        item = tree.item(selection[0])
-        values = item['values']
-        sale_id = values[0]
+        sale_id = int(selection[0])
+        row = self.sale_rows.get(sale_id)
+        current_sale = (row[0], row[1], row[4]) if row else None
         
-        # Get current sale data
+        # Get the catalog and promotions
         try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id_product, id_customer, quantity
-                FROM Sale WHERE id_sale = ?
-            """, (sale_id,))
-            current_sale = cursor.fetchone()
-            
-            cursor.execute("SELECT id_product, name, price FROM Product")
-            products = cursor.fetchall()
-            
-            cursor.execute("SELECT id_customer, name FROM Customer")
-            customers = cursor.fetchall()
+            products, customers = self.sale_catalog(conn)
+            pricing = PricingEngine.load(conn)
             
             conn.close()
             
@@ -987,7 +1935,7 @@ class StoreInventoryApp:
         
         dialog = tk.Toplevel(self.root)
         dialog.title("Edit Sale")
-        dialog.geometry("450x350")
+        dialog.geometry("450x390")
         dialog.resizable(False, False)
         dialog.configure(bg=self.colors['light'])
         dialog.transient(self.root)
@@ -1046,21 +1994,32 @@ class StoreInventoryApp:
         # Total price display
         total_label = tk.Label(form_frame, text="Total: $0.00", bg=self.colors['light'],
                               fg=self.colors['success'], font=('Segoe UI', 14, 'bold'))
-        total_label.grid(row=6, column=0, pady=(0, 20))
+        total_label.grid(row=6, column=0)
+        
+        promo_label = tk.Label(form_frame, text="", bg=self.colors['light'],
+                              fg=self.colors['secondary'], font=('Segoe UI', 10))
+        promo_label.grid(row=7, column=0, pady=(0, 15))
+        
+        def price_sale(product_index, customer_index, quantity):
+            product = products[product_index]
+            customer = customers[customer_index] if customer_index >= 0 else (None, None, None)
+            return pricing.price_line(product[0], product[2], quantity, customer[0], customer[2])
         
         def update_total(*args):
             try:
                 quantity = int(quantity_entry.get())
                 product_index = product_combo.current()
                 if product_index >= 0 and quantity > 0:
-                    price = products[product_index][2]
-                    total = price * quantity
+                    total, discount, rule = price_sale(product_index, customer_combo.current(), quantity)
                     total_label.config(text=f"Total: ${total:.2f}")
+                    promo_label.config(text=f"{rule.name}: -${discount:.2f}" if rule else "")
             except ValueError:
                 total_label.config(text="Total: $0.00")
+                promo_label.config(text="")
         
         quantity_entry.bind('<KeyRelease>', update_total)
         product_combo.bind('<<ComboboxSelected>>', update_total)
+        customer_combo.bind('<<ComboboxSelected>>', update_total)
         update_total()
         
         def update_sale():
@@ -1079,18 +2038,13 @@ class StoreInventoryApp:
                 
                 product_id = products[product_index][0]
                 customer_id = customers[customer_index][0]
-                price = products[product_index][2]
-                total_price = price * quantity
+                total_price = price_sale(product_index, customer_index, quantity)[0]
                 
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("""
+                self.execute_write("""
                     UPDATE Sale 
                     SET id_product=?, id_customer=?, quantity=?, total_price=?
                     WHERE id_sale=?
                 """, (product_id, customer_id, quantity, total_price, sale_id))
-                conn.commit()
-                conn.close()
                 
                 messagebox.showinfo("Success", "Sale updated successfully")
                 dialog.destroy()
@@ -1101,7 +2055,7 @@ class StoreInventoryApp:
                 messagebox.showerror("Database Error", f"Failed to update sale: {e}")
         
         button_frame = tk.Frame(form_frame, bg=self.colors['light'])
-        button_frame.grid(row=7, column=0, pady=(10, 0))
+        button_frame.grid(row=8, column=0, pady=(10, 0))
         
         ttk.Button(button_frame, text="Update", command=update_sale,
                   style='Action.TButton', width=12).pack(side='left', padx=5)
@@ -1115,25 +2069,1143 @@ class StoreInventoryApp:
             messagebox.showwarning("Selection Error", "Please select a sale to delete")
             return
         
-        item = tree.item(selection[0])
-        sale_id = item['values'][0]
+        sale_id = int(selection[0])
         
         if messagebox.askyesno("Confirm Delete",
                               f"Are you sure you want to delete Sale #{sale_id}?"):
             try:
-                conn = self.get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM Sale WHERE id_sale=?", (sale_id,))
-                conn.commit()
-                conn.close()
+                self.execute_write("DELETE FROM Sale WHERE id_sale=?", (sale_id,))
                 
                 messagebox.showinfo("Success", "Sale deleted successfully")
                 self.show_sales()
             except sqlite3.Error as e:
                 messagebox.showerror("Database Error", f"Failed to delete sale: {e}")
+    
+    def archive_sales_dialog(self):
+        default_cutoff = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+        cutoff = simpledialog.askstring("Archive Sales",
+                                        "Archive sales dated before (YYYY-MM-DD):\n"
+                                        "Sales with no date are kept.",
+                                        initialvalue=default_cutoff, parent=self.root)
+        if not cutoff:
+            return
+        
+        try:
+            datetime.strptime(cutoff, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Input Error", "Date must be in YYYY-MM-DD format")
+            return
+        
+        try:
+            moved = self.write_queue.write_alone(
+                lambda conn: archive_sales(self.db_name, cutoff, conn=conn))
+            messagebox.showinfo("Success", f"{moved} sales moved to the archive")
+            self.show_sales()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to archive sales: {e}")
+    
+    def scheduled_backup(self):
+        self.start_backup()
+        self.root.after(BACKUP_INTERVAL_MS, self.scheduled_backup)
+    
+    def start_backup(self):
+        # Backups run on a worker thread with their own connections so the
+        # window keeps responding while pages are copied
+        if self.backup_thread and self.backup_thread.is_alive():
+            return False
+        self.backup_thread = threading.Thread(target=self.run_backup, daemon=True)
+        self.backup_thread.start()
+        return True
+    
+    def run_backup(self):
+        try:
+            self.last_backup = backup_database(self.db_name)
+            rotate_backups(self.db_name)
+        except (sqlite3.Error, OSError) as e:
+            self.last_backup = {'error': str(e)}
+    
+    def backup_status_text(self):
+        if self.backup_thread and self.backup_thread.is_alive():
+            return "Backup in progress..."
+        if not self.last_backup:
+            return "No backup taken this session"
+        if 'error' in self.last_backup:
+            return f"Last backup failed: {self.last_backup['error']}"
+        return (f"Last backup: {os.path.basename(self.last_backup['path'])} - "
+                f"{self.last_backup['bytes'] / (1024 * 1024):.2f} MB in "
+                f"{self.last_backup['seconds']:.2f}s "
+                f"({self.last_backup['mb_per_sec']:.2f} MB/s)")
+    
+    @measured('build')
+    def show_backups(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="Backups", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        # Status and buttons
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 20))
+        
+        status_label = tk.Label(control_frame, text=self.backup_status_text(),
+                               bg=self.colors['light'], fg=self.colors['secondary'],
+                               font=('Segoe UI', 11))
+        status_label.pack(side='left')
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="💾 Back Up Now",
+                  command=lambda: self.backup_now(tree, status_label),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="♻ Restore",
+                  command=lambda: self.restore_selected_backup(tree),
+                  style='Delete.TButton').pack(side='left', padx=5)
+        
+        # Table
+        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        tree = ttk.Treeview(table_frame, columns=('File', 'Date', 'Size'),
+                           show='headings', yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        
+        tree.heading('File', text='Backup File')
+        tree.heading('Date', text='Taken')
+        tree.heading('Size', text='Size (MB)')
+        
+        tree.column('File', width=350, anchor='w')
+        tree.column('Date', width=200, anchor='center')
+        tree.column('Size', width=120, anchor='e')
+        
+        self.load_backups(tree)
+    
+    @measured('populate')
+    def load_backups(self, tree):
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        for path in list_backups(self.db_name):
+            taken = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M:%S")
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            tree.insert('', 'end', iid=path,
+                       values=(os.path.basename(path), taken, f"{size_mb:.2f}"))
+    
+    def backup_now(self, tree, status_label):
+        if not self.start_backup():
+            messagebox.showinfo("Backup", "A backup is already running")
+            return
+        
+        def poll():
+            if not status_label.winfo_exists():
+                return
+            status_label.config(text=self.backup_status_text())
+            if self.backup_thread.is_alive():
+                self.root.after(200, poll)
+            else:
+                self.load_backups(tree)
+        
+        poll()
+    
+    def restore_selected_backup(self, tree):
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("Selection Error", "Please select a backup to restore")
+            return
+        
+        backup_path = selection[0]
+        if messagebox.askyesno("Confirm Restore",
+                              f"Replace the current database with '{os.path.basename(backup_path)}'?\n"
+                              "Changes made since that backup will be lost."):
+            try:
+                restore_backup(self.db_name, backup_path)
+                self.database_replaced()
+                messagebox.showinfo("Success", "Database restored successfully")
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to restore backup: {e}")
+    
+    def note_activity(self, event=None):
+        self.last_activity = time.monotonic()
+    
+    def is_idle(self):
+        return time.monotonic() - self.last_activity >= IDLE_SECONDS
+    
+    def scheduled_maintenance(self):
+        if self.is_idle():
+            self.start_maintenance(idle_only=True)
+        self.root.after(MAINTENANCE_INTERVAL_MS, self.scheduled_maintenance)
+    
+    def start_maintenance(self, idle_only=False):
+        # Runs step by step on a worker thread; a scheduled run stops as soon
+        # as someone uses the till again
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            return False
+        keep_going = self.is_idle if idle_only else None
+        
+        def run():
+            try:
+                self.last_maintenance = run_maintenance(self.db_name, keep_going)
+            except (sqlite3.Error, OSError) as e:
+                self.last_maintenance = {'error': str(e)}
+        
+        self.maintenance_thread = threading.Thread(target=run, daemon=True)
+        self.maintenance_thread.start()
+        return True
+    
+    def maintenance_status_text(self):
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            return "Maintenance in progress..."
+        if not self.last_maintenance:
+            return "No maintenance run this session"
+        if 'error' in self.last_maintenance:
+            return f"Last run failed: {self.last_maintenance['error']}"
+        result = self.last_maintenance
+        freed = (result['before']['bytes'] - result['after']['bytes']) / (1024 * 1024)
+        state = "completed" if result['completed'] else "paused"
+        checks = "integrity ok" if not result['problems'] else f"{len(result['problems'])} integrity problems"
+        return (f"Last run {state}: {result['steps']} steps in {result['seconds']:.2f}s, "
+                f"{freed:.2f} MB freed, {checks}")
+    
+    @measured('build')
+    def show_diagnostics(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="Diagnostics", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        # Query cache status and buttons
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 10))
+        
+        cache_label = tk.Label(control_frame, text="", bg=self.colors['light'],
+                              fg=self.colors['secondary'], font=('Segoe UI', 11), justify='left')
+        cache_label.pack(side='left')
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="🔄 Refresh",
+                  command=lambda: self.load_diagnostics(tree, cache_label, ui_tree, ui_label),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🧹 Clear Cache",
+                  command=lambda: (self.query_cache.clear(),
+                                   self.load_diagnostics(tree, cache_label, ui_tree, ui_label)),
+                  style='Delete.TButton').pack(side='left', padx=5)
+        
+        # Table of cached results, most recently used first
+        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 20))
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        columns = ('Query', 'Params', 'Rows', 'KB', 'Hits', 'Age', 'Tables')
+        tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=8,
+                           yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        
+        for column, width, anchor in (('Query', 380, 'w'), ('Params', 120, 'w'), ('Rows', 70, 'e'),
+                                      ('KB', 70, 'e'), ('Hits', 60, 'e'), ('Age', 70, 'e'),
+                                      ('Tables', 160, 'w')):
+            tree.heading(column, text=column)
+            tree.column(column, width=width, anchor=anchor)
+        
+        # UI metrics status and buttons
+        ui_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        ui_frame.pack(fill='x', padx=30, pady=(0, 10))
+        
+        ui_label = tk.Label(ui_frame, text="", bg=self.colors['light'],
+                           fg=self.colors['secondary'], font=('Segoe UI', 11), justify='left')
+        ui_label.pack(side='left')
+        
+        ui_buttons = tk.Frame(ui_frame, bg=self.colors['light'])
+        ui_buttons.pack(side='right')
+        
+        ttk.Button(ui_buttons, text="⏱ UI Metrics On/Off",
+                  command=lambda: (self.ui_metrics.toggle(),
+                                   self.load_diagnostics(tree, cache_label, ui_tree, ui_label)),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(ui_buttons, text="📈 Top Allocations",
+                  command=self.show_top_allocations,
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        # Time per screen build and table load while metrics are on
+        ui_table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        ui_table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        ui_scrollbar = ttk.Scrollbar(ui_table_frame)
+        ui_scrollbar.pack(side='right', fill='y')
+        
+        ui_columns = ('Name', 'Kind', 'Calls', 'Last', 'Max', 'SQL', 'Layout', 'Growth', 'Widgets')
+        ui_tree = ttk.Treeview(ui_table_frame, columns=ui_columns, show='headings', height=8,
+                              yscrollcommand=ui_scrollbar.set)
+        ui_tree.pack(fill='both', expand=True)
+        ui_scrollbar.config(command=ui_tree.yview)
+        
+        headings = {
+            'Name': 'Screen / Loader', 'Kind': 'Kind', 'Calls': 'Calls', 'Last': 'Last ms',
+            'Max': 'Max ms', 'SQL': 'SQL ms', 'Layout': 'Layout ms', 'Growth': 'Memory Growth KB',
+            'Widgets': 'Widgets / Dialogs'
+        }
+        for column in ui_columns:
+            ui_tree.heading(column, text=headings[column])
+            ui_tree.column(column, width=90, anchor='e')
+        ui_tree.column('Name', width=200, anchor='w')
+        ui_tree.column('Kind', width=80, anchor='w')
+        ui_tree.column('Growth', width=130)
+        ui_tree.column('Widgets', width=120)
+        
+        self.load_diagnostics(tree, cache_label, ui_tree, ui_label)
+    
+    @measured('populate')
+    def load_diagnostics(self, tree, cache_label, ui_tree, ui_label):
+        for item in tree.get_children():
+            tree.delete(item)
+        for item in ui_tree.get_children():
+            ui_tree.delete(item)
+        
+        stats = self.query_cache.stats()
+        cache_label.config(text=(
+            f"Query cache: {stats['entries']} results, {stats['bytes'] / (1024 * 1024):.2f} of "
+            f"{stats['max_bytes'] / (1024 * 1024):.0f} MB\n"
+            f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['stale']} invalidated, {stats['evictions']} evicted, "
+            f"{stats['compute_seconds']:.2f}s spent in queries\n"
+            f"{self.replica_status_text()}"))
+        
+        for key, rows, size, hits, age, tables in self.query_cache.entry_summaries():
+            if key[0] == 'sql':
+                query, params = key[1], ", ".join(repr(param) for param in key[2])
+            else:
+                query, params = key[0], ", ".join(repr(part) for part in key[1:])
+            tree.insert('', 'end', values=(query, params, rows, f"{size / 1024:.1f}", hits,
+                                          f"{age:.0f}s", ", ".join(tables)))
+        
+        metrics = self.ui_metrics
+        if metrics.enabled:
+            lag = metrics.lag_stats()
+            ui_label.config(text=(
+                f"UI metrics on (Ctrl+Shift+M), logging to {os.path.basename(metrics.log_file)}\n"
+                f"Event loop lag p50 {lag['p50_ms']:.0f} ms, p95 {lag['p95_ms']:.0f} ms, "
+                f"max {lag['max_ms']:.0f} ms over {lag['samples']} samples"))
+        else:
+            ui_label.config(text="UI metrics off (Ctrl+Shift+M to switch on)\n"
+                                 "SQL ms only counts queries that go through the query cache")
+        
+        for name, entry in sorted(metrics.summary.items(), key=lambda item: -item[1]['max_ms']):
+            widgets = "" if entry['widgets'] is None else f"{entry['widgets']} / {entry['toplevels']}"
+            ui_tree.insert('', 'end', values=(
+                name, entry['kind'], entry['calls'], f"{entry['last_ms']:.1f}", f"{entry['max_ms']:.1f}",
+                f"{entry['sql_ms']:.1f}", f"{entry['layout_ms']:.1f}",
+                f"{entry['last_kb'] - entry['first_kb']:.0f}", widgets))
+    
+    def show_top_allocations(self):
+        allocations = self.ui_metrics.top_allocations()
+        if not allocations:
+            messagebox.showinfo("Top Allocations", "Switch UI metrics on first")
+            return
+        messagebox.showinfo("Top Allocations", "Growth since UI metrics were switched on:\n\n" +
+                            "\n".join(f"{size / 1024:+.0f} KB ({count:+d} blocks)  {where}"
+                                       for where, size, count in allocations))
+    
+    def write_queue_status_text(self):
+        stats = self.write_queue.stats()
+        if not stats['batches']:
+            return "No writes committed yet this session"
+        return (f"{stats['writes']} writes in {stats['batches']} commits "
+                f"(avg {stats['avg_batch']:.1f}, max {stats['max_batch']} per commit), "
+                f"commit p50 {stats['commit_p50_ms']:.1f} ms / p99 {stats['commit_p99_ms']:.1f} ms, "
+                f"save p99 {stats['latency_p99_ms']:.1f} ms")
+    
+    @measured('build')
+    def show_maintenance(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="Maintenance", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        # Status and buttons
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 20))
+        
+        status_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        status_frame.pack(side='left')
+        
+        file_label = tk.Label(status_frame, text="", bg=self.colors['light'],
+                             fg=self.colors['secondary'], font=('Segoe UI', 11))
+        file_label.pack(anchor='w')
+        
+        status_label = tk.Label(status_frame, text=self.maintenance_status_text(),
+                               bg=self.colors['light'], fg=self.colors['secondary'],
+                               font=('Segoe UI', 11))
+        status_label.pack(anchor='w')
+        
+        tk.Label(status_frame, text=self.write_queue_status_text(), bg=self.colors['light'],
+                fg=self.colors['secondary'], font=('Segoe UI', 11)).pack(anchor='w')
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="🛠 Run Now",
+                  command=lambda: self.maintenance_now(tree, file_label, status_label),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🗜 Enable Incremental Vacuum",
+                  command=lambda: self.enable_incremental_dialog(file_label),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        # Table
+        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        columns = ('Started', 'Seconds', 'Steps', 'Before', 'After', 'Queries', 'Check')
+        tree = ttk.Treeview(table_frame, columns=columns, show='headings',
+                           yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        
+        headings = {
+            'Started': 'Started', 'Seconds': 'Seconds', 'Steps': 'Steps',
+            'Before': 'Size Before (MB)', 'After': 'Size After (MB)',
+            'Queries': 'Query ms Before → After', 'Check': 'Integrity'
+        }
+        for column in columns:
+            tree.heading(column, text=headings[column])
+            tree.column(column, width=110, anchor='center')
+        tree.column('Started', width=170)
+        tree.column('Queries', width=170)
+        
+        self.load_maintenance(tree, file_label)
+    
+    @measured('populate')
+    def load_maintenance(self, tree, file_label):
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        try:
+            conn = self.get_db_connection()
+            stats = database_stats(conn)
+            conn.close()
+            file_label.config(text=f"File size {stats['bytes'] / (1024 * 1024):.2f} MB, "
+                                   f"{stats['free_bytes'] / (1024 * 1024):.2f} MB free, "
+                                   f"auto_vacuum {stats['auto_vacuum']}")
+        except sqlite3.Error as e:
+            file_label.config(text=f"Failed to read database stats: {e}")
+        
+        for (started, seconds, steps, completed, bytes_before, bytes_after,
+             free_before, free_after, ms_before, ms_after, check) in read_maintenance_log(self.db_name):
+            tree.insert('', 'end', values=(
+                started.replace('T', ' '), seconds,
+                steps if completed == '1' else f"{steps} (paused)",
+                f"{int(bytes_before) / (1024 * 1024):.2f}",
+                f"{int(bytes_after) / (1024 * 1024):.2f}",
+                f"{ms_before} → {ms_after}", check))
+    
+    def maintenance_now(self, tree, file_label, status_label):
+        if not self.start_maintenance():
+            messagebox.showinfo("Maintenance", "Maintenance is already running")
+            return
+        
+        def poll():
+            if not status_label.winfo_exists():
+                return
+            status_label.config(text=self.maintenance_status_text())
+            if self.maintenance_thread.is_alive():
+                self.root.after(200, poll)
+            else:
+                self.load_maintenance(tree, file_label)
+        
+        poll()
+    
+    def enable_incremental_dialog(self, file_label):
+        if messagebox.askyesno("Enable Incremental Vacuum",
+                              "This rewrites the whole database once (a full VACUUM) and\n"
+                              "blocks other tills until it finishes. Continue?"):
+            try:
+                stats = enable_incremental_vacuum(self.db_name)
+                file_label.config(text=f"File size {stats['bytes'] / (1024 * 1024):.2f} MB, "
+                                       f"{stats['free_bytes'] / (1024 * 1024):.2f} MB free, "
+                                       f"auto_vacuum {stats['auto_vacuum']}")
+                messagebox.showinfo("Success", "Incremental vacuum enabled")
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to vacuum database: {e}")
+    
+    def scheduled_sync(self):
+        # Stores keep working offline; a failed sync is simply retried next time
+        if not (self.sync_thread and self.sync_thread.is_alive()):
+            host, _, port = self.sync_peer.partition(':')
+            
+            def run():
+                try:
+                    self.last_sync = sync_with_peer(self.db_name, host, int(port or SYNC_PORT))
+                    self.last_sync['finished'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                except (OSError, ValueError, sqlite3.Error) as e:
+                    self.last_sync = {'error': str(e)}
+            
+            self.sync_thread = threading.Thread(target=run, daemon=True)
+            self.sync_thread.start()
+        self.root.after(SYNC_INTERVAL_MS, self.scheduled_sync)
+    
+    def sync_status_text(self):
+        if not self.sync_peer:
+            return "Head office sync is off (set STORE_SYNC_PEER)"
+        if not self.last_sync:
+            return f"Syncing with {self.sync_peer} every {SYNC_INTERVAL_MS // 60000} minutes"
+        if 'error' in self.last_sync:
+            return f"Last sync failed: {self.last_sync['error']}"
+        return (f"Last sync {self.last_sync['finished']}: sent {self.last_sync['sent']}, "
+                f"received {self.last_sync['received']}, {self.last_sync['conflicts']} conflicts, "
+                f"{self.last_sync['rows_per_sec']:.0f} rows/s")
+    
+    def get_store_group(self):
+        # Kept between visits so each store's cached results survive
+        if self.store_group is None:
+            self.store_group = StoreGroup(load_stores(self.db_name))
+        return self.store_group
+    
+    @measured('build')
+    def show_stores(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="All Stores", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        tk.Label(header, text=self.sync_status_text(), bg=self.colors['light'],
+                fg=self.colors['secondary'], font=('Segoe UI', 10)).pack(side='right')
+        
+        # Period and buttons
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 20))
+        
+        periods = {
+            "All time": None,
+            "Last 30 days": 30,
+            "Last 12 months": 365,
+        }
+        period_var = tk.StringVar(value="All time")
+        ttk.Combobox(control_frame, textvariable=period_var, values=list(periods),
+                    state='readonly', width=16, font=('Segoe UI', 11)).pack(side='left')
+        
+        status_label = tk.Label(control_frame, text="", bg=self.colors['light'],
+                               fg=self.colors['secondary'], font=('Segoe UI', 11))
+        status_label.pack(side='left', padx=15)
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="➕ Add Store", command=lambda: self.add_store_dialog(refresh),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🗑 Remove Store",
+                  command=lambda: self.remove_store(stores_tree, refresh),
+                  style='Delete.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🔄 Refresh", command=lambda: refresh(),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        def make_table(parent, columns, widths, height=None):
+            frame = tk.Frame(parent, bg=self.colors['white'])
+            scrollbar = ttk.Scrollbar(frame)
+            scrollbar.pack(side='right', fill='y')
+            tree = ttk.Treeview(frame, columns=columns, show='headings',
+                               yscrollcommand=scrollbar.set, height=height)
+            tree.pack(fill='both', expand=True)
+            scrollbar.config(command=tree.yview)
+            for column, width in zip(columns, widths):
+                tree.heading(column, text=column)
+                tree.column(column, width=width, anchor='w' if width > 120 else 'e')
+            return frame, tree
+        
+        # Per-store totals, with the combined figures last
+        stores_frame, stores_tree = make_table(
+            self.main_container, ('Store', 'Products', 'Customers', 'Sales', 'Revenue', 'Time'),
+            (260, 100, 100, 100, 120, 110), height=6)
+        stores_frame.pack(fill='x', padx=30, pady=(0, 15))
+        
+        bottom = tk.Frame(self.main_container, bg=self.colors['light'])
+        bottom.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        products_frame, products_tree = make_table(bottom, ('Product', 'Quantity', 'Revenue'), (240, 90, 110))
+        products_frame.pack(side='left', fill='both', expand=True, padx=(0, 8))
+        
+        periods_frame, periods_tree = make_table(bottom, ('Month', 'Sales', 'Revenue'), (140, 90, 110))
+        periods_frame.pack(side='left', fill='both', expand=True, padx=(8, 0))
+        
+        def refresh(*args):
+            days = periods[period_var.get()]
+            start = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d") if days else None
+            status_label.config(text="Loading...")
+            self.load_stores_view(stores_tree, products_tree, periods_tree, status_label, start)
+        
+        period_var.trace_add('write', refresh)
+        refresh()
+    
+    @measured('populate')
+    def load_stores_view(self, stores_tree, products_tree, periods_tree, status_label, start=None):
+        group = self.get_store_group()
+        result = {}
+        
+        def run():
+            started = time.perf_counter()
+            try:
+                result['totals'] = group.totals()
+                result['products'] = group.top_products(start=start)[1]
+                result['periods'] = group.revenue_by_period(start=start)[1]
+            except RuntimeError:
+                # The store list changed and this group was closed mid-load
+                result['error'] = "store list changed"
+            result['seconds'] = time.perf_counter() - started
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                self.root.after(50, poll)
+                return
+            if not stores_tree.winfo_exists() or 'error' in result:
+                return
+            for tree in (stores_tree, products_tree, periods_tree):
+                tree.delete(*tree.get_children())
+            
+            rows, combined = result['totals']
+            cached = 0
+            for shard, totals, seconds, hit, error in rows:
+                cached += hit
+                if error:
+                    stores_tree.insert('', 'end', iid=shard.path, values=(shard.name, error, '', '', '', ''))
+                else:
+                    products, customers, sales, revenue = totals
+                    timing = "cached" if hit else f"{seconds * 1000:.1f} ms"
+                    stores_tree.insert('', 'end', iid=shard.path, values=(
+                        shard.name, products, customers, sales, f"${revenue:.2f}", timing))
+            products, customers, sales, revenue = combined
+            stores_tree.insert('', 'end', values=("All stores", products, customers, sales,
+                                                  f"${revenue:.2f}", ""))
+            
+            for name, quantity, revenue in result['products']:
+                products_tree.insert('', 'end', values=(name, quantity, f"${revenue:.2f}"))
+            for period, count, revenue in reversed(result['periods']):
+                periods_tree.insert('', 'end', values=(period, count, f"${revenue:.2f}"))
+            
+            status_label.config(text=f"{len(rows)} stores in {result['seconds'] * 1000:.0f} ms "
+                                     f"({cached} served from cache)")
+        
+        poll()
+    
+    def add_store_dialog(self, refresh):
+        path = filedialog.askopenfilename(title="Select a store database",
+                                          filetypes=[("SQLite database", "*.db"), ("All files", "*.*")])
+        if not path:
+            return
+        name = simpledialog.askstring("Add Store", "Store name:",
+                                      initialvalue=os.path.splitext(os.path.basename(path))[0],
+                                      parent=self.root)
+        if not name:
+            return
+        
+        stores = load_stores(self.db_name)
+        stores.append((name.strip(), os.path.abspath(path)))
+        try:
+            save_stores(self.db_name, stores)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save store list: {e}")
+            return
+        self.reset_store_group()
+        refresh()
+    
+    def remove_store(self, tree, refresh):
+        selection = tree.selection()
+        stores = load_stores(self.db_name)
+        if not selection or selection[0] not in [path for _, path in stores[1:]]:
+            messagebox.showwarning("Selection Error", "Please select a registered store to remove")
+            return
+        
+        if messagebox.askyesno("Confirm Remove", "Remove this store from the combined view?\n"
+                                                 "Its database file is not touched."):
+            try:
+                save_stores(self.db_name, [store for store in stores if store[1] != selection[0]])
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to save store list: {e}")
+                return
+            self.reset_store_group()
+            refresh()
+    
+    def reset_store_group(self):
+        if self.store_group:
+            self.store_group.close()
+            self.store_group = None
+    
+    @measured('build')
+    def show_journal(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="Change Journal", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        # Buttons
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 20))
+        
+        tk.Label(control_frame, text="Latest 500 writes from every till",
+                bg=self.colors['light'], fg=self.colors['secondary'],
+                font=('Segoe UI', 11)).pack(side='left')
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="🗑 Prune Old Entries",
+                  command=lambda: self.prune_journal_dialog(tree),
+                  style='Delete.TButton').pack(side='left', padx=5)
+        
+        # Table
+        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        tree = ttk.Treeview(table_frame, columns=('Time', 'Terminal', 'Table', 'Row', 'Op', 'Old', 'New'),
+                           show='headings', yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        
+        tree.heading('Time', text='Time')
+        tree.heading('Terminal', text='Terminal')
+        tree.heading('Table', text='Table')
+        tree.heading('Row', text='Row')
+        tree.heading('Op', text='Action')
+        tree.heading('Old', text='Old Values')
+        tree.heading('New', text='New Values')
+        
+        tree.column('Time', width=150, anchor='center')
+        tree.column('Terminal', width=100, anchor='w')
+        tree.column('Table', width=80, anchor='w')
+        tree.column('Row', width=60, anchor='center')
+        tree.column('Op', width=70, anchor='center')
+        tree.column('Old', width=200, anchor='w')
+        tree.column('New', width=200, anchor='w')
+        
+        self.load_journal(tree)
+    
+    @measured('populate')
+    def load_journal(self, tree):
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        actions = {'I': 'Insert', 'U': 'Update', 'D': 'Delete'}
+        try:
+            conn = self.get_db_connection()
+            for changed_at, terminal, table, row_id, op, old_values, new_values in journal_entries(conn):
+                when = datetime.fromtimestamp(changed_at / 1000).strftime("%Y-%m-%d %H:%M:%S")
+                tree.insert('', 'end', values=(when, terminal or '-', table, row_id, actions.get(op, op),
+                                               old_values or '', new_values or ''))
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load journal: {e}")
+    
+    def prune_journal_dialog(self, tree):
+        days = simpledialog.askinteger("Prune Journal", "Delete entries older than how many days?",
+                                       initialvalue=365, minvalue=1, parent=self.root)
+        if not days:
+            return
+        
+        try:
+            before = datetime.now() - timedelta(days=days)
+            removed = self.write_queue.write_alone(lambda conn: prune_journal(self.db_name, before, conn))
+            messagebox.showinfo("Success", f"{removed} journal entries removed")
+            self.load_journal(tree)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to prune journal: {e}")
+    
+    @measured('build')
+    def show_promotions(self):
+        self.clear_main_container()
+        
+        # Header
+        header = tk.Frame(self.main_container, bg=self.colors['light'])
+        header.pack(fill='x', padx=30, pady=(30, 20))
+        
+        tk.Label(header, text="Promotions", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 24, 'bold')).pack(side='left')
+        
+        # Buttons section
+        control_frame = tk.Frame(self.main_container, bg=self.colors['light'])
+        control_frame.pack(fill='x', padx=30, pady=(0, 20))
+        
+        button_frame = tk.Frame(control_frame, bg=self.colors['light'])
+        button_frame.pack(side='right')
+        
+        ttk.Button(button_frame, text="➕ Add Promotion",
+                  command=lambda: self.add_promotion_dialog(),
+                  style='Action.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="⏯ Enable/Disable",
+                  command=lambda: self.toggle_promotion(tree),
+                  style='Success.TButton').pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="🗑 Delete",
+                  command=lambda: self.delete_promotion(tree),
+                  style='Delete.TButton').pack(side='left', padx=5)
+        
+        # Table
+        table_frame = tk.Frame(self.main_container, bg=self.colors['white'])
+        table_frame.pack(fill='both', expand=True, padx=30, pady=(0, 30))
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        tree = ttk.Treeview(table_frame, columns=('ID', 'Name', 'Rule', 'Product', 'AppliesTo', 'Window', 'Active'),
+                           show='headings', yscrollcommand=scrollbar.set)
+        tree.pack(fill='both', expand=True)
+        scrollbar.config(command=tree.yview)
+        
+        tree.heading('ID', text='ID')
+        tree.heading('Name', text='Name')
+        tree.heading('Rule', text='Rule')
+        tree.heading('Product', text='Product')
+        tree.heading('AppliesTo', text='Applies To')
+        tree.heading('Window', text='Valid')
+        tree.heading('Active', text='Active')
+        
+        tree.column('ID', width=50, anchor='center')
+        tree.column('Name', width=160, anchor='w')
+        tree.column('Rule', width=150, anchor='w')
+        tree.column('Product', width=140, anchor='w')
+        tree.column('AppliesTo', width=140, anchor='w')
+        tree.column('Window', width=180, anchor='center')
+        tree.column('Active', width=60, anchor='center')
+        
+        self.load_promotions(tree)
+    
+    @measured('populate')
+    def load_promotions(self, tree):
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        try:
+            conn = self.get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT pr.id_promotion, pr.name, pr.kind, pr.value, pr.buy_qty, pr.free_qty,
+                       p.name, c.name, pr.customer_tier, pr.starts_at, pr.ends_at, pr.active
+                FROM Promotion pr
+                LEFT JOIN Product p ON pr.id_product = p.id_product
+                LEFT JOIN Customer c ON pr.id_customer = c.id_customer
+                ORDER BY pr.id_promotion DESC
+            """)
+            
+            for (promotion_id, name, kind, value, buy_qty, free_qty, product, customer,
+                 tier, starts_at, ends_at, active) in cursor.fetchall():
+                applies_to = customer or (f"{tier} tier" if tier else "All customers")
+                window = f"{starts_at or '...'} → {ends_at or '...'}"
+                tree.insert('', 'end', iid=str(promotion_id),
+                           values=(promotion_id, name, describe_promotion(kind, value, buy_qty, free_qty),
+                                   product or "All products", applies_to, window,
+                                   "Yes" if active else "No"))
+            
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load promotions: {e}")
+    
+    def add_promotion_dialog(self):
+        try:
+            conn = self.get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id_product, name FROM Product")
+            products = cursor.fetchall()
+            
+            cursor.execute("SELECT id_customer, name FROM Customer")
+            customers = cursor.fetchall()
+            
+            conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load data: {e}")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Add Promotion")
+        dialog.geometry("520x520")
+        dialog.resizable(False, False)
+        dialog.configure(bg=self.colors['light'])
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center dialog
+        dialog.update_idletasks()
+        x = (dialog.winfo_screenwidth() // 2) - (dialog.winfo_width() // 2)
+        y = (dialog.winfo_screenheight() // 2) - (dialog.winfo_height() // 2)
+        dialog.geometry(f"+{x}+{y}")
+        
+        # Form
+        form_frame = tk.Frame(dialog, bg=self.colors['light'])
+        form_frame.pack(expand=True, padx=40, pady=30)
+        
+        kind_names = {'percent': "Percentage off", 'fixed': "Fixed amount off each",
+                      'bxgy': "Buy X get Y free"}
+        # Scope choices: (label, id_customer, customer_tier)
+        scopes = ([("All customers", None, None)] +
+                  [(f"{tier} tier", None, tier) for tier in CUSTOMER_TIERS] +
+                  [(f"Customer: {c[1]}", c[0], None) for c in customers])
+        
+        fields = {}
+        
+        def add_field(row, label, widget):
+            tk.Label(form_frame, text=label, bg=self.colors['light'],
+                    fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=row, column=0, sticky='w', pady=5, padx=(0, 15))
+            widget.grid(row=row, column=1, sticky='w', pady=5)
+            return widget
+        
+        fields['name'] = add_field(0, "Name:", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        fields['name'].focus()
+        fields['kind'] = add_field(1, "Rule:", ttk.Combobox(form_frame, values=[kind_names[k] for k in PROMOTION_KINDS],
+                                                           state='readonly', width=22, font=('Segoe UI', 11)))
+        fields['kind'].current(0)
+        fields['value'] = add_field(2, "Value (% or $):", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        fields['buy_qty'] = add_field(3, "Buy quantity:", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        fields['free_qty'] = add_field(4, "Free quantity:", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        fields['product'] = add_field(5, "Product:", ttk.Combobox(form_frame, values=["All products"] + [p[1] for p in products],
+                                                                 state='readonly', width=22, font=('Segoe UI', 11)))
+        fields['product'].current(0)
+        fields['scope'] = add_field(6, "Applies to:", ttk.Combobox(form_frame, values=[s[0] for s in scopes],
+                                                                  state='readonly', width=22, font=('Segoe UI', 11)))
+        fields['scope'].current(0)
+        fields['starts_at'] = add_field(7, "Starts (YYYY-MM-DD):", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        fields['ends_at'] = add_field(8, "Until (YYYY-MM-DD):", ttk.Entry(form_frame, width=24, font=('Segoe UI', 11)))
+        
+        def save_promotion():
+            name = fields['name'].get().strip()
+            if not name:
+                messagebox.showwarning("Input Error", "Please enter a name")
+                return
+            
+            kind = PROMOTION_KINDS[fields['kind'].current()]
+            try:
+                value = float(fields['value'].get().strip() or 0)
+                buy_qty = int(fields['buy_qty'].get().strip() or 0)
+                free_qty = int(fields['free_qty'].get().strip() or 0)
+                dates = []
+                for key in ('starts_at', 'ends_at'):
+                    text = fields[key].get().strip()
+                    if text:
+                        datetime.strptime(text, "%Y-%m-%d")
+                    dates.append(text or None)
+            except ValueError:
+                messagebox.showerror("Input Error", "Check the numbers and dates (YYYY-MM-DD)")
+                return
+            
+            if value < 0 or buy_qty < 0 or free_qty < 0:
+                messagebox.showwarning("Input Error", "Values cannot be negative")
+                return
+            if kind == 'bxgy' and (buy_qty <= 0 or free_qty <= 0):
+                messagebox.showwarning("Input Error", "Buy and free quantities are required")
+                return
+            
+            product_index = fields['product'].current()
+            product_id = products[product_index - 1][0] if product_index > 0 else None
+            _, customer_id, tier = scopes[fields['scope'].current()]
+            
+            try:
+                self.execute_write("""
+                    INSERT INTO Promotion (name, kind, value, buy_qty, free_qty, id_product,
+                                           id_customer, customer_tier, starts_at, ends_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (name, kind, value, buy_qty or None, free_qty or None, product_id,
+                      customer_id, tier, dates[0], dates[1]))
+                
+                messagebox.showinfo("Success", "Promotion added successfully")
+                dialog.destroy()
+                self.show_promotions()
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to add promotion: {e}")
+        
+        button_frame = tk.Frame(form_frame, bg=self.colors['light'])
+        button_frame.grid(row=9, column=0, columnspan=2, pady=(20, 0))
+        
+        ttk.Button(button_frame, text="Save", command=save_promotion,
+                  style='Action.TButton', width=12).pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy,
+                  style='Delete.TButton', width=12).pack(side='left', padx=5)
+    
+    def toggle_promotion(self, tree):
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("Selection Error", "Please select a promotion")
+            return
+        
+        try:
+            self.execute_write("UPDATE Promotion SET active = 1 - active WHERE id_promotion=?",
+                         (int(selection[0]),))
+            self.load_promotions(tree)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to update promotion: {e}")
+    
+    def delete_promotion(self, tree):
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("Selection Error", "Please select a promotion to delete")
+            return
+        
+        promotion_name = tree.item(selection[0])['values'][1]
+        if messagebox.askyesno("Confirm Delete",
+                              f"Are you sure you want to delete '{promotion_name}'?"):
+            try:
+                self.execute_write("DELETE FROM Promotion WHERE id_promotion=?", (int(selection[0]),))
+                
+                messagebox.showinfo("Success", "Promotion deleted successfully")
+                self.show_promotions()
+            except sqlite3.Error as e:
+                messagebox.showerror("Database Error", f"Failed to delete promotion: {e}")
+    
+    def print_receipt(self, sale):
+        # Rendering happens in a worker process; checkout never waits for it
+        try:
+            if self.receipt_pool is None:
+                self.receipt_pool = make_pool(1)
+            try:
+                submit_receipt(self.receipt_pool, self.db_name, sale)
+            except BrokenProcessPool:
+                # The worker died on an earlier receipt; start a fresh one
+                self.receipt_pool.shutdown(wait=False)
+                self.receipt_pool = make_pool(1)
+                submit_receipt(self.receipt_pool, self.db_name, sale)
+        except (OSError, RuntimeError) as e:
+            messagebox.showwarning("Receipt", f"Could not queue the receipt: {e}")
+    
+    def invoices_dialog(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Generate Invoices")
+        dialog.geometry("400x330")
+        dialog.resizable(False, False)
+        dialog.configure(bg=self.colors['light'])
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center dialog
+        dialog.update_idletasks()
+        x = (dialog.winfo_screenwidth() // 2) - (dialog.winfo_width() // 2)
+        y = (dialog.winfo_screenheight() // 2) - (dialog.winfo_height() // 2)
+        dialog.geometry(f"+{x}+{y}")
+        
+        # Form
+        form_frame = tk.Frame(dialog, bg=self.colors['light'])
+        form_frame.pack(expand=True, padx=40, pady=30)
+        
+        tk.Label(form_frame, text="From (YYYY-MM-DD):", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=0, column=0, sticky='w', pady=(0, 5))
+        
+        start_entry = ttk.Entry(form_frame, width=30, font=('Segoe UI', 11))
+        start_entry.grid(row=1, column=0, pady=(0, 15))
+        start_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        
+        tk.Label(form_frame, text="To, inclusive (YYYY-MM-DD):", bg=self.colors['light'],
+                fg=self.colors['text'], font=('Segoe UI', 11)).grid(row=2, column=0, sticky='w', pady=(0, 5))
+        
+        end_entry = ttk.Entry(form_frame, width=30, font=('Segoe UI', 11))
+        end_entry.grid(row=3, column=0, pady=(0, 15))
+        end_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        
+        format_combo = ttk.Combobox(form_frame, values=FORMATS, state='readonly',
+                                   width=28, font=('Segoe UI', 11))
+        format_combo.grid(row=4, column=0, pady=(0, 15))
+        format_combo.set('pdf')
+        
+        status_label = tk.Label(form_frame, text="", bg=self.colors['light'],
+                               fg=self.colors['secondary'], font=('Segoe UI', 10))
+        status_label.grid(row=5, column=0)
+        
+        def generate():
+            if self.invoice_thread and self.invoice_thread.is_alive():
+                return
+            try:
+                start = datetime.strptime(start_entry.get().strip(), "%Y-%m-%d")
+                end = datetime.strptime(end_entry.get().strip(), "%Y-%m-%d") + timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Input Error", "Dates must be in YYYY-MM-DD format")
+                return
+            fmt = format_combo.get()
+            progress = {'count': 0}
+            self.last_invoices = None
+            
+            def run():
+                try:
+                    self.last_invoices = generate_invoices(
+                        self.db_name, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), fmt,
+                        progress=lambda count: progress.update(count=count))
+                except Exception as e:
+                    # Besides database and file errors: a broken pool, or a
+                    # renderer's error re-raised from its worker as is
+                    self.last_invoices = e
+            
+            self.invoice_thread = threading.Thread(target=run, daemon=True)
+            self.invoice_thread.start()
+            
+            def poll():
+                if self.invoice_thread.is_alive():
+                    if status_label.winfo_exists():
+                        status_label.config(text=f"{progress['count']} invoices written...")
+                    self.root.after(200, poll)
+                elif isinstance(self.last_invoices, Exception):
+                    messagebox.showerror("Invoice Error", f"Failed to generate invoices: {self.last_invoices}")
+                elif self.last_invoices is None:
+                    messagebox.showerror("Invoice Error", "Invoice generation stopped without a result")
+                else:
+                    count, seconds, out_dir = self.last_invoices
+                    messagebox.showinfo("Success", f"{count} invoices written to {out_dir} in {seconds:.1f}s")
+                    if dialog.winfo_exists():
+                        dialog.destroy()
+            
+            poll()
+        
+        button_frame = tk.Frame(form_frame, bg=self.colors['light'])
+        button_frame.grid(row=6, column=0, pady=(10, 0))
+        
+        ttk.Button(button_frame, text="Generate", command=generate,
+                  style='Action.TButton', width=12).pack(side='left', padx=5)
+        
+        ttk.Button(button_frame, text="Close", command=dialog.destroy,
+                  style='Delete.TButton', width=12).pack(side='left', padx=5)
 
 
 if __name__ == "__main__":
+    # --profile-startup prints a per-phase breakdown once the dashboard has loaded
+    profiler = StartupProfiler('--profile-startup' in sys.argv, STARTED)
+    profiler.mark("imports")
     root = tk.Tk()
-    app = StoreInventoryApp(root)
+    profiler.mark("tk init")
+    app = StoreInventoryApp(root, profiler)
     root.mainloop()
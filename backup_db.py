@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from db_schema import connect, upgrade_schema
+
+BACKUP_DIR = 'backups'
+BACKUP_LOG = 'backup_log.csv'
+BACKUP_INTERVAL_MS = 60 * 60 * 1000
+KEEP_BACKUPS = 7
+
+# Copy a few hundred pages per step and sleep in between so writers on other
+# tills can take the lock while a backup is running
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.01
+
+
+def backup_dir(db_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), BACKUP_DIR)
+
+
+def list_backups(db_name):
+    # Newest first; names embed a sortable timestamp
+    folder = backup_dir(db_name)
+    if not os.path.isdir(folder):
+        return []
+    prefix = os.path.splitext(os.path.basename(db_name))[0] + "_"
+    names = [name for name in os.listdir(folder)
+             if name.startswith(prefix) and name.endswith(".db")]
+    return [os.path.join(folder, name) for name in sorted(names, reverse=True)]
+
+
+def backup_database(db_name, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    folder = backup_dir(db_name)
+    os.makedirs(folder, exist_ok=True)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = os.path.splitext(os.path.basename(db_name))[0]
+    path, partial = claim_backup_path(folder, f"{name}_{stamp}")
+
+    def on_progress(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+
+    start = time.perf_counter()
+    try:
+        source = sqlite3.connect(db_name)
+        target = sqlite3.connect(partial)
+        try:
+            source.backup(target, pages=pages, progress=on_progress, sleep=sleep)
+        finally:
+            target.close()
+            source.close()
+    except BaseException:
+        os.remove(partial)
+        raise
+    # Only complete snapshots ever carry the .db name
+    os.replace(partial, path)
+    seconds = time.perf_counter() - start
+
+    size = os.path.getsize(path)
+    result = {
+        'path': path,
+        'seconds': seconds,
+        'bytes': size,
+        'mb_per_sec': (size / (1024 * 1024)) / seconds if seconds > 0 else 0.0,
+    }
+    log_backup(db_name, result)
+    return result
+
+
+def claim_backup_path(folder, base):
+    # (path, partial path) for a new backup. The .part file is created
+    # exclusively, so two backups started within the same second, even
+    # from two tills, get different names; the later one sorts first.
+    for attempt in range(1, 1000):
+        stem = base if attempt == 1 else f"{base}_{attempt:03d}"
+        path = os.path.join(folder, stem + ".db")
+        if os.path.exists(path):
+            continue
+        try:
+            with open(path + ".part", 'x'):
+                pass
+        except FileExistsError:
+            continue
+        return path, path + ".part"
+    raise FileExistsError(f"no free backup name for {base}")
+
+
+def log_backup(db_name, result):
+    log_path = os.path.join(backup_dir(db_name), BACKUP_LOG)
+    is_new = not os.path.exists(log_path)
+    with open(log_path, 'a') as log:
+        if is_new:
+            log.write("finished,file,bytes,seconds,mb_per_sec\n")
+        log.write(f"{datetime.now().isoformat(timespec='seconds')},"
+                  f"{os.path.basename(result['path'])},{result['bytes']},"
+                  f"{result['seconds']:.3f},{result['mb_per_sec']:.2f}\n")
+
+
+def rotate_backups(db_name, keep=KEEP_BACKUPS):
+    removed = []
+    for path in list_backups(db_name)[keep:]:
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def restore_backup(db_name, backup_path):
+    # Copy through the backup API so other connections see either the old or
+    # the restored database, never a half-written file
+    source = sqlite3.connect(backup_path)
+    target = sqlite3.connect(db_name)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    # A backup taken before an upgrade has the old schema; the app's
+    # long-lived connections expect the current one
+    conn = connect(db_name)
+    try:
+        upgrade_schema(conn)
+    finally:
+        conn.close()
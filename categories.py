@@ -0,0 +1,91 @@
+import sqlite3
+
+# The changes below don't commit: the app runs each one as a single queued
+# write, and other callers commit when they are done.
+
+
+def add_category(conn, name, parent_id=None):
+    # The insert trigger links it into CategoryTree and creates its stats row
+    cursor = conn.execute("INSERT INTO Category (name, parent_id) VALUES (?, ?)", (name, parent_id))
+    return cursor.lastrowid
+
+
+def rename_category(conn, category_id, name):
+    conn.execute("UPDATE Category SET name = ? WHERE id_category = ?", (name, category_id))
+
+
+def move_category(conn, category_id, parent_id):
+    # Re-hang a whole subtree under parent_id (None for the top level)
+    if parent_id is not None and conn.execute("""
+            SELECT 1 FROM CategoryTree WHERE ancestor_id = ? AND descendant_id = ?
+        """, (category_id, parent_id)).fetchone():
+        raise sqlite3.IntegrityError("A category can't be moved inside itself")
+
+    products, revenue = conn.execute(
+        "SELECT product_count, revenue FROM CategoryStats WHERE id_category = ?",
+        (category_id,)).fetchone()
+    take_from_ancestors = """
+        UPDATE CategoryStats SET product_count = product_count - ?, revenue = revenue - ?
+        WHERE id_category IN (SELECT ancestor_id FROM CategoryTree
+                              WHERE descendant_id = ? AND depth > 0)
+    """
+    conn.execute(take_from_ancestors, (products, revenue, category_id))
+
+    # Cut the subtree loose from its old ancestors, then join it to the new ones
+    conn.execute("""
+        DELETE FROM CategoryTree
+        WHERE descendant_id IN (SELECT descendant_id FROM CategoryTree WHERE ancestor_id = :id)
+          AND ancestor_id NOT IN (SELECT descendant_id FROM CategoryTree WHERE ancestor_id = :id)
+    """, {'id': category_id})
+    if parent_id is not None:
+        conn.execute("""
+            INSERT INTO CategoryTree (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM CategoryTree above, CategoryTree below
+            WHERE above.descendant_id = ? AND below.ancestor_id = ?
+        """, (parent_id, category_id))
+    conn.execute(take_from_ancestors, (-products, -revenue, category_id))
+
+    conn.execute("UPDATE Category SET parent_id = ? WHERE id_category = ?", (parent_id, category_id))
+
+
+def delete_category(conn, category_id):
+    # Only childless categories; their products move up to the parent
+    if conn.execute("SELECT 1 FROM Category WHERE parent_id = ? LIMIT 1", (category_id,)).fetchone():
+        raise sqlite3.IntegrityError("Delete or move its subcategories first")
+    parent_id = conn.execute("SELECT parent_id FROM Category WHERE id_category = ?",
+                             (category_id,)).fetchone()[0]
+    conn.execute("UPDATE Product SET id_category = ? WHERE id_category = ?", (parent_id, category_id))
+    conn.execute("DELETE FROM Category WHERE id_category = ?", (category_id,))
+
+
+def category_tree(conn):
+    # [(id, name, parent_id, depth, product_count, revenue)] depth-first,
+    # siblings by name, with the subtree totals kept by the triggers
+    rows = conn.execute("""
+        SELECT c.id_category, c.name, c.parent_id, s.product_count, s.revenue
+        FROM Category c JOIN CategoryStats s ON s.id_category = c.id_category
+        ORDER BY c.name
+    """).fetchall()
+    children = {}
+    for row in rows:
+        children.setdefault(row[2], []).append(row)
+
+    ordered = []
+    stack = [(row, 0) for row in reversed(children.get(None, []))]
+    while stack:
+        (category_id, name, parent_id, products, revenue), depth = stack.pop()
+        ordered.append((category_id, name, parent_id, depth, products, revenue))
+        stack.extend((child, depth + 1) for child in reversed(children.get(category_id, [])))
+    return ordered
+
+
+def subtree_filter(category_id):
+    # SQL condition and parameters restricting Product p to a subtree
+    return ("p.id_category IN (SELECT descendant_id FROM CategoryTree WHERE ancestor_id = ?)",
+            [category_id])
+
+
+def subtree_ids(conn, category_id):
+    return {row[0] for row in conn.execute(
+        "SELECT descendant_id FROM CategoryTree WHERE ancestor_id = ?", (category_id,))}
@@ -0,0 +1,54 @@
+from db_schema import connect
+
+CHANGE_POLL_MS = 1000
+CHANGE_PRUNE_MS = 10 * 60 * 1000
+KEEP_CHANGES = 10000
+
+
+class ChangeTracker:
+    # Keeps one long-lived connection so PRAGMA data_version can tell, without
+    # touching any table, whether another connection has committed since the
+    # last poll; only then is the ChangeLog read past the last seen sequence
+    def __init__(self, db_name):
+        self.conn = connect(db_name)
+        self.data_version = self.read_data_version()
+        self.last_seq = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+
+    def read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def poll(self):
+        version = self.read_data_version()
+        if version == self.data_version:
+            return []
+        self.data_version = version
+
+        newest = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+        if newest < self.last_seq:
+            # The file was replaced (a backup restored) and the log started
+            # over below the cursor: None, anything may have changed
+            self.last_seq = newest
+            return None
+        changes = self.conn.execute("""
+            SELECT seq, table_name, row_id, op FROM ChangeLog
+            WHERE seq > ? ORDER BY seq
+        """, (self.last_seq,)).fetchall()
+        if changes:
+            self.last_seq = changes[-1][0]
+        return changes
+
+    def close(self):
+        self.conn.close()
+
+
+def changed_ids(changes, table):
+    return {row_id for _, table_name, row_id, _ in changes if table_name == table}
+
+
+def prune_changes(conn, keep=KEEP_CHANGES):
+    # Keeps the newest keep entries; the caller commits
+    conn.execute("""
+        DELETE FROM ChangeLog
+        WHERE seq <= (SELECT MAX(seq) FROM ChangeLog) - ?
+    """, (keep,))
@@ -3,6 +3,10 @@ import sqlite3
 # Connect to database
 db = sqlite3.connect("store_inventory.db")
 
+# Lets the maintenance job return freed pages a slice at a time; this must be
+# set before the first table is created
+db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
 # Create Product table
 db.execute("""
 CREATE TABLE IF NOT EXISTS Product (
@@ -29,10 +33,12 @@ CREATE TABLE IF NOT EXISTS Sale (
     id_customer INTEGER,
     quantity INTEGER NOT NULL,
     total_price REAL NOT NULL,
+    sale_date TEXT,
     FOREIGN KEY (id_product) REFERENCES Product(id_product),
     FOREIGN KEY (id_customer) REFERENCES Customer(id_customer)
 )
 """)
+db.execute("CREATE INDEX IF NOT EXISTS idx_sale_date ON Sale(sale_date)")
 
 # Insert sample data
 db.execute("INSERT INTO Product (name, price) VALUES (?, ?)", ("Laptop", 1200))
@@ -0,0 +1,28 @@
+PAGE_SIZE = 25
+
+
+def customer_summary(conn, customer_id):
+    # (purchases, lifetime spend, last purchase date) from CustomerStats
+    row = conn.execute("""
+        SELECT sale_count, lifetime_spend, last_purchase
+        FROM CustomerStats WHERE id_customer = ?
+    """, (customer_id,)).fetchone()
+    return row or (0, 0.0, None)
+
+
+def purchase_page(conn, customer_id, before_sale=None, limit=PAGE_SIZE):
+    # Newest-first page of a customer's sales. Keyset pagination on id_sale
+    # walks idx_sale_customer directly, so deep pages cost the same as the first.
+    query = """
+        SELECT s.id_sale, s.sale_date, p.name, s.quantity, s.total_price
+        FROM Sale s INDEXED BY idx_sale_customer
+        LEFT JOIN Product p ON s.id_product = p.id_product
+        WHERE s.id_customer = ?
+    """
+    params = [customer_id]
+    if before_sale is not None:
+        query += " AND s.id_sale < ?"
+        params.append(before_sale)
+    query += " ORDER BY s.id_sale DESC LIMIT ?"
+    params.append(limit)
+    return conn.execute(query, params).fetchall()
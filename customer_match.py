@@ -0,0 +1,199 @@
+import difflib
+import re
+import time
+import unicodedata
+
+from db_schema import PHONE_KEY_DIGITS, connect
+
+NAME_SIMILARITY = 0.85
+TIER_RANK = {'Standard': 0, 'Silver': 1, 'Gold': 2}
+
+
+def phone_key(phone):
+    # Python twin of db_schema.PHONE_KEY_SQL
+    if phone is None:
+        return None
+    digits = re.sub(r"[ \-.()+/]", "", phone)
+    return digits[-PHONE_KEY_DIGITS:] if digits else None
+
+
+def phone_search_range(term):
+    # Index range on phone_key for what a cashier types: a full number
+    # matches exactly, a partial one from its first digits (trunk 0 dropped).
+    # None if the term doesn't look like a phone number.
+    if not re.fullmatch(r"[\d \-.()+/]+", term or ""):
+        return None
+    digits = re.sub(r"\D", "", term)
+    if len(digits) < 3:
+        return None
+    if len(digits) >= PHONE_KEY_DIGITS:
+        key = digits[-PHONE_KEY_DIGITS:]
+        return key, key
+    prefix = digits.lstrip("0") or digits
+    return prefix, prefix + "\uffff"
+
+
+def find_by_phone(conn, phone):
+    key = phone_key(phone)
+    if not key:
+        return []
+    return conn.execute("""
+        SELECT id_customer, name, phone, tier FROM Customer WHERE phone_key = ?
+    """, (key,)).fetchall()
+
+
+def name_key(name):
+    # Lowercase, accents stripped, words sorted: "Ben Ali, Yassin" == "yassin ben-ali"
+    text = unicodedata.normalize('NFKD', name or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(sorted(re.findall(r"[a-z0-9]+", text)))
+
+
+def similar_names(a, b):
+    key_a, key_b = name_key(a), name_key(b)
+    if not key_a or not key_b:
+        return False
+    if key_a == key_b or set(key_a.split()) <= set(key_b.split()) or set(key_b.split()) <= set(key_a.split()):
+        return True
+    return difflib.SequenceMatcher(None, key_a, key_b).ratio() >= NAME_SIMILARITY
+
+
+def find_duplicates(conn):
+    # Clusters of likely duplicates as [survivor, duplicate, ...] customer rows
+    # (id, name, phone, tier, sale_count). Customers are only compared within
+    # blocks sharing a phone key or a name key, never all pairs:
+    #   same phone and similar names, or
+    #   same name and phones that agree or are missing.
+    # A cluster never holds two different phones: a customer with no phone
+    # whose name is shared by several numbers could be any of them, so it
+    # joins none.
+    customers = conn.execute("""
+        SELECT c.id_customer, c.name, c.phone, c.tier, COALESCE(s.sale_count, 0), c.phone_key
+        FROM Customer c LEFT JOIN CustomerStats s ON s.id_customer = c.id_customer
+    """).fetchall()
+    by_id = {row[0]: row for row in customers}
+
+    blocks = {}
+    for row in customers:
+        if row[5]:
+            blocks.setdefault(('phone', row[5]), []).append(row)
+        key = name_key(row[1])
+        if key:
+            blocks.setdefault(('name', key), []).append(row)
+
+    parent = {row[0]: row[0] for row in customers}
+    # Phone keys in each cluster, by root
+    phones = {row[0]: {row[5]} if row[5] else set() for row in customers}
+
+    def find(customer_id):
+        while parent[customer_id] != customer_id:
+            parent[customer_id] = parent[parent[customer_id]]
+            customer_id = parent[customer_id]
+        return customer_id
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b or len(phones[root_a] | phones[root_b]) > 1:
+            return
+        parent[root_a] = root_b
+        phones[root_b] |= phones.pop(root_a)
+
+    # Phone blocks first: a shared number is the stronger evidence
+    for (kind, _), members in sorted(blocks.items(), key=lambda block: block[0][0] != 'phone'):
+        if len(members) < 2:
+            continue
+        if kind == 'name' and len({row[5] for row in members if row[5]}) > 1:
+            # Only customers with the same number can match in this block
+            members = [row for row in members if row[5]]
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if kind == 'phone':
+                    match = similar_names(a[1], b[1])
+                else:
+                    match = not a[5] or not b[5] or a[5] == b[5]
+                if match:
+                    union(a[0], b[0])
+
+    clusters = {}
+    for customer_id in parent:
+        clusters.setdefault(find(customer_id), []).append(by_id[customer_id][:5])
+
+    result = []
+    for members in clusters.values():
+        if len(members) > 1:
+            # Keep the customer with the most purchases, then the oldest
+            members.sort(key=lambda row: (-row[4], row[0]))
+            result.append(members)
+    result.sort(key=lambda members: members[0][1].lower())
+    return result
+
+
+def merge_duplicates(db_name, clusters, conn=None):
+    # Folds every duplicate into its cluster's survivor in one transaction:
+    # sales and promotions are reassigned, a missing phone is filled in, the
+    # best tier kept and the duplicates deleted. Returns (customers merged,
+    # sales moved, seconds). conn, if given, is used instead of a connection
+    # of its own and left open; it must be in autocommit mode (the write
+    # queue's is).
+    start = time.perf_counter()
+    own = conn is None
+    if own:
+        conn = connect(db_name)
+        conn.isolation_level = None
+    merged = moved = 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for survivor, *duplicates in clusters:
+            survivor_id = survivor[0]
+            duplicate_ids = [row[0] for row in duplicates]
+            placeholders = ",".join("?" * len(duplicate_ids))
+
+            # The Sale update trigger moves hot sales between CustomerStats
+            # rows; what's left on a duplicate is its archived history
+            moved += conn.execute(f"UPDATE Sale SET id_customer = ? WHERE id_customer IN ({placeholders})",
+                                  [survivor_id] + duplicate_ids).rowcount
+            count, spend, last = conn.execute(f"""
+                SELECT COALESCE(SUM(sale_count), 0), COALESCE(SUM(lifetime_spend), 0), MAX(last_purchase)
+                FROM CustomerStats WHERE id_customer IN ({placeholders})
+            """, duplicate_ids).fetchone()
+            conn.execute("""
+                INSERT INTO CustomerStats (id_customer, sale_count, lifetime_spend, last_purchase)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id_customer) DO UPDATE SET
+                    sale_count = sale_count + excluded.sale_count,
+                    lifetime_spend = lifetime_spend + excluded.lifetime_spend,
+                    last_purchase = COALESCE(MAX(last_purchase, excluded.last_purchase),
+                                             last_purchase, excluded.last_purchase)
+            """, (survivor_id, count, spend, last))
+            conn.execute(f"DELETE FROM CustomerStats WHERE id_customer IN ({placeholders})", duplicate_ids)
+            conn.execute(f"UPDATE Promotion SET id_customer = ? WHERE id_customer IN ({placeholders})",
+                         [survivor_id] + duplicate_ids)
+
+            phone = survivor[2] or next((row[2] for row in duplicates if row[2]), None)
+            tier = max([survivor] + duplicates, key=lambda row: TIER_RANK.get(row[3], 0))[3]
+            conn.execute("UPDATE Customer SET phone = ?, tier = ? WHERE id_customer = ?",
+                         (phone, tier, survivor_id))
+            conn.execute(f"DELETE FROM Customer WHERE id_customer IN ({placeholders})", duplicate_ids)
+            merged += len(duplicate_ids)
+        conn.execute("COMMIT")
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if own:
+            conn.close()
+    return merged, moved, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    import sys
+    db_name = sys.argv[1] if len(sys.argv) > 1 else 'store_inventory.db'
+    conn = connect(db_name)
+    start = time.perf_counter()
+    clusters = find_duplicates(conn)
+    conn.close()
+    print(f"{len(clusters)} clusters found in {time.perf_counter() - start:.2f}s")
+    for survivor, *duplicates in clusters[:20]:
+        print(f"  {survivor[1]} ({survivor[2]}) <- " + ", ".join(f"{row[1]} ({row[2]})" for row in duplicates))
+    if '--merge' in sys.argv:
+        merged, moved, seconds = merge_duplicates(db_name, clusters)
+        print(f"Merged {merged} customers, moved {moved} sales in {seconds:.2f}s")
@@ -0,0 +1,467 @@
+import os
+import pathlib
+import socket
+import sqlite3
+
+# Identifies this till in the change journal
+TERMINAL_ID = os.environ.get('STORE_TERMINAL_ID') or socket.gethostname()
+
+# Bump whenever upgrade_schema() changes; lets startup skip the upgrade
+SCHEMA_VERSION = 8
+
+# Tables whose row changes are recorded in ChangeLog, with their primary key
+TRACKED_TABLES = {
+    'Product': 'id_product',
+    'Customer': 'id_customer',
+    'Sale': 'id_sale',
+}
+
+
+# Tables with no journal, small enough that readers keeping a copy (the
+# replica) re-read them whole; TableVersion counts the writes to each so
+# that only happens when one has moved
+VERSIONED_TABLES = ('Promotion', 'Category', 'CategoryTree', 'CategoryStats', 'SaleArchive',
+                    'ProductForecast')
+
+
+# Customer.phone_key: the phone's digits, last PHONE_KEY_DIGITS of them, so
+# "+212 6 12-34-56-78" and "0612345678" share a key. customer_match.phone_key()
+# is the same rule in Python.
+PHONE_KEY_DIGITS = 9
+PHONE_DIGITS_SQL = "replace(replace(replace(replace(replace(replace(replace(phone, ' ', ''), " \
+                   "'-', ''), '.', ''), '(', ''), ')', ''), '+', ''), '/', '')"
+PHONE_KEY_SQL = (f"CASE WHEN {PHONE_DIGITS_SQL} = '' THEN NULL "
+                 f"ELSE substr({PHONE_DIGITS_SQL}, -{PHONE_KEY_DIGITS}) END")
+
+# Local time in sale_date's format, as SQLite reads the clock. Sale dates and
+# price changes both take it inside the write, so a sale and a price change
+# are ordered as they were committed rather than by two different clocks.
+LOCAL_NOW_SQL = "datetime('now', 'localtime')"
+
+# effective_from of the price a product already had when its history began;
+# sorts before any real sale_date
+PRICE_HISTORY_START = '0000-00-00 00:00:00'
+
+
+def connect(db_name, **kwargs):
+    # The app's connections name their till in the journal; any other SQLite
+    # client can still write, its entries just carry no terminal
+    conn = sqlite3.connect(db_name, **kwargs)
+    set_terminal(conn)
+    return conn
+
+
+def set_terminal(conn, terminal=TERMINAL_ID):
+    # The terminal lives in a temp table that a temp trigger copies into each
+    # new journal entry. Both are private to the connection, so the file's
+    # own triggers depend on nothing registered by this app.
+    if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' "
+                        "AND name = 'ChangeJournal'").fetchone():
+        return
+    in_transaction = conn.in_transaction
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS JournalTerminal (terminal TEXT)")
+    conn.execute("DELETE FROM temp.JournalTerminal")
+    conn.execute("INSERT INTO temp.JournalTerminal (terminal) VALUES (?)", (terminal,))
+    conn.execute("""
+        CREATE TEMP TRIGGER IF NOT EXISTS trg_journal_terminal
+        AFTER INSERT ON main.ChangeJournal WHEN NEW.terminal IS NULL
+        BEGIN
+            UPDATE ChangeJournal SET terminal = (SELECT terminal FROM temp.JournalTerminal)
+            WHERE id = NEW.id;
+        END
+    """)
+    if not in_transaction:
+        conn.commit()
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade_schema(conn):
+    # Bring databases created by older versions of creation_db.py up to date
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    sale_columns = table_columns(conn, "Sale")
+    if not sale_columns:
+        return
+
+    if 'sale_date' not in sale_columns:
+        conn.execute("ALTER TABLE Sale ADD COLUMN sale_date TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_date ON Sale(sale_date)")
+
+    if 'tier' not in table_columns(conn, "Customer"):
+        conn.execute("ALTER TABLE Customer ADD COLUMN tier TEXT NOT NULL DEFAULT 'Standard'")
+
+    # Virtual generated column: normalized on every write by SQLite itself,
+    # with nothing stored in the row, and hidden from PRAGMA table_info so
+    # the journal and sync never see it
+    if 'phone_key' not in [row[1] for row in conn.execute("PRAGMA table_xinfo(Customer)")]:
+        conn.execute(f"ALTER TABLE Customer ADD COLUMN phone_key TEXT "
+                     f"GENERATED ALWAYS AS ({PHONE_KEY_SQL}) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_phone_key ON Customer(phone_key)")
+
+    # Discount rules; NULL product/customer/tier/dates mean "any"
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Promotion (
+            id_promotion INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value REAL NOT NULL DEFAULT 0,
+            buy_qty INTEGER,
+            free_qty INTEGER,
+            id_product INTEGER,
+            id_customer INTEGER,
+            customer_tier TEXT,
+            starts_at TEXT,
+            ends_at TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (id_product) REFERENCES Product(id_product),
+            FOREIGN KEY (id_customer) REFERENCES Customer(id_customer)
+        )
+    """)
+
+    # One row per archived period, with totals so lifetime figures need no ATTACH
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS SaleArchive (
+            period TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            first_date TEXT,
+            last_date TEXT,
+            sale_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Every committed write leaves a row here so other tills can refresh
+    # just the rows that changed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ChangeLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    """)
+    for table, key in TRACKED_TABLES.items():
+        for event, op, ref in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD')):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_changelog_{table.lower()}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO ChangeLog (table_name, row_id, op)
+                    VALUES ('{table}', {ref}.{key}, '{op}');
+                END
+            """)
+
+    if 'id_category' not in table_columns(conn, "Product"):
+        conn.execute("ALTER TABLE Product ADD COLUMN id_category INTEGER REFERENCES Category(id_category)")
+
+    create_customer_stats(conn)
+    create_categories(conn)
+    create_journal(conn)
+    create_price_history(conn)
+    track_versions(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    # The journal may not have existed when this connection was opened
+    set_terminal(conn)
+
+
+def create_customer_stats(conn):
+    # Covering index: a customer's history pages are read from the index alone
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sale_customer
+        ON Sale(id_customer, id_sale, id_product, quantity, total_price, sale_date)
+    """)
+
+    # Per-customer totals kept current by triggers, so lifetime figures are a
+    # single primary-key lookup however many sales a customer has
+    is_new = not table_columns(conn, "CustomerStats")
+    # The first version of these triggers had no guard for sales without a
+    # customer: each one left a row keyed NULL, which INTEGER PRIMARY KEY
+    # turned into the id of the next new customer. Its figures are rebuilt.
+    unguarded = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                             "AND name = 'trg_customer_stats_update'").fetchone()
+    if unguarded:
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER trg_customer_stats_{event}")
+        conn.execute("DELETE FROM CustomerStats")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS CustomerStats (
+            id_customer INTEGER PRIMARY KEY,
+            sale_count INTEGER NOT NULL DEFAULT 0,
+            lifetime_spend REAL NOT NULL DEFAULT 0,
+            last_purchase TEXT
+        )
+    """)
+    if is_new or unguarded:
+        conn.execute("""
+            INSERT INTO CustomerStats (id_customer, sale_count, lifetime_spend, last_purchase)
+            SELECT id_customer, COUNT(*), SUM(total_price), MAX(sale_date)
+            FROM Sale WHERE id_customer IS NOT NULL GROUP BY id_customer
+        """)
+        # Archived sales still count toward the totals (archive_sales keeps
+        # them there), so they are added back archive by archive
+        conn.executemany("""
+            INSERT INTO CustomerStats (id_customer, sale_count, lifetime_spend, last_purchase)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(id_customer) DO UPDATE SET
+                sale_count = sale_count + excluded.sale_count,
+                lifetime_spend = lifetime_spend + excluded.lifetime_spend,
+                last_purchase = COALESCE(MAX(last_purchase, excluded.last_purchase),
+                                         last_purchase, excluded.last_purchase)
+        """, archived_customer_totals(conn))
+
+    add_sale = """
+        INSERT INTO CustomerStats (id_customer, sale_count, lifetime_spend, last_purchase)
+        VALUES (NEW.id_customer, 1, NEW.total_price, NEW.sale_date)
+        ON CONFLICT(id_customer) DO UPDATE SET
+            sale_count = sale_count + 1,
+            lifetime_spend = lifetime_spend + excluded.lifetime_spend,
+            last_purchase = COALESCE(MAX(last_purchase, excluded.last_purchase),
+                                     last_purchase, excluded.last_purchase);
+    """
+    remove_sale = """
+        UPDATE CustomerStats SET
+            sale_count = sale_count - 1,
+            lifetime_spend = lifetime_spend - OLD.total_price,
+            last_purchase = (SELECT MAX(sale_date) FROM Sale WHERE id_customer = OLD.id_customer)
+        WHERE id_customer = OLD.id_customer;
+    """
+    # Recreated on every upgrade so changed bodies reach existing files
+    for name, event, body in (('insert', "INSERT ON Sale WHEN NEW.id_customer IS NOT NULL", add_sale),
+                              ('update_old', "UPDATE ON Sale WHEN OLD.id_customer IS NOT NULL", remove_sale),
+                              ('update_new', "UPDATE ON Sale WHEN NEW.id_customer IS NOT NULL", add_sale),
+                              ('delete', "DELETE ON Sale WHEN OLD.id_customer IS NOT NULL", remove_sale)):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_customer_stats_{name}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_customer_stats_{name}
+            AFTER {event}
+            BEGIN
+                {body}
+            END
+        """)
+
+
+def archived_customer_totals(conn):
+    # [(id_customer, sale_count, spend, last sale_date)] per archive file,
+    # each read on a connection of its own: the upgrade runs in a
+    # transaction, where ATTACH isn't allowed. Missing files are skipped,
+    # as sales_archive.sales_source() skips them.
+    if not table_columns(conn, "SaleArchive"):
+        return []
+    totals = []
+    for (path,) in conn.execute("SELECT path FROM SaleArchive").fetchall():
+        if not os.path.exists(path):
+            continue
+        archive = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            totals.extend(archive.execute("""
+                SELECT id_customer, COUNT(*), SUM(total_price), MAX(sale_date)
+                FROM Sale WHERE id_customer IS NOT NULL GROUP BY id_customer
+            """).fetchall())
+        finally:
+            archive.close()
+    return totals
+
+
+def create_categories(conn):
+    # Category hierarchy as a closure table: one row per (ancestor, descendant)
+    # pair, including each category with itself at depth 0, so a subtree or
+    # the ancestors of a category are a single index range either way
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Category (
+            id_category INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_id INTEGER REFERENCES Category(id_category)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS CategoryTree (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_category_tree_descendant ON CategoryTree(descendant_id, ancestor_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_category_parent ON Category(parent_id, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_category ON Product(id_category)")
+    # A product's sales, for moving its revenue when it changes category
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_product ON Sale(id_product, total_price)")
+
+    # Subtree totals: every category's figures include all its descendants.
+    # Triggers add each change to the category and all of its ancestors.
+    # Revenue covers sales still in the Sale table, not archived periods.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS CategoryStats (
+            id_category INTEGER PRIMARY KEY,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+    """)
+
+    def adjust(category, products, revenue):
+        return f"""
+            UPDATE CategoryStats SET product_count = product_count + ({products}),
+                                     revenue = revenue + ({revenue})
+            WHERE id_category IN (SELECT ancestor_id FROM CategoryTree WHERE descendant_id = {category});
+        """
+
+    product_revenue = "(SELECT COALESCE(SUM(total_price), 0) FROM Sale WHERE id_product = {}.id_product)"
+    sale_category = "(SELECT id_category FROM Product WHERE id_product = {}.id_product)"
+    triggers = {
+        'trg_category_stats_category_insert': ("AFTER INSERT ON Category", """
+            INSERT INTO CategoryTree (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id_category, depth + 1 FROM CategoryTree
+            WHERE descendant_id = NEW.parent_id
+            UNION ALL SELECT NEW.id_category, NEW.id_category, 0;
+            INSERT INTO CategoryStats (id_category) VALUES (NEW.id_category);
+        """),
+        'trg_category_stats_category_delete': ("AFTER DELETE ON Category", """
+            DELETE FROM CategoryTree WHERE descendant_id = OLD.id_category;
+            DELETE FROM CategoryStats WHERE id_category = OLD.id_category;
+        """),
+        'trg_category_stats_product_insert': ("AFTER INSERT ON Product WHEN NEW.id_category IS NOT NULL",
+                                              adjust("NEW.id_category", 1, product_revenue.format("NEW"))),
+        'trg_category_stats_product_delete': ("AFTER DELETE ON Product WHEN OLD.id_category IS NOT NULL",
+                                              adjust("OLD.id_category", -1, "-" + product_revenue.format("OLD"))),
+        'trg_category_stats_product_move': (
+            "AFTER UPDATE OF id_category ON Product WHEN OLD.id_category IS NOT NEW.id_category",
+            adjust("OLD.id_category", -1, "-" + product_revenue.format("OLD")) +
+            adjust("NEW.id_category", 1, product_revenue.format("NEW"))),
+        'trg_category_stats_sale_insert': ("AFTER INSERT ON Sale",
+                                           adjust(sale_category.format("NEW"), 0, "NEW.total_price")),
+        'trg_category_stats_sale_update': ("AFTER UPDATE OF id_product, total_price ON Sale",
+                                           adjust(sale_category.format("OLD"), 0, "-OLD.total_price") +
+                                           adjust(sale_category.format("NEW"), 0, "NEW.total_price")),
+        'trg_category_stats_sale_delete': ("AFTER DELETE ON Sale",
+                                           adjust(sale_category.format("OLD"), 0, "-OLD.total_price")),
+    }
+    for name, (event, body) in triggers.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {event}
+            BEGIN
+                {body}
+            END
+        """)
+
+
+def create_journal(conn):
+    # Append-only journal of every write. Rows are stored as positional JSON
+    # arrays (column order of the table at the time) and times as epoch
+    # milliseconds to keep each entry small. The triggers leave terminal
+    # NULL; set_terminal() fills it in for the app's own connections.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ChangeJournal (
+            id INTEGER PRIMARY KEY,
+            changed_at INTEGER NOT NULL,
+            terminal TEXT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            old_values TEXT,
+            new_values TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_time ON ChangeJournal(changed_at)")
+
+    now_ms = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+    for table, key in TRACKED_TABLES.items():
+        columns = [column for column in table_columns(conn, table) if column != key]
+        old_row = "json_array(" + ", ".join(f"OLD.{column}" for column in columns) + ")"
+        new_row = "json_array(" + ", ".join(f"NEW.{column}" for column in columns) + ")"
+
+        # Recreated on every upgrade so the journal follows added columns
+        for event, op, ref, old_values, new_values in (
+                ('INSERT', 'I', 'NEW', 'NULL', new_row),
+                ('UPDATE', 'U', 'NEW', old_row, new_row),
+                ('DELETE', 'D', 'OLD', old_row, 'NULL')):
+            trigger = f"trg_journal_{table.lower()}_{event.lower()}"
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(f"""
+                CREATE TRIGGER {trigger}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO ChangeJournal
+                        (changed_at, terminal, table_name, row_id, op, old_values, new_values)
+                    VALUES ({now_ms}, NULL, '{table}', {ref}.{key}, '{op}',
+                            {old_values}, {new_values});
+                END
+            """)
+
+
+def track_versions(conn):
+    # One counter per existing VERSIONED_TABLES table, bumped by a trigger on
+    # every row written, whoever writes it. Tables created later
+    # (ProductForecast) are picked up by calling this again.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS TableVersion (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    triggers = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_version_%'")}
+    for table in VERSIONED_TABLES:
+        if not table_columns(conn, table):
+            continue
+        conn.execute("INSERT OR IGNORE INTO TableVersion (table_name) VALUES (?)", (table,))
+        untracked = False
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            trigger = f"trg_version_{table.lower()}_{event.lower()}"
+            if trigger in triggers:
+                continue
+            conn.execute(f"""
+                CREATE TRIGGER {trigger}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE TableVersion SET version = version + 1 WHERE table_name = '{table}';
+                END
+            """)
+            untracked = True
+        if untracked:
+            # It may have been written, or just created, before it was counted
+            conn.execute("UPDATE TableVersion SET version = version + 1 WHERE table_name = ?", (table,))
+
+
+def create_price_history(conn):
+    # Every price a product has had, each in force from effective_from until
+    # the next row's. The primary key doubles as the as-of index: the price
+    # at any moment is one backwards seek on (id_product, effective_from).
+    # Times are LOCAL_NOW_SQL, as sale_date is, so they compare directly.
+    is_new = not table_columns(conn, "PriceHistory")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS PriceHistory (
+            id_product INTEGER NOT NULL,
+            effective_from TEXT NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (id_product, effective_from)
+        ) WITHOUT ROWID
+    """)
+    if is_new:
+        conn.execute("""
+            INSERT INTO PriceHistory (id_product, effective_from, price)
+            SELECT id_product, ?, price FROM Product
+        """, (PRICE_HISTORY_START,))
+
+    # Two changes within the same second keep the later price. Rows outlive
+    # their product: its sales can still be repriced.
+    record_price = f"""
+        INSERT INTO PriceHistory (id_product, effective_from, price)
+        VALUES (NEW.id_product, {LOCAL_NOW_SQL}, NEW.price)
+        ON CONFLICT(id_product, effective_from) DO UPDATE SET price = excluded.price;
+    """
+    for name, event in (('trg_price_history_insert', "AFTER INSERT ON Product"),
+                        ('trg_price_history_update',
+                         "AFTER UPDATE OF price ON Product WHEN OLD.price IS NOT NEW.price")):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {event}
+            BEGIN
+                {record_price}
+            END
+        """)
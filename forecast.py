@@ -0,0 +1,154 @@
+import itertools
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db_schema import connect, table_columns, track_versions
+
+HISTORY_DAYS = 730
+WINDOW_DAYS = 28
+LEAD_TIME_DAYS = 7
+REVIEW_DAYS = 7
+SERVICE_Z = 1.65  # ~95% chance of not running out during the lead time
+CHUNK_ROWS = 50000
+
+
+def create_forecast_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ProductForecast (
+            id_product INTEGER PRIMARY KEY,
+            avg_daily REAL NOT NULL,
+            ma7 REAL NOT NULL,
+            ma28 REAL NOT NULL,
+            lead_demand REAL NOT NULL,
+            reorder_point REAL NOT NULL,
+            suggested_order INTEGER NOT NULL,
+            computed_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_forecast_reorder ON ProductForecast(reorder_point)")
+    track_versions(conn)
+    # Covering index so the history is read as one sequential range scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_date_product ON Sale(sale_date, id_product, quantity)")
+
+
+def stream_history(conn, product_ids, history_start, today):
+    # Reads every sale of the last HISTORY_DAYS complete days once, in chunks,
+    # and folds each chunk into per-product weekday totals and a daily matrix
+    # for the most recent WINDOW_DAYS using bincount - no per-product work
+    weekday = np.zeros(len(product_ids) * 7)
+    daily = np.zeros(len(product_ids) * WINDOW_DAYS)
+    first_weekday = history_start.isoweekday() % 7
+    window_offset = HISTORY_DAYS - WINDOW_DAYS
+
+    cursor = conn.execute("""
+        SELECT id_product, CAST(julianday(date(sale_date)) - julianday(?) AS INTEGER), quantity
+        FROM Sale INDEXED BY idx_sale_date_product
+        WHERE sale_date >= ? AND sale_date < ? AND id_product IS NOT NULL
+    """, (history_start.isoformat(), history_start.isoformat(), today.isoformat()))
+
+    while True:
+        chunk = cursor.fetchmany(CHUNK_ROWS)
+        if not chunk:
+            break
+        data = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.float64,
+                           count=3 * len(chunk)).reshape(-1, 3)
+        ids = data[:, 0].astype(np.int64)
+        day = data[:, 1].astype(np.int64)
+        quantity = data[:, 2]
+
+        # Drop sales of products that no longer exist
+        index = np.minimum(np.searchsorted(product_ids, ids), len(product_ids) - 1)
+        known = product_ids[index] == ids
+
+        weekday += np.bincount(index[known] * 7 + (first_weekday + day[known]) % 7,
+                               weights=quantity[known], minlength=weekday.size)
+
+        recent = known & (day >= window_offset)
+        daily += np.bincount(index[recent] * WINDOW_DAYS + day[recent] - window_offset,
+                             weights=quantity[recent], minlength=daily.size)
+
+    return weekday.reshape(-1, 7), daily.reshape(-1, WINDOW_DAYS)
+
+
+def compute_forecast(conn, today=None):
+    today = today or datetime.now().date()
+    history_start = today - timedelta(days=HISTORY_DAYS)
+
+    product_ids = np.array([row[0] for row in conn.execute(
+        "SELECT id_product FROM Product ORDER BY id_product")], dtype=np.int64)
+    if product_ids.size == 0:
+        return product_ids, {}
+
+    # Weekday totals give weekly seasonality, the daily window the moving averages
+    weekday, daily = stream_history(conn, product_ids, history_start, today)
+
+    ma7 = daily[:, -7:].mean(axis=1)
+    ma28 = daily.mean(axis=1)
+    std = daily.std(axis=1)
+
+    # Seasonal factor per weekday, 1.0 for products with no history
+    weekday_mean = weekday.mean(axis=1, keepdims=True)
+    factors = np.divide(weekday, weekday_mean, out=np.ones_like(weekday), where=weekday_mean > 0)
+
+    # strftime('%w') numbers Sunday 0 .. Saturday 6, as isoweekday() % 7 does
+    upcoming = [(today + timedelta(days=offset)).isoweekday() % 7
+                for offset in range(1, LEAD_TIME_DAYS + REVIEW_DAYS + 1)]
+    daily_forecast = ma28[:, None] * factors[:, upcoming]
+
+    lead_demand = daily_forecast[:, :LEAD_TIME_DAYS].sum(axis=1)
+    safety_stock = SERVICE_Z * std * np.sqrt(LEAD_TIME_DAYS)
+    reorder_point = lead_demand + safety_stock
+    suggested_order = np.ceil(daily_forecast.sum(axis=1) + safety_stock).astype(np.int64)
+
+    return product_ids, {
+        'avg_daily': ma28,
+        'ma7': ma7,
+        'ma28': ma28,
+        'lead_demand': lead_demand,
+        'reorder_point': reorder_point,
+        'suggested_order': suggested_order,
+    }
+
+
+def refresh_forecast(db_name):
+    # Recompute every product's forecast and replace ProductForecast in one
+    # transaction; returns (products, seconds)
+    start = time.perf_counter()
+    conn = connect(db_name)
+    try:
+        create_forecast_table(conn)
+        product_ids, results = compute_forecast(conn)
+        computed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        conn.execute("DELETE FROM ProductForecast")
+        if product_ids.size:
+            conn.executemany("""
+                INSERT INTO ProductForecast (id_product, avg_daily, ma7, ma28, lead_demand,
+                                             reorder_point, suggested_order, computed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, zip(product_ids.tolist(), results['avg_daily'].tolist(), results['ma7'].tolist(),
+                     results['ma28'].tolist(), results['lead_demand'].tolist(),
+                     results['reorder_point'].tolist(), results['suggested_order'].tolist(),
+                     [computed_at] * product_ids.size))
+        conn.commit()
+    finally:
+        conn.close()
+    return int(product_ids.size), time.perf_counter() - start
+
+
+def top_reorders(conn, limit=20):
+    if not table_columns(conn, "ProductForecast"):
+        return []
+    return conn.execute("""
+        SELECT f.id_product, p.name, f.ma7, f.ma28, f.reorder_point, f.suggested_order, f.computed_at
+        FROM ProductForecast f JOIN Product p ON f.id_product = p.id_product
+        WHERE f.suggested_order > 0
+        ORDER BY f.reorder_point DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+if __name__ == "__main__":
+    count, seconds = refresh_forecast('store_inventory.db')
+    print(f"Forecast {count} products in {seconds:.2f}s")
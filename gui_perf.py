@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from db_schema import connect, upgrade_schema
+from load_test import seed_database
+
+# Timings recorded on the reference machine; --record rewrites them
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gui_baseline.json')
+# A run fails when a median exceeds baseline * TOLERANCE + SLACK_MS
+TOLERANCE = 1.5
+SLACK_MS = 15.0
+SEARCH_TEXT = "Lap"
+XVFB_DISPLAYS = range(99, 120)
+
+
+def start_xvfb():
+    # (process, display) on the first free display number
+    xvfb = shutil.which('Xvfb')
+    if not xvfb:
+        sys.exit("Xvfb not found: install it or run with --no-xvfb on a desktop session")
+    for number in XVFB_DISPLAYS:
+        if os.path.exists(f"/tmp/.X11-unix/X{number}") or os.path.exists(f"/tmp/.X{number}-lock"):
+            continue
+        process = subprocess.Popen([xvfb, f":{number}", "-screen", "0", "1280x800x24", "-nolisten", "tcp"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and process.poll() is None:
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                return process, f":{number}"
+            time.sleep(0.05)
+        process.kill()
+    sys.exit("could not start Xvfb")
+
+
+def build_database(scratch_dir, products, customers, sales):
+    db_name = os.path.join(scratch_dir, 'store_inventory.db')
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'creation_db.py')],
+                   cwd=scratch_dir, check=True, stdout=subprocess.DEVNULL)
+    conn = connect(db_name)
+    upgrade_schema(conn)
+    conn.commit()
+    conn.close()
+    seed_database(db_name, products, customers, sales)
+    return db_name
+
+
+def find_widgets(widget, widget_class):
+    found = [widget] if widget.winfo_class() == widget_class else []
+    for child in widget.winfo_children():
+        found.extend(find_widgets(child, widget_class))
+    return found
+
+
+class Driver:
+    # Drives a StoreInventoryApp the way a cashier would and times each step
+    # up to the point Tk has laid out and drawn the result
+    def __init__(self, app, root, repeat):
+        self.app = app
+        self.root = root
+        self.repeat = repeat
+
+    def settle(self):
+        self.root.update()
+
+    def timed(self, action, cold=True):
+        # Median milliseconds of action() plus the idle redraw it queued
+        samples = []
+        for _ in range(self.repeat):
+            if cold:
+                self.app.query_cache.clear()
+            self.settle()
+            start = time.perf_counter()
+            action()
+            self.root.update_idletasks()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def open_screen(self, screen, cold=True):
+        return self.timed(getattr(self.app, screen), cold)
+
+    def type_search(self):
+        # Keystroke to rendered results, one character at a time into the
+        # Products search box; each keystroke is timed separately
+        self.app.show_products()
+        self.settle()
+        entry = find_widgets(self.app.main_container, 'TEntry')[0]
+        tree = self.app.live_view[0]
+        entry.focus_force()
+        self.settle()
+
+        per_key = []
+        for _ in range(self.repeat):
+            entry.delete(0, 'end')
+            self.app.query_cache.clear()
+            self.settle()
+            for char in SEARCH_TEXT:
+                start = time.perf_counter()
+                entry.event_generate('<KeyPress>', keysym=char)
+                self.root.update_idletasks()
+                per_key.append((time.perf_counter() - start) * 1000)
+            if entry.get() != SEARCH_TEXT:
+                raise RuntimeError(f"search box holds {entry.get()!r}; keystrokes were not delivered")
+            if not tree.get_children():
+                raise RuntimeError(f"no products match {SEARCH_TEXT!r}")
+        return statistics.median(per_key), max(per_key)
+
+    def open_edit_sale(self):
+        # With the whole catalog loaded into the product and customer pickers
+        self.app.show_sales()
+        self.settle()
+        tree = self.app.live_view[0]
+        tree.selection_set(tree.get_children()[0])
+
+        samples = []
+        for _ in range(self.repeat):
+            self.settle()
+            before = set(self.root.winfo_children())
+            start = time.perf_counter()
+            self.app.edit_sale_dialog(tree)
+            self.root.update_idletasks()
+            samples.append((time.perf_counter() - start) * 1000)
+            opened = [widget for widget in self.root.winfo_children() if widget not in before]
+            if not opened:
+                raise RuntimeError("the edit sale dialog did not open")
+            for dialog in opened:
+                dialog.destroy()
+        return statistics.median(samples)
+
+
+def run_scenarios(driver):
+    results = {}
+    for screen in ('show_dashboard', 'show_products', 'show_customers', 'show_sales'):
+        results[f"{screen}_cold_ms"] = driver.open_screen(screen)
+        results[f"{screen}_warm_ms"] = driver.open_screen(screen, cold=False)
+    results['search_keystroke_median_ms'], results['search_keystroke_max_ms'] = driver.type_search()
+    results['edit_sale_dialog_ms'] = driver.open_edit_sale()
+    return results
+
+
+def load_baseline(path, data):
+    # The recorded medians; exits when there are none, or when they were
+    # measured on a database of another size and so can't be compared
+    try:
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+    except OSError:
+        sys.exit(f"No baseline at {path}: run with --record on the reference machine")
+    except ValueError as e:
+        sys.exit(f"Unreadable baseline {path}: {e}")
+    if baseline.get('data') != data:
+        sys.exit(f"Baseline {path} was recorded with {baseline.get('data')}, this run uses {data}: "
+                 "use the same sizes or --record a new baseline")
+    return baseline['metrics']
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    # [(metric, measured, baseline or None, limit or None, ok)]; a metric
+    # the baseline doesn't have fails until it is recorded
+    rows = []
+    for metric, measured in results.items():
+        reference = baseline.get(metric)
+        limit = reference * tolerance + slack_ms if reference is not None else None
+        rows.append((metric, measured, reference, limit, limit is not None and measured <= limit))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI latency regression check under a virtual display")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--sales", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the median is kept")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--record", action="store_true", help="save this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--slack-ms", type=float, default=SLACK_MS)
+    parser.add_argument("--no-xvfb", action="store_true", help="use the current $DISPLAY")
+    args = parser.parse_args()
+    data = {'products': args.products, 'customers': args.customers, 'sales': args.sales,
+            'repeat': args.repeat}
+    # Checked before the run so a missing baseline fails in seconds
+    baseline = None if args.record else load_baseline(args.baseline, data)
+
+    xvfb = None
+    if not args.no_xvfb:
+        xvfb, display = start_xvfb()
+        os.environ['DISPLAY'] = display
+
+    scratch_dir = tempfile.mkdtemp()
+    root = None
+    try:
+        print(f"Generating {args.products} products, {args.customers} customers, {args.sales} sales...")
+        build_database(scratch_dir, args.products, args.customers, args.sales)
+
+        import tkinter as tk
+        from tkinter import messagebox
+        import startup
+        from Stock_App import StoreInventoryApp
+
+        def unexpected_dialog(title, message, **kwargs):
+            raise RuntimeError(f"{title}: {message}")
+
+        # A message box would wait forever for a click nobody makes
+        messagebox.showerror = messagebox.showwarning = unexpected_dialog
+        messagebox.showinfo = unexpected_dialog
+        # The app uses its working directory's database; keep the launch
+        # snapshot out of the real home directory too
+        os.chdir(scratch_dir)
+        startup.SNAPSHOT_PATH = os.path.join(scratch_dir, 'snapshot.json')
+
+        root = tk.Tk()
+        root.geometry("1200x700")
+        app = StoreInventoryApp(root)
+        root.update()
+
+        results = run_scenarios(Driver(app, root, args.repeat))
+    finally:
+        if root is not None:
+            root.destroy()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        if xvfb:
+            xvfb.terminate()
+
+    if args.record:
+        baseline = {metric: round(value, 1) for metric, value in results.items()}
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'data': data, 'metrics': baseline}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"Baseline written to {args.baseline}")
+
+    failures = 0
+    print(f"{'metric':<32} {'ms':>9} {'baseline':>9} {'limit':>9}")
+    for metric, measured, reference, limit, ok in compare(results, baseline, args.tolerance, args.slack_ms):
+        failures += not ok
+        print(f"{metric:<32} {measured:>9.1f} "
+              f"{'-' if reference is None else f'{reference:.1f}':>9} "
+              f"{'-' if limit is None else f'{limit:.1f}':>9}  "
+              f"{'ok' if ok else 'NO BASELINE' if limit is None else 'REGRESSION'}")
+    if failures:
+        print(f"{failures} measurements over their limit or missing from the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from db_schema import LOCAL_NOW_SQL, connect, upgrade_schema
+from sales_archive import lifetime_totals
+
+# Relative weight of each operation in the till's statement mix
+DEFAULT_MIX = "sale=4,search=3,list=1,dashboard=1"
+LOCK_TIMEOUT = 5.0
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}'")
+        mix[name] = float(weight)
+    return mix
+
+
+# The same statements StoreInventoryApp issues, one fresh connection per
+# operation like the app
+
+def op_sale(conn, rng, ids):
+    product_id = rng.choice(ids['products'])
+    customer_id = rng.choice(ids['customers'])
+    quantity = rng.randint(1, 5)
+    price = conn.execute("SELECT price FROM Product WHERE id_product = ?", (product_id,)).fetchone()[0]
+    conn.execute(f"""
+        INSERT INTO Sale (id_product, id_customer, quantity, total_price, sale_date)
+        VALUES (?, ?, ?, ?, {LOCAL_NOW_SQL})
+    """, (product_id, customer_id, quantity, price * quantity))
+    conn.commit()
+
+
+def op_search(conn, rng, ids):
+    term = rng.choice(ids['terms'])
+    conn.execute("SELECT id_product, name, price FROM Product WHERE name LIKE ?",
+                 (f'%{term}%',)).fetchall()
+
+
+def op_list(conn, rng, ids):
+    conn.execute("""
+        SELECT s.id_sale, p.name, c.name, s.quantity, s.total_price
+        FROM Sale s
+        JOIN Product p ON s.id_product = p.id_product
+        JOIN Customer c ON s.id_customer = c.id_customer
+        ORDER BY s.id_sale DESC
+    """).fetchall()
+
+
+def op_dashboard(conn, rng, ids):
+    conn.execute("SELECT COUNT(*) FROM Product").fetchone()
+    conn.execute("SELECT COUNT(*) FROM Customer").fetchone()
+    lifetime_totals(conn)
+
+
+OPERATIONS = {
+    'sale': op_sale,
+    'search': op_search,
+    'list': op_list,
+    'dashboard': op_dashboard,
+}
+
+
+def is_lock_error(error):
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+def run_operation(db_name, operation, rng, ids):
+    # Locks are retried here rather than inside SQLite (timeout=0) so the
+    # time spent waiting on other tills can be measured on its own: the wall
+    # time from the first attempt to the start of the one that succeeds,
+    # failed attempts included, not just the backoff sleeps
+    first_attempt = time.perf_counter()
+    lock_wait = 0.0
+    backoff = 0.001
+    while True:
+        conn = connect(db_name)
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            OPERATIONS[operation](conn, rng, ids)
+            return lock_wait, None
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                return lock_wait, str(e)
+            if lock_wait >= LOCK_TIMEOUT:
+                return lock_wait, "database is locked"
+            time.sleep(backoff)
+            lock_wait = time.perf_counter() - first_attempt
+            backoff = min(backoff * 2, 0.05)
+        except sqlite3.Error as e:
+            return lock_wait, str(e)
+        finally:
+            conn.close()
+
+
+def worker(db_name, mix, rate, duration, seed, ids, results):
+    rng = random.Random(seed)
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    interval = 1.0 / rate if rate > 0 else 0.0
+    samples = []
+
+    deadline = time.perf_counter() + duration
+    next_start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        if interval:
+            delay = next_start - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_start += interval
+
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        lock_wait, error = run_operation(db_name, operation, rng, ids)
+        samples.append((operation, time.perf_counter() - start, lock_wait, error))
+
+    results.put(samples)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    latencies = sorted(sample[1] for sample in samples)
+    return {
+        'ops': len(samples),
+        'throughput': len(samples) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'lock_wait_s': sum(sample[2] for sample in samples),
+        'errors': sum(1 for sample in samples if sample[3]),
+    }
+
+
+def run_level(db_name, workers, mix, rate, duration, ids):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker,
+                                         args=(db_name, mix, rate, duration, index, ids, results))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    samples = []
+    for _ in processes:
+        samples.extend(results.get())
+    for process in processes:
+        process.join()
+    return samples
+
+
+def seed_database(db_name, products, customers, sales):
+    conn = connect(db_name)
+    rng = random.Random(0)
+    words = ["Laptop", "Mouse", "Cable", "Monitor", "Desk", "Chair", "Phone", "Lamp"]
+    conn.executemany("INSERT INTO Product (name, price) VALUES (?, ?)",
+                     ((f"{rng.choice(words)} {i}", round(rng.uniform(1, 500), 2))
+                      for i in range(products)))
+    conn.executemany("INSERT INTO Customer (name, phone) VALUES (?, ?)",
+                     ((f"Customer {i}", f"06{rng.randint(10000000, 99999999)}")
+                      for i in range(customers)))
+    conn.commit()
+
+    product_ids = [row[0] for row in conn.execute("SELECT id_product FROM Product")]
+    customer_ids = [row[0] for row in conn.execute("SELECT id_customer FROM Customer")]
+    if product_ids and customer_ids:
+        conn.executemany(f"""
+            INSERT INTO Sale (id_product, id_customer, quantity, total_price, sale_date)
+            VALUES (?, ?, ?, ?, {LOCAL_NOW_SQL})
+        """, ((rng.choice(product_ids), rng.choice(customer_ids), 1, 10.0) for _ in range(sales)))
+    conn.commit()
+    conn.close()
+
+
+def load_ids(db_name):
+    conn = connect(db_name)
+    ids = {
+        'products': [row[0] for row in conn.execute("SELECT id_product FROM Product")],
+        'customers': [row[0] for row in conn.execute("SELECT id_customer FROM Customer")],
+    }
+    names = [row[0] for row in conn.execute("SELECT name FROM Product LIMIT 200")]
+    conn.close()
+    # Search terms are prefixes of real names, as typed at the till
+    ids['terms'] = sorted({name[:3] for name in names if name}) or ["a"]
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate several tills sharing one database")
+    parser.add_argument("--db", default="store_inventory.db")
+    parser.add_argument("--in-place", action="store_true",
+                        help="run against --db itself instead of a scratch copy")
+    parser.add_argument("--workers", default="1,2,4,8",
+                        help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="operations per second per till, 0 for flat out")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--products", type=int, default=0, help="extra products to seed")
+    parser.add_argument("--customers", type=int, default=0, help="extra customers to seed")
+    parser.add_argument("--sales", type=int, default=0, help="extra sales to seed")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.workers.split(",")]
+
+    scratch_dir = None
+    db_name = args.db
+    if not args.in_place:
+        scratch_dir = tempfile.mkdtemp()
+        db_name = os.path.join(scratch_dir, os.path.basename(args.db))
+        shutil.copyfile(args.db, db_name)
+
+    try:
+        conn = connect(db_name)
+        upgrade_schema(conn)
+        conn.close()
+        seed_database(db_name, args.products, args.customers, args.sales)
+        ids = load_ids(db_name)
+        if not ids['products'] or not ids['customers']:
+            parser.error("the database needs at least one product and one customer")
+
+        print(f"{'tills':>6} {'ops':>9} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'lock wait s':>12} {'errors':>7}")
+        for workers in levels:
+            samples = run_level(db_name, workers, mix, args.rate, args.duration, ids)
+            total = summarize(samples, args.duration)
+            print(f"{workers:>6} {total['ops']:>9} {total['throughput']:>8.1f} "
+                  f"{total['p50_ms']:>8.2f} {total['p99_ms']:>8.2f} "
+                  f"{total['lock_wait_s']:>12.3f} {total['errors']:>7}")
+            for operation in mix:
+                subset = [sample for sample in samples if sample[0] == operation]
+                if subset:
+                    stats = summarize(subset, args.duration)
+                    print(f"{'':>6} {operation:>9} {stats['throughput']:>8.1f} "
+                          f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                          f"{stats['lock_wait_s']:>12.3f} {stats['errors']:>7}")
+    finally:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
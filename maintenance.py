@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from db_schema import connect
+
+MAINTENANCE_LOG = 'maintenance_log.csv'
+MAINTENANCE_INTERVAL_MS = 5 * 60 * 1000
+IDLE_SECONDS = 120
+
+# Each step is one short transaction; other tills only ever wait for one
+# step, and a step that can't get the lock ends the run until next time
+ANALYSIS_LIMIT = 1000
+VACUUM_PAGES = 256
+STEP_SLEEP = 0.05
+BUSY_TIMEOUT_MS = 200
+
+# Representative statements timed before and after each run
+TIMED_QUERIES = [
+    ("product list", "SELECT id_product, name, price FROM Product ORDER BY name"),
+    ("product search", "SELECT id_product, name, price FROM Product WHERE name LIKE '%a%'"),
+    ("sales list", """
+        SELECT s.id_sale, p.name, c.name, s.quantity, s.total_price
+        FROM Sale s
+        JOIN Product p ON s.id_product = p.id_product
+        JOIN Customer c ON s.id_customer = c.id_customer
+        ORDER BY s.id_sale DESC LIMIT 500
+    """),
+    ("dashboard", "SELECT (SELECT COUNT(*) FROM Product), (SELECT COUNT(*) FROM Customer), "
+                  "(SELECT COUNT(*) FROM Sale)"),
+]
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def database_stats(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        'bytes': conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        'free_bytes': conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+    }
+
+
+def time_queries(conn, repeat=3):
+    # Best of a few runs, in milliseconds
+    timings = {}
+    for name, sql in TIMED_QUERIES:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                conn.execute(sql).fetchall()
+            except sqlite3.OperationalError:
+                break
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def user_tables(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def maintenance_steps(conn, problems):
+    # Generator of bounded steps; yields a short description after each one
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    for table in user_tables(conn):
+        conn.execute(f'ANALYZE "{table}"')
+        yield f"analyze {table}"
+
+    if database_stats(conn)['auto_vacuum'] == 'incremental':
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            # fetchall() steps the pragma until every requested page is freed
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+            yield "incremental vacuum"
+
+    # quick_check one table at a time (SQLite 3.33+) instead of the whole file
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        for table in user_tables(conn):
+            result = [row[0] for row in conn.execute(f'PRAGMA quick_check("{table}")')]
+            if result != ['ok']:
+                problems.extend(result)
+            yield f"quick_check {table}"
+    else:
+        result = [row[0] for row in conn.execute("PRAGMA quick_check")]
+        if result != ['ok']:
+            problems.extend(result)
+        yield "quick_check"
+
+    conn.execute("PRAGMA optimize")
+    yield "optimize"
+
+
+def run_maintenance(db_name, keep_going=None, progress=None):
+    # Runs every step unless keep_going() turns false (the till got busy) or a
+    # step can't get the lock; the steps are idempotent, so an unfinished run
+    # simply picks up again next idle period
+    started = datetime.now()
+    start = time.perf_counter()
+    conn = connect(db_name)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    problems = []
+    steps = 0
+    completed = False
+    try:
+        before = database_stats(conn)
+        timings_before = time_queries(conn)
+        try:
+            for step in maintenance_steps(conn, problems):
+                steps += 1
+                if progress:
+                    progress(step)
+                if keep_going and not keep_going():
+                    break
+                time.sleep(STEP_SLEEP)
+            else:
+                completed = True
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+        after = database_stats(conn)
+        timings_after = time_queries(conn)
+    finally:
+        conn.close()
+
+    result = {
+        'started': started.isoformat(timespec='seconds'),
+        'seconds': time.perf_counter() - start,
+        'steps': steps,
+        'completed': completed,
+        'before': before,
+        'after': after,
+        'timings_before': timings_before,
+        'timings_after': timings_after,
+        'problems': problems,
+    }
+    log_maintenance(db_name, result)
+    return result
+
+
+def enable_incremental_vacuum(db_name):
+    # auto_vacuum can only change through a full VACUUM, so this is a one-off
+    # run on demand rather than part of the idle steps
+    conn = connect(db_name)
+    try:
+        if database_stats(conn)['auto_vacuum'] != 'incremental':
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        return database_stats(conn)
+    finally:
+        conn.close()
+
+
+def log_path(db_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), MAINTENANCE_LOG)
+
+
+def log_maintenance(db_name, result):
+    path = log_path(db_name)
+    is_new = not os.path.exists(path)
+    query_ms = lambda timings: sum(ms for ms in timings.values() if ms is not None)
+    with open(path, 'a') as log:
+        if is_new:
+            log.write("started,seconds,steps,completed,bytes_before,bytes_after,"
+                      "free_before,free_after,query_ms_before,query_ms_after,check\n")
+        log.write(f"{result['started']},{result['seconds']:.2f},{result['steps']},"
+                  f"{int(result['completed'])},{result['before']['bytes']},{result['after']['bytes']},"
+                  f"{result['before']['free_bytes']},{result['after']['free_bytes']},"
+                  f"{query_ms(result['timings_before']):.2f},{query_ms(result['timings_after']):.2f},"
+                  f"{'ok' if not result['problems'] else len(result['problems'])}\n")
+
+
+def read_maintenance_log(db_name, limit=100):
+    # Newest first, as lists of the CSV fields
+    path = log_path(db_name)
+    if not os.path.exists(path):
+        return []
+    with open(path) as log:
+        lines = log.read().splitlines()[1:]
+    return [line.split(",") for line in reversed(lines[-limit:])]
+
+
+if __name__ == "__main__":
+    import sys
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    db_name = args[0] if args else 'store_inventory.db'
+    if '--enable-incremental' in sys.argv:
+        print(f"auto_vacuum: {enable_incremental_vacuum(db_name)['auto_vacuum']}")
+    result = run_maintenance(db_name, progress=print)
+    print(f"{result['steps']} steps in {result['seconds']:.2f}s, "
+          f"{result['before']['bytes']} -> {result['after']['bytes']} bytes")
+    for name, ms in result['timings_before'].items():
+        after = result['timings_after'][name]
+        if ms is not None and after is not None:
+            print(f"  {name:<16} {ms:8.2f} ms -> {after:8.2f} ms")
+    print("integrity: " + ("ok" if not result['problems'] else "; ".join(result['problems'])))
@@ -0,0 +1,116 @@
+import time
+
+from db_schema import PRICE_HISTORY_START, connect
+
+# The price in force at a moment: one backwards seek on PriceHistory's
+# primary key, whatever the length of the product's history
+AS_OF_PRICE = """
+    SELECT price FROM PriceHistory
+    WHERE id_product = {product} AND effective_from <= {moment}
+    ORDER BY effective_from DESC LIMIT 1
+"""
+
+
+def price_as_of(conn, product_id, moment):
+    # List price of a product at moment ('YYYY-MM-DD HH:MM:SS'), or None
+    row = conn.execute(AS_OF_PRICE.format(product='?', moment='?'), (product_id, moment)).fetchone()
+    return row[0] if row else None
+
+
+def price_history(conn, product_id):
+    # [(effective_from, effective_until or None for current, price)], newest
+    # first; effective_from is None for the price from before history was kept
+    rows = conn.execute("""
+        SELECT effective_from,
+               LEAD(effective_from) OVER (ORDER BY effective_from),
+               price
+        FROM PriceHistory WHERE id_product = ?
+        ORDER BY effective_from DESC
+    """, (product_id,)).fetchall()
+    return [(None if start == PRICE_HISTORY_START else start, until, price)
+            for start, until, price in rows]
+
+
+def sales_at_list_price(conn, start=None, end=None):
+    # [(id_sale, id_product, sale_date, quantity, total_price, list_price)]
+    # for sales dated in [start, end), each with the list price in force when
+    # it was made. Sales are read through idx_sale_date and each list price is
+    # a primary-key seek, so a year of sales costs one seek per sale rather
+    # than a scan of every product's history; list_price is None for sales
+    # with no date or no history. Both join formulations (see __main__) read
+    # every earlier price of the product for each sale, or all of
+    # PriceHistory up front, and fall further behind as histories grow.
+    query = f"""
+        SELECT s.id_sale, s.id_product, s.sale_date, s.quantity, s.total_price,
+               ({AS_OF_PRICE.format(product='s.id_product', moment='s.sale_date')}) AS list_price
+        FROM Sale s
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("s.sale_date >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("s.sale_date < ?")
+        params.append(end)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return conn.execute(query + " ORDER BY s.id_sale", params).fetchall()
+
+
+if __name__ == "__main__":
+    # Bulk as-of join against a scratch copy with a few price changes per
+    # product, next to the two join formulations of the same lookup
+    import os
+    import shutil
+    import sys
+    import tempfile
+    from db_schema import upgrade_schema
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'store_inventory.db'
+    scratch_dir = tempfile.mkdtemp()
+    db_name = os.path.join(scratch_dir, os.path.basename(source))
+    shutil.copyfile(source, db_name)
+    try:
+        conn = connect(db_name)
+        upgrade_schema(conn)
+        products = [row[0] for row in conn.execute("SELECT id_product FROM Product")]
+        for day in ('2024-01-01', '2024-06-01', '2025-01-01'):
+            conn.executemany("""
+                INSERT OR IGNORE INTO PriceHistory (id_product, effective_from, price)
+                SELECT id_product, ?, price * 1.05 FROM Product WHERE id_product = ?
+            """, [(f"{day} 00:00:00", product_id) for product_id in products])
+        conn.commit()
+
+        interval_join = """
+            SELECT s.id_sale, h.price FROM Sale s
+            LEFT JOIN (SELECT id_product, effective_from, price,
+                              LEAD(effective_from) OVER (PARTITION BY id_product
+                                                         ORDER BY effective_from) AS until
+                       FROM PriceHistory) h
+              ON h.id_product = s.id_product AND h.effective_from <= s.sale_date
+             AND (h.until IS NULL OR s.sale_date < h.until)
+        """
+        # Every earlier price joined in; SQLite takes price from the row
+        # holding the MAX(effective_from)
+        latest_join = """
+            SELECT s.id_sale, h.price, MAX(h.effective_from) FROM Sale s
+            LEFT JOIN PriceHistory h
+              ON h.id_product = s.id_product AND h.effective_from <= s.sale_date
+            GROUP BY s.id_sale
+        """
+        print("as-of plan:")
+        for row in conn.execute("EXPLAIN QUERY PLAN SELECT (" +
+                                AS_OF_PRICE.format(product='s.id_product', moment='s.sale_date') +
+                                ") FROM Sale s"):
+            print("  ", row[-1])
+        for label, run in (("as-of seeks", lambda: sales_at_list_price(conn)),
+                           ("interval join", lambda: conn.execute(interval_join).fetchall()),
+                           ("latest-row join", lambda: conn.execute(latest_join).fetchall())):
+            begin = time.perf_counter()
+            rows = run()
+            seconds = time.perf_counter() - begin
+            print(f"{label}: {len(rows)} sales in {seconds * 1000:.0f} ms "
+                  f"({len(rows) / seconds:.0f} sales/s)")
+        conn.close()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
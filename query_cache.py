@@ -0,0 +1,214 @@
+import contextlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from db_schema import TRACKED_TABLES, connect
+
+QUERY_CACHE_ENTRIES = 256
+QUERY_CACHE_BYTES = 32 * 1024 * 1024
+# A single result bigger than this share of the budget isn't kept
+LARGEST_ENTRY_SHARE = 4
+
+
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+
+def result_bytes(value):
+    # Rows, tuples and their values; strings shared between rows are counted
+    # once per occurrence, so this errs on the high side
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(result_bytes(item) for item in value)
+    return size
+
+
+class CacheEntry:
+    __slots__ = ('result', 'versions', 'size', 'hits', 'created')
+
+    def __init__(self, result, versions, size):
+        self.result = result
+        self.versions = versions
+        self.size = size
+        self.hits = 0
+        self.created = time.monotonic()
+
+
+class QueryCache:
+    # LRU cache of read results keyed by normalized SQL and parameters. Each
+    # entry remembers the version of every table it read; versions come from
+    # the ChangeLog for the tracked tables, so a new sale doesn't throw away
+    # the cached product list. Other tables have no log and share one
+    # version, bumped by any commit. Which tables a query reads is reported
+    # by SQLite's authorizer while the statement is prepared, so callers
+    # never list them. Cached results are shared: callers must not mutate them.
+    # With a Replica attached, misses are computed against it and versions
+    # are the replica's own.
+    def __init__(self, db_name, max_entries=QUERY_CACHE_ENTRIES, max_bytes=QUERY_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.compute_seconds = 0.0
+
+        # Every statement is prepared afresh so the authorizer sees it
+        self.conn = connect(db_name, check_same_thread=False, cached_statements=0)
+        self.reading = None
+        self.conn.set_authorizer(self.authorize)
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.last_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+        self.table_versions = {}
+        self.untracked_version = 0
+        self.replica = None
+
+    def attach_replica(self, replica):
+        with self.lock:
+            replica.conn.set_authorizer(self.authorize)
+            self.replica = replica
+            # Versions change meaning; nothing cached so far can be compared
+            self.entries.clear()
+            self.bytes = 0
+
+    def authorize(self, action, table, column, database, trigger):
+        if action == sqlite3.SQLITE_READ and self.reading is not None and table:
+            self.reading.add(table)
+        return sqlite3.SQLITE_OK
+
+    def refresh_versions(self):
+        # One PRAGMA when nothing was committed elsewhere since the last call.
+        # With a replica this also applies pending changes to it, so a read
+        # right after a write sees that write.
+        if self.replica is not None:
+            self.replica.catch_up()
+            return
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return
+        self.data_version = version
+        self.untracked_version += 1
+        newest = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+        if newest < self.last_seq:
+            # The log started over below the cursor (a backup was restored):
+            # the changes in between are unknown, so nothing cached is current
+            self.forget(newest)
+            return
+        for table_name, last_seq in self.conn.execute("""
+                SELECT table_name, MAX(seq) FROM ChangeLog WHERE seq > ? GROUP BY table_name
+            """, (self.last_seq,)).fetchall():
+            self.table_versions[table_name] = self.table_versions.get(table_name, 0) + 1
+            self.last_seq = max(self.last_seq, last_seq)
+
+    def forget(self, last_seq):
+        self.entries.clear()
+        self.bytes = 0
+        for table in TRACKED_TABLES:
+            self.table_versions[table] = self.table_versions.get(table, 0) + 1
+        self.last_seq = last_seq
+
+    def reset(self):
+        # After the database file is replaced: drops the replica, which
+        # follows the old file's journal, and starts over from the new file
+        with self.lock:
+            self.replica = None
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            self.untracked_version += 1
+            self.forget(self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0])
+
+    def version_of(self, table):
+        if self.replica is not None:
+            return self.replica.version_of(table)
+        if table in TRACKED_TABLES:
+            return self.table_versions.get(table, 0)
+        return ('any', self.untracked_version)
+
+    def is_current(self, entry):
+        return all(self.version_of(table) == version for table, version in entry.versions)
+
+    def cached(self, key, compute):
+        # compute(conn) on a miss; its result is kept until a table it read changes
+        with self.lock:
+            self.refresh_versions()
+            entry = self.entries.get(key)
+            if entry is not None:
+                if self.is_current(entry):
+                    entry.hits += 1
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return entry.result
+                self.stale += 1
+                self.drop(key)
+
+            self.misses += 1
+            start = time.perf_counter()
+            self.reading = set()
+            replica = self.replica
+            try:
+                # Versions are read before the replica's lock is released: its
+                # own thread may apply a change right after
+                with replica.lock if replica is not None else contextlib.nullcontext():
+                    result = compute(self.conn if replica is None else replica.conn)
+                    tables, self.reading = self.reading, None
+                    versions = tuple((table, self.version_of(table)) for table in sorted(tables))
+            finally:
+                self.reading = None
+            self.compute_seconds += time.perf_counter() - start
+
+            size = result_bytes(result)
+            if size <= self.max_bytes // LARGEST_ENTRY_SHARE:
+                self.entries[key] = CacheEntry(result, versions, size)
+                self.bytes += size
+                while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                    self.drop(next(iter(self.entries)))
+                    self.evictions += 1
+            return result
+
+    def query(self, sql, params=()):
+        # fetchall() of a read-only statement, through the cache
+        params = tuple(params)
+        return self.cached(('sql', normalize_sql(sql), params),
+                           lambda conn: conn.execute(sql, params).fetchall())
+
+    def drop(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'compute_seconds': self.compute_seconds,
+            }
+
+    def entry_summaries(self):
+        # [(key, rows, bytes, hits, age seconds, tables)], most recently used first
+        now = time.monotonic()
+        with self.lock:
+            return [(key, len(entry.result) if isinstance(entry.result, list) else 1,
+                     entry.size, entry.hits, now - entry.created,
+                     [table for table, _ in entry.versions])
+                    for key, entry in reversed(self.entries.items())]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,162 @@
+import html
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from db_schema import connect
+from price_history import AS_OF_PRICE
+
+RECEIPT_DIR = 'receipts'
+INVOICE_DIR = 'invoices'
+RECEIPT_FORMAT = 'txt'
+FORMATS = ('txt', 'html', 'pdf')
+STORE_NAME = "Store Inventory"
+CHUNK_SALES = 64
+
+# Sale fields handed to the renderers, in this order. The unit price is the
+# list price in force when the sale was made, never the product's current one.
+SALE_QUERY = f"""
+    SELECT s.id_sale, s.sale_date, c.name, p.name, s.quantity,
+           ({AS_OF_PRICE.format(product='s.id_product', moment='s.sale_date')}), s.total_price
+    FROM Sale s
+    LEFT JOIN Product p ON s.id_product = p.id_product
+    LEFT JOIN Customer c ON s.id_customer = c.id_customer
+"""
+
+
+def receipt_lines(sale):
+    sale_id, sale_date, customer, product, quantity, unit_price, total = sale
+    if unit_price is None:
+        # No price history for the sale: what was actually charged per item
+        unit_price = total / quantity if quantity else 0.0
+    discount = unit_price * quantity - total
+    lines = [
+        STORE_NAME,
+        f"Invoice #{sale_id}",
+        f"Date: {sale_date or '-'}",
+        f"Customer: {customer or '-'}",
+        "",
+        f"{product or 'Unknown product'}",
+        f"  {quantity} x ${unit_price:.2f} = ${unit_price * quantity:.2f}",
+    ]
+    if discount > 0.005:
+        lines.append(f"  Discount: -${discount:.2f}")
+    lines += ["", f"TOTAL: ${total:.2f}", "", "Thank you for your purchase!"]
+    return lines
+
+
+def render_text(sale):
+    return ("\n".join(receipt_lines(sale)) + "\n").encode('utf-8')
+
+
+def render_html(sale):
+    lines = receipt_lines(sale)
+    body = "\n".join(f"<p>{html.escape(line)}</p>" if line else "<hr>" for line in lines[1:])
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(lines[1])}</title></head>\n"
+            f"<body style=\"font-family: sans-serif\">\n<h2>{html.escape(lines[0])}</h2>\n"
+            f"{body}\n</body></html>\n").encode('utf-8')
+
+
+def render_pdf(sale):
+    # Single-page PDF with the built-in Helvetica font; no external library
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    content = ["BT", "/F1 12 Tf", "16 TL", "56 780 Td"]
+    content += [f"({escape(line)}) Tj T*" for line in receipt_lines(sale)]
+    content.append("ET")
+    stream = "\n".join(content).encode('latin-1', 'replace')
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+RENDERERS = {'txt': render_text, 'html': render_html, 'pdf': render_pdf}
+
+
+def write_receipt(job):
+    # Runs in a worker process: render one sale and write it to disk
+    sale, fmt, out_dir = job
+    path = os.path.join(out_dir, f"invoice_{sale[0]}.{fmt}")
+    with open(path, 'wb') as out:
+        out.write(RENDERERS[fmt](sale))
+    return path
+
+
+def write_receipts(sales, fmt, out_dir):
+    for sale in sales:
+        write_receipt((sale, fmt, out_dir))
+    return len(sales)
+
+
+def make_pool(workers=None):
+    # spawn, not fork: workers must not inherit the Tk interpreter
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def receipt_dir(db_name, folder=RECEIPT_DIR):
+    path = os.path.join(os.path.dirname(os.path.abspath(db_name)), folder)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def submit_receipt(pool, db_name, sale, fmt=RECEIPT_FORMAT):
+    # Fire-and-forget rendering of a just-saved sale; returns the Future
+    return pool.submit(write_receipt, (sale, fmt, receipt_dir(db_name)))
+
+
+def generate_invoices(db_name, start, end, fmt='pdf', workers=None, progress=None):
+    # Render every sale dated in [start, end) across all cores. Sales are read
+    # in chunks and only a few chunks per worker are in flight at once, so
+    # memory stays flat however large the range is.
+    out_dir = receipt_dir(db_name, os.path.join(INVOICE_DIR, f"{start}_{end}"))
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    conn = connect(db_name)
+    count = 0
+    try:
+        cursor = conn.execute(SALE_QUERY + " WHERE s.sale_date >= ? AND s.sale_date < ? ORDER BY s.id_sale",
+                              (start, end))
+        with make_pool(workers) as pool:
+            pending = set()
+            while True:
+                chunk = cursor.fetchmany(CHUNK_SALES)
+                if chunk:
+                    pending.add(pool.submit(write_receipts, chunk, fmt, out_dir))
+                if pending and (not chunk or len(pending) >= workers * 4):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        count += future.result()
+                    if progress:
+                        progress(count)
+                if not chunk and not pending:
+                    break
+    finally:
+        conn.close()
+    return count, time.perf_counter() - started, out_dir
+
+
+if __name__ == "__main__":
+    import sys
+    fmt = sys.argv[3] if len(sys.argv) > 3 else 'pdf'
+    count, seconds, out_dir = generate_invoices('store_inventory.db', sys.argv[1], sys.argv[2], fmt)
+    print(f"{count} invoices written to {out_dir} in {seconds:.2f}s")
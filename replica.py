@@ -0,0 +1,272 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from db_schema import TRACKED_TABLES, VERSIONED_TABLES, connect, table_columns
+from write_queue import percentile
+
+REPLICA_POLL_SECONDS = 0.5
+# Small tables with no journal, copied whole when their TableVersion moves
+COPIED_TABLES = VERSIONED_TABLES
+# Write-side bookkeeping nobody reads from the replica; dropped after seeding
+DROPPED_TABLES = ('ChangeLog', 'ChangeJournal', 'SyncMeta', 'SyncPeer', 'SyncRow', 'TableVersion')
+LAG_SAMPLES = 500
+CHUNK = 500
+
+
+class Replica:
+    # Read-only in-memory copy of the database for list and report queries.
+    # Seeded with the backup API, then kept current from the ChangeJournal:
+    # each entry carries the row's new values, so journaled tables are
+    # patched without reading them back. CustomerStats and PriceHistory are
+    # re-read for the customers and products those changes touched, and the
+    # small unjournaled tables are copied whole when their TableVersion moves.
+    # The replica has no triggers; every table it changes gets its version
+    # bumped for the query cache.
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.lock = threading.RLock()
+        self.table_versions = {}
+        self.lag_ms = deque(maxlen=LAG_SAMPLES)
+        self.applied = 0
+        self.reseeds = 0
+        self.last_catch_up = None
+        self.last_error = None
+        self.stop = threading.Event()
+        self.thread = None
+
+        self.source = connect(db_name, check_same_thread=False)
+        self.source.isolation_level = None
+        # No statement cache: the query cache's authorizer must see every
+        # statement prepared on this connection
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False, cached_statements=0)
+        self.seed()
+
+    def seed(self):
+        with self.lock:
+            start = time.perf_counter()
+            self.data_version = self.source.execute("PRAGMA data_version").fetchone()[0]
+            # Read first: entries committed during the copy are applied again,
+            # which is harmless since each one sets the row's final values
+            self.applied_id = self.source.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM ChangeJournal").fetchone()[0]
+            self.copied_versions = self.read_versions()
+            self.source.backup(self.conn)
+
+            for (trigger,) in self.conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+                self.conn.execute(f'DROP TRIGGER "{trigger}"')
+            for table in DROPPED_TABLES:
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.commit()
+
+            self.columns = {table: [column for column in table_columns(self.source, table) if column != key]
+                            for table, key in TRACKED_TABLES.items()}
+            self.seed_ms = (time.perf_counter() - start) * 1000
+            # Everything may differ from what a reseed replaced
+            for (table,) in self.conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                self.bump(table)
+
+    def read_versions(self):
+        return dict(self.source.execute("SELECT table_name, version FROM TableVersion").fetchall())
+
+    def read_table(self, table):
+        if not table_columns(self.source, table):
+            return None
+        return self.source.execute(f"SELECT * FROM {table}").fetchall()
+
+    def version_of(self, table):
+        return self.table_versions.get(table, 0)
+
+    def bump(self, table):
+        self.table_versions[table] = self.table_versions.get(table, 0) + 1
+
+    def catch_up(self):
+        # Applies whatever was committed to the file since the last call;
+        # a single PRAGMA when nothing was
+        with self.lock:
+            version = self.source.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return 0
+            self.data_version = version
+
+            self.source.execute("BEGIN")
+            try:
+                oldest, newest = self.source.execute(
+                    "SELECT MIN(id), MAX(id) FROM ChangeJournal").fetchone()
+                versions = self.read_versions()
+                if (oldest is not None and (oldest > self.applied_id + 1 or newest < self.applied_id)
+                        or versions.keys() - self.copied_versions.keys()):
+                    # Entries were pruned before we saw them, ids started
+                    # over, or a copied table was created after seeding
+                    self.source.execute("COMMIT")
+                    self.reseeds += 1
+                    self.seed()
+                    return 0
+                entries = self.source.execute("""
+                    SELECT id, changed_at, table_name, row_id, op, old_values, new_values
+                    FROM ChangeJournal WHERE id > ? ORDER BY id
+                """, (self.applied_id,)).fetchall()
+                rows, customers, products = self.coalesce(entries)
+                derived = {('CustomerStats', 'id_customer'): (customers, self.read_rows(
+                               'CustomerStats', 'id_customer', customers or ())),
+                           ('PriceHistory', 'id_product'): (products, self.read_rows(
+                               'PriceHistory', 'id_product', products or ()))}
+                copies = {table: self.read_table(table) for table in COPIED_TABLES
+                          if versions.get(table) != self.copied_versions.get(table)}
+            finally:
+                if self.source.in_transaction:
+                    self.source.execute("COMMIT")
+
+            if rows is None:
+                # Written before a schema upgrade; positions no longer match
+                self.reseeds += 1
+                self.seed()
+                return 0
+
+            self.apply(rows, derived, copies)
+            self.copied_versions = versions
+            now_ms = time.time() * 1000
+            if entries:
+                self.applied_id = entries[-1][0]
+                self.applied += len(entries)
+                # How long the oldest of these changes waited to reach the replica
+                self.lag_ms.append(max(0.0, now_ms - entries[0][1]))
+            self.last_catch_up = time.monotonic()
+            return len(entries)
+
+    def coalesce(self, entries):
+        # ({(table, row_id): values or None for deleted}, customer ids whose
+        # stats may have moved, product ids whose price may have), or
+        # (None, None, None) if an entry doesn't fit
+        rows = {}
+        customers = set()
+        products = set()
+        customer_position = self.columns['Sale'].index('id_customer')
+        for _, _, table, row_id, op, old_values, new_values in entries:
+            if table not in TRACKED_TABLES:
+                continue
+            values = json.loads(new_values) if new_values else None
+            if values is not None and len(values) != len(self.columns[table]):
+                return None, None, None
+            rows[(table, row_id)] = values
+            if table == 'Customer':
+                customers.add(row_id)
+            elif table == 'Product':
+                products.add(row_id)
+            elif table == 'Sale':
+                for image in (old_values and json.loads(old_values), values):
+                    if image and image[customer_position] is not None:
+                        customers.add(image[customer_position])
+        return rows, customers, products
+
+    def read_rows(self, table, key, ids):
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), CHUNK):
+            chunk = ids[start:start + CHUNK]
+            rows.extend(self.source.execute(
+                f"SELECT * FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall())
+        return rows
+
+    def apply(self, rows, derived, copies):
+        # derived: {(table, key): (ids, their current rows)}, replaced whole
+        conn = self.conn
+        changed = set()
+        try:
+            for (table, row_id), values in rows.items():
+                key = TRACKED_TABLES[table]
+                if values is None:
+                    conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (row_id,))
+                else:
+                    columns = ", ".join([key] + self.columns[table])
+                    conn.execute(f"INSERT OR REPLACE INTO {table} ({columns}) "
+                                 f"VALUES ({', '.join('?' * (len(values) + 1))})", [row_id] + values)
+                changed.add(table)
+
+            for (table, key), (ids, current) in derived.items():
+                if not ids:
+                    continue
+                ids = list(ids)
+                for start in range(0, len(ids), CHUNK):
+                    chunk = ids[start:start + CHUNK]
+                    conn.execute(f"DELETE FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})", chunk)
+                if current:
+                    conn.executemany(f"INSERT INTO {table} VALUES ({','.join('?' * len(current[0]))})",
+                                     current)
+                changed.add(table)
+
+            for table, copy in copies.items():
+                if copy is None:
+                    continue
+                conn.execute(f"DELETE FROM {table}")
+                if copy:
+                    conn.executemany(f"INSERT INTO {table} VALUES ({','.join('?' * len(copy[0]))})", copy)
+                changed.add(table)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        for table in changed:
+            self.bump(table)
+
+    def memory_bytes(self):
+        with self.lock:
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def stats(self):
+        samples = sorted(self.lag_ms)
+        return {
+            'memory_bytes': self.memory_bytes(),
+            'seed_ms': self.seed_ms,
+            'applied': self.applied,
+            'reseeds': self.reseeds,
+            'last_lag_ms': self.lag_ms[-1] if self.lag_ms else 0.0,
+            'lag_p95_ms': percentile(samples, 0.95),
+            'max_lag_ms': samples[-1] if samples else 0.0,
+            'since_catch_up': None if self.last_catch_up is None else time.monotonic() - self.last_catch_up,
+            'last_error': self.last_error,
+        }
+
+    def start(self, interval=REPLICA_POLL_SECONDS):
+        # Keeps up in the background even when nothing is being read
+        def run():
+            while not self.stop.wait(interval):
+                try:
+                    self.catch_up()
+                    self.last_error = None
+                except sqlite3.Error as e:
+                    self.last_error = str(e)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stop.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        with self.lock:
+            self.conn.close()
+            self.source.close()
+
+
+if __name__ == "__main__":
+    import sys
+    db_name = sys.argv[1] if len(sys.argv) > 1 else 'store_inventory.db'
+    replica = Replica(db_name)
+    print(f"Seeded in {replica.seed_ms:.0f} ms, {replica.memory_bytes() / (1024 * 1024):.1f} MB in memory")
+    for label, conn in (("file", connect(db_name)), ("replica", replica.conn)):
+        start = time.perf_counter()
+        conn.execute("""
+            SELECT s.id_sale, p.name, c.name, s.quantity, s.total_price
+            FROM Sale s JOIN Product p ON s.id_product = p.id_product
+            JOIN Customer c ON s.id_customer = c.id_customer ORDER BY s.id_sale DESC
+        """).fetchall()
+        print(f"  sales list from {label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    replica.close()
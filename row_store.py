@@ -0,0 +1,82 @@
+import sys
+from array import array
+
+
+class RowStore:
+    # Rows held column by column: numbers in typed arrays ('q' int64, 'd'
+    # double), text in lists of interned strings so repeated names share one
+    # object. Rows are found by id (the Treeview iid) through a dict of
+    # positions; a delete moves the last row into the freed slot.
+    def __init__(self, columns):
+        self.names = [name for name, _ in columns]
+        self.types = dict(columns)
+        self.positions = {}
+        self.ids = array('q')
+        self.columns = {}
+        # True once every row of the table is loaded, not just a filtered view
+        self.complete = False
+        self.clear()
+
+    def clear(self):
+        self.positions.clear()
+        self.ids = array('q')
+        self.columns = {name: ([] if kind is str else array(kind)) for name, kind in self.types.items()}
+        self.complete = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, row_id):
+        return int(row_id) in self.positions
+
+    def put(self, row_id, values):
+        # Insert or replace one row; values in column order
+        row_id = int(row_id)
+        position = self.positions.get(row_id)
+        for name, value in zip(self.names, values):
+            if self.types[name] is str and value is not None:
+                value = sys.intern(str(value))
+            column = self.columns[name]
+            if position is None:
+                column.append(value)
+            else:
+                column[position] = value
+        if position is None:
+            self.positions[row_id] = len(self.ids)
+            self.ids.append(row_id)
+
+    def remove(self, row_id):
+        position = self.positions.pop(int(row_id), None)
+        if position is None:
+            return
+        last = len(self.ids) - 1
+        if position != last:
+            moved = self.ids[last]
+            self.ids[position] = moved
+            self.positions[moved] = position
+            for column in self.columns.values():
+                column[position] = column[last]
+        self.ids.pop()
+        for column in self.columns.values():
+            column.pop()
+
+    def get(self, row_id):
+        # Tuple of column values, or None if the row isn't held
+        position = self.positions.get(int(row_id))
+        if position is None:
+            return None
+        return tuple(self.columns[name][position] for name in self.names)
+
+    def value(self, row_id, name):
+        position = self.positions.get(int(row_id))
+        return None if position is None else self.columns[name][position]
+
+    def rows(self):
+        # (id, values) in id order
+        for row_id in sorted(self.positions):
+            yield row_id, self.get(row_id)
+
+    def memory_bytes(self):
+        # Containers only; interned strings are shared with the rest of the app
+        return (sys.getsizeof(self.positions) + sys.getsizeof(self.ids) +
+                sum(sys.getsizeof(column) for column in self.columns.values()))
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+
+from db_schema import connect, set_terminal
+
+ARCHIVE_DIR = 'archives'
+BATCH_SIZE = 1000
+# Journal entries of archived sales leaving the Sale table carry this
+# terminal: sync doesn't ship them, since the sales still exist
+ARCHIVE_TERMINAL = 'archive'
+
+SALE_COLUMNS = "id_sale, id_product, id_customer, quantity, total_price, sale_date"
+
+
+def archive_path(db_name, period):
+    base_dir = os.path.dirname(os.path.abspath(db_name))
+    return os.path.join(base_dir, ARCHIVE_DIR, f"sales_{period}.db")
+
+
+def create_archive(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Sale (
+            id_sale INTEGER PRIMARY KEY,
+            id_product INTEGER,
+            id_customer INTEGER,
+            quantity INTEGER NOT NULL,
+            total_price REAL NOT NULL,
+            sale_date TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_date ON Sale(sale_date)")
+    conn.commit()
+    conn.close()
+
+
+def archive_sales(db_name, cutoff, batch_size=BATCH_SIZE, conn=None):
+    # Move sales dated before cutoff ('YYYY-MM-DD') into one archive file per year.
+    # Sales with no sale_date (made before the column existed) belong to no
+    # year and are never archived; they stay in Sale, in every total.
+    # Each batch is copied and deleted in a single transaction so a crash never
+    # loses or duplicates a sale; INSERT OR REPLACE makes a retried batch harmless.
+    # conn, if given, is used instead of a connection of its own and left
+    # open; it must be in autocommit mode (the write queue's is).
+    own = conn is None
+    if own:
+        conn = connect(db_name)
+        conn.isolation_level = None
+    set_terminal(conn, ARCHIVE_TERMINAL)
+    moved = 0
+
+    try:
+        oldest = conn.execute("SELECT MIN(sale_date) FROM Sale WHERE sale_date < ?",
+                              (cutoff,)).fetchone()[0]
+        if oldest is None:
+            return 0
+
+        for year in range(int(oldest[:4]), int(cutoff[:4]) + 1):
+            period = str(year)
+            lower = f"{year}-01-01"
+            upper = min(cutoff, f"{year + 1}-01-01")
+            if not conn.execute("SELECT 1 FROM Sale WHERE sale_date >= ? AND sale_date < ? LIMIT 1",
+                                (lower, upper)).fetchone():
+                continue
+
+            path = archive_path(db_name, period)
+            create_archive(path)
+
+            conn.execute("ATTACH DATABASE ? AS arch", (path,))
+            try:
+                while True:
+                    conn.execute("BEGIN IMMEDIATE")
+                    ids = [row[0] for row in conn.execute(
+                        "SELECT id_sale FROM main.Sale WHERE sale_date >= ? AND sale_date < ? LIMIT ?",
+                        (lower, upper, batch_size))]
+                    if not ids:
+                        conn.execute("COMMIT")
+                        break
+
+                    placeholders = ",".join("?" * len(ids))
+                    count, revenue, first_date, last_date = conn.execute(f"""
+                        SELECT COUNT(*), COALESCE(SUM(total_price), 0), MIN(sale_date), MAX(sale_date)
+                        FROM main.Sale WHERE id_sale IN ({placeholders})
+                    """, ids).fetchone()
+
+                    conn.execute(f"""
+                        INSERT OR REPLACE INTO arch.Sale ({SALE_COLUMNS})
+                        SELECT {SALE_COLUMNS} FROM main.Sale WHERE id_sale IN ({placeholders})
+                    """, ids)
+                    # Archived sales still count toward each customer's lifetime
+                    # totals, so put back what the delete trigger takes off
+                    per_customer = conn.execute(f"""
+                        SELECT id_customer, COUNT(*), SUM(total_price), MAX(sale_date)
+                        FROM main.Sale WHERE id_sale IN ({placeholders}) AND id_customer IS NOT NULL
+                        GROUP BY id_customer
+                    """, ids).fetchall()
+                    conn.execute(f"DELETE FROM main.Sale WHERE id_sale IN ({placeholders})", ids)
+                    conn.executemany("""
+                        UPDATE CustomerStats SET
+                            sale_count = sale_count + ?,
+                            lifetime_spend = lifetime_spend + ?,
+                            last_purchase = COALESCE(MAX(last_purchase, ?), last_purchase, ?)
+                        WHERE id_customer = ?
+                    """, [(count_, spend, last, last, customer)
+                          for customer, count_, spend, last in per_customer])
+
+                    conn.execute("""
+                        INSERT INTO SaleArchive (period, path, first_date, last_date, sale_count, revenue)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(period) DO UPDATE SET
+                            path = excluded.path,
+                            first_date = MIN(first_date, excluded.first_date),
+                            last_date = MAX(last_date, excluded.last_date),
+                            sale_count = sale_count + excluded.sale_count,
+                            revenue = revenue + excluded.revenue
+                    """, (period, path, first_date, last_date, count, revenue))
+                    conn.execute("COMMIT")
+                    moved += count
+            finally:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                conn.execute("DETACH DATABASE arch")
+    finally:
+        if own:
+            conn.close()
+        else:
+            set_terminal(conn)
+
+    return moved
+
+
+def attached_databases(conn):
+    return {row[1] for row in conn.execute("PRAGMA database_list")}
+
+
+def sales_source(conn, start=None, end=None):
+    # FROM-clause subquery over hot and archived sales, attaching only the
+    # archives whose date range overlaps [start, end)
+    query = "SELECT period, path FROM SaleArchive WHERE 1=1"
+    params = []
+    if start:
+        query += " AND last_date >= ?"
+        params.append(start)
+    if end:
+        query += " AND first_date < ?"
+        params.append(end)
+
+    parts = [f"SELECT {SALE_COLUMNS} FROM main.Sale"]
+    attached = attached_databases(conn)
+    for period, path in conn.execute(query, params).fetchall():
+        if not os.path.exists(path):
+            continue
+        alias = f"archive_{period}"
+        if alias not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        parts.append(f"SELECT {SALE_COLUMNS} FROM {alias}.Sale")
+
+    return "(" + " UNION ALL ".join(parts) + ")"
+
+
+def lifetime_totals(conn):
+    # Hot table plus the per-period totals recorded at archive time
+    hot_count, hot_revenue = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(total_price), 0) FROM Sale").fetchone()
+    archived_count, archived_revenue = conn.execute(
+        "SELECT COALESCE(SUM(sale_count), 0), COALESCE(SUM(revenue), 0) FROM SaleArchive").fetchone()
+    return hot_count + archived_count, hot_revenue + archived_revenue
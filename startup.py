@@ -0,0 +1,54 @@
+import json
+import os
+import time
+
+# Last dashboard figures seen on this till, drawn at launch before any query runs
+SNAPSHOT_PATH = os.path.join(os.path.expanduser('~'), '.store_inventory_snapshot.json')
+
+
+class StartupProfiler:
+    # Records how long each startup phase took; a no-op unless enabled
+    def __init__(self, enabled, started=None):
+        self.enabled = enabled
+        self.started = started or time.perf_counter()
+        self.last = self.started
+        self.phases = []
+        self.reported = False
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print("Startup phases:")
+        for phase, seconds in self.phases:
+            print(f"  {phase:<24} {seconds * 1000:8.1f} ms")
+        print(f"  {'total':<24} {(self.last - self.started) * 1000:8.1f} ms")
+
+
+def load_snapshot(db_name):
+    try:
+        with open(SNAPSHOT_PATH) as snapshot:
+            return json.load(snapshot).get(os.path.abspath(db_name))
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(db_name, values):
+    try:
+        with open(SNAPSHOT_PATH) as snapshot:
+            snapshots = json.load(snapshot)
+    except (OSError, ValueError):
+        snapshots = {}
+    snapshots[os.path.abspath(db_name)] = values
+    try:
+        with open(SNAPSHOT_PATH, 'w') as snapshot:
+            json.dump(snapshots, snapshot)
+    except OSError:
+        pass
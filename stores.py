@@ -0,0 +1,206 @@
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_schema import table_columns
+from sales_archive import SALE_COLUMNS, lifetime_totals, sales_source
+
+# Registered store databases, kept beside the head office database
+STORES_FILE = 'stores.json'
+
+
+def stores_path(db_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), STORES_FILE)
+
+
+def load_stores(db_name):
+    # [(name, path)]; the local database is always the first store
+    stores = [("This store", os.path.abspath(db_name))]
+    try:
+        with open(stores_path(db_name)) as registry:
+            for store in json.load(registry):
+                if os.path.abspath(store['path']) != stores[0][1]:
+                    stores.append((store['name'], os.path.abspath(store['path'])))
+    except (OSError, ValueError, KeyError):
+        pass
+    return stores
+
+
+def save_stores(db_name, stores):
+    with open(stores_path(db_name), 'w') as registry:
+        json.dump([{'name': name, 'path': path} for name, path in stores[1:]], registry, indent=2)
+
+
+def date_filter(start, end, column='sale_date'):
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+# Per-store aggregates; each runs on the store's own read-only connection.
+# Stores may run an older version of the app, so nothing here assumes
+# tables or columns that upgrade_schema() adds.
+
+def store_sales(conn, start=None, end=None):
+    # FROM-clause source of the store's sales with SALE_COLUMNS
+    if table_columns(conn, "SaleArchive"):
+        return sales_source(conn, start, end)
+    if 'sale_date' in table_columns(conn, "Sale"):
+        return "Sale"
+    # Created before sales were dated
+    return f"(SELECT {SALE_COLUMNS.replace('sale_date', 'NULL AS sale_date')} FROM Sale)"
+
+
+def store_totals(conn):
+    products = conn.execute("SELECT COUNT(*) FROM Product").fetchone()[0]
+    customers = conn.execute("SELECT COUNT(*) FROM Customer").fetchone()[0]
+    if table_columns(conn, "SaleArchive"):
+        sales, revenue = lifetime_totals(conn)
+    else:
+        sales, revenue = conn.execute("SELECT COUNT(*), COALESCE(SUM(total_price), 0) FROM Sale").fetchone()
+    return products, customers, sales, revenue
+
+
+def store_product_sales(conn, start=None, end=None):
+    # Product ids differ between stores, so products are matched by name
+    where, params = date_filter(start, end, 's.sale_date')
+    return conn.execute(f"""
+        SELECT p.name, SUM(s.quantity), SUM(s.total_price)
+        FROM {store_sales(conn, start, end)} s
+        JOIN Product p ON s.id_product = p.id_product
+        {where}
+        GROUP BY p.name
+    """, params).fetchall()
+
+
+def store_revenue_by_period(conn, start=None, end=None, width=7):
+    # width 7 groups by month (YYYY-MM), 10 by day, 4 by year
+    where, params = date_filter(start, end)
+    return conn.execute(f"""
+        SELECT substr(sale_date, 1, {int(width)}) AS period, COUNT(*), SUM(total_price)
+        FROM {store_sales(conn, start, end)}
+        {where}
+        GROUP BY period
+    """, params).fetchall()
+
+
+class Shard:
+    # One long-lived read-only connection per store: the combined view never
+    # writes to, or migrates, another store's file. Results are cached per query and
+    # tagged with the connection's PRAGMA data_version, which changes whenever
+    # any other connection commits to that store, so a hit is always current.
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.conn = None
+
+    def query(self, key, compute):
+        # (result, cached)
+        with self.lock:
+            if self.conn is None:
+                if not os.path.exists(self.path):
+                    raise sqlite3.OperationalError(f"store database not found: {self.path}")
+                # Not db_schema.connect(): nothing is journaled here
+                self.conn = sqlite3.connect(pathlib.Path(self.path).as_uri() + "?mode=ro",
+                                            uri=True, check_same_thread=False)
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            hit = self.cache.get(key)
+            if hit and hit[0] == version:
+                return hit[1], True
+            result = compute(self.conn)
+            self.cache[key] = (version, result)
+            return result, False
+
+    def close(self):
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+
+class StoreGroup:
+    # Fans each aggregate out to every store in parallel (SQLite releases the
+    # GIL while it works) and merges the partial results here
+    def __init__(self, stores):
+        self.shards = [Shard(name, path) for name, path in stores]
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.shards)))
+
+    def fan_out(self, key, compute):
+        # [(shard, result or None, seconds, cached, error or None)] in store order
+        def run(shard):
+            start = time.perf_counter()
+            try:
+                result, cached = shard.query(key, compute)
+                return shard, result, time.perf_counter() - start, cached, None
+            except sqlite3.Error as e:
+                return shard, None, time.perf_counter() - start, False, str(e)
+
+        return list(self.executor.map(run, self.shards))
+
+    def totals(self):
+        # (per-store rows, combined (products, customers, sales, revenue))
+        rows = self.fan_out(('totals',), store_totals)
+        combined = [0, 0, 0, 0.0]
+        for _, result, _, _, error in rows:
+            if not error:
+                combined = [a + b for a, b in zip(combined, result)]
+        return rows, tuple(combined)
+
+    def top_products(self, limit=20, start=None, end=None):
+        # [(name, quantity, revenue)] across all stores, best revenue first
+        rows = self.fan_out(('products', start, end),
+                            lambda conn: store_product_sales(conn, start, end))
+        merged = {}
+        for _, result, _, _, error in rows:
+            for name, quantity, revenue in result or ():
+                total = merged.setdefault(name, [0, 0.0])
+                total[0] += quantity or 0
+                total[1] += revenue or 0.0
+        ranked = sorted(merged.items(), key=lambda item: item[1][1], reverse=True)
+        return rows, [(name, quantity, revenue) for name, (quantity, revenue) in ranked[:limit]]
+
+    def revenue_by_period(self, start=None, end=None, width=7):
+        # [(period, sales, revenue)] across all stores, oldest first
+        rows = self.fan_out(('periods', start, end, width),
+                            lambda conn: store_revenue_by_period(conn, start, end, width))
+        merged = {}
+        for _, result, _, _, error in rows:
+            for period, count, revenue in result or ():
+                total = merged.setdefault(period, [0, 0.0])
+                total[0] += count
+                total[1] += revenue or 0.0
+        # Undated sales have no period
+        merged.pop(None, None)
+        return rows, [(period, count, revenue) for period, (count, revenue) in sorted(merged.items())]
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for shard in self.shards:
+            shard.close()
+
+
+if __name__ == "__main__":
+    import sys
+    paths = sys.argv[1:] or ['store_inventory.db']
+    group = StoreGroup([(os.path.basename(path), os.path.abspath(path)) for path in paths])
+    for attempt in ("cold", "cached"):
+        start = time.perf_counter()
+        rows, combined = group.totals()
+        group.top_products()
+        group.revenue_by_period()
+        print(f"{attempt}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    for shard, result, seconds, cached, error in rows:
+        print(f"  {shard.name}: {error or result}")
+    print(f"  all stores: {combined}")
+    group.close()
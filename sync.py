@@ -0,0 +1,434 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from db_schema import TRACKED_TABLES, connect, set_terminal, table_columns, upgrade_schema
+from sales_archive import ARCHIVE_TERMINAL
+
+SYNC_DIR = 'sync'
+SYNC_PORT = 8765
+SYNC_INTERVAL_MS = 5 * 60 * 1000
+BATCH_ROWS = 5000
+SOCKET_TIMEOUT = 30.0
+
+# Columns holding ids of other synced tables; sent as [origin, origin_id]
+FOREIGN_KEYS = {'Sale': {'id_product': 'Product', 'id_customer': 'Customer'}}
+
+# Columns referencing tables that aren't synced; each store keeps its own
+LOCAL_COLUMNS = {'Product': {'id_category'}}
+
+# Journal entries written while applying a peer's changes carry this terminal
+# prefix, so they are never shipped back to where they came from
+SYNC_TERMINAL = 'sync:'
+
+
+def create_sync_tables(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS SyncMeta (key TEXT PRIMARY KEY, value TEXT)")
+    # How far into ChangeJournal each peer has been sent
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS SyncPeer (
+            peer TEXT PRIMARY KEY,
+            sent_id INTEGER NOT NULL DEFAULT 0,
+            last_sync TEXT
+        )
+    """)
+    # Rows that arrived from other stores: their origin key, our local id and
+    # the version last applied, which makes re-applying a change set a no-op
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS SyncRow (
+            table_name TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            origin_id INTEGER NOT NULL,
+            local_id INTEGER,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (table_name, origin, origin_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_syncrow_local ON SyncRow(table_name, local_id)")
+    # Latest local edit of a row, for conflict checks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_row ON ChangeJournal(table_name, row_id, changed_at)")
+    if conn.execute("SELECT 1 FROM SyncMeta WHERE key = 'store_id'").fetchone() is None:
+        conn.execute("INSERT INTO SyncMeta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+    conn.commit()
+
+
+def open_sync(db_name):
+    conn = connect(db_name)
+    upgrade_schema(conn)
+    create_sync_tables(conn)
+    return conn
+
+
+def store_id(conn):
+    return conn.execute("SELECT value FROM SyncMeta WHERE key = 'store_id'").fetchone()[0]
+
+
+def sent_id(conn, peer):
+    row = conn.execute("SELECT sent_id FROM SyncPeer WHERE peer = ?", (peer,)).fetchone()
+    return row[0] if row else 0
+
+
+def mark_sent(conn, peer, journal_id):
+    conn.execute("""
+        INSERT INTO SyncPeer (peer, sent_id, last_sync) VALUES (?, ?, ?)
+        ON CONFLICT(peer) DO UPDATE SET sent_id = MAX(sent_id, excluded.sent_id),
+                                        last_sync = excluded.last_sync
+    """, (peer, journal_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+
+
+def value_columns(conn, table):
+    key = TRACKED_TABLES[table]
+    return [column for column in table_columns(conn, table) if column != key]
+
+
+class KeyMap:
+    # Local id <-> (origin, origin_id); rows with no SyncRow entry were
+    # created here and keep their own id under this store's origin
+    def __init__(self, conn):
+        self.conn = conn
+        self.store = store_id(conn)
+        self.cache = {}
+
+    def global_key(self, table, local_id):
+        if local_id is None:
+            return None
+        key = (table, local_id)
+        if key not in self.cache:
+            row = self.conn.execute("""
+                SELECT origin, origin_id FROM SyncRow WHERE table_name = ? AND local_id = ?
+            """, key).fetchone()
+            self.cache[key] = list(row) if row else [self.store, local_id]
+        return self.cache[key]
+
+    def local_id(self, table, origin, origin_id):
+        # (local id or None, version already applied or -1)
+        row = self.conn.execute("""
+            SELECT local_id, version FROM SyncRow
+            WHERE table_name = ? AND origin = ? AND origin_id = ?
+        """, (table, origin, origin_id)).fetchone()
+        if row:
+            return row[0], row[1]
+        if origin == self.store:
+            return origin_id, -1
+        return None, -1
+
+
+def build_changeset(conn, after_id, limit=BATCH_ROWS, full=False):
+    # Changes written on this store's own tills since journal entry after_id,
+    # leaving out sales moved to an archive, newest values per row, in first-change order so a sale never arrives
+    # before the product it references. full=True sends every current row
+    # instead, to seed a new peer.
+    keys = KeyMap(conn)
+    columns = {table: value_columns(conn, table) for table in TRACKED_TABLES}
+    conn.execute("BEGIN")
+    try:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ChangeJournal").fetchone()[0]
+        changes = {}
+        if full:
+            for table, key in TRACKED_TABLES.items():
+                for row in conn.execute(f"SELECT {key}, {', '.join(columns[table])} FROM {table}"):
+                    changes[(table, row[0])] = ['U', 0, dict(zip(columns[table], row[1:]))]
+            to_id = last_id
+        else:
+            entries = conn.execute("""
+                SELECT id, changed_at, table_name, row_id, op, new_values FROM ChangeJournal
+                WHERE id > ? AND id <= ?
+                  AND (terminal IS NULL OR (terminal NOT LIKE 'sync:%' AND terminal <> ?))
+                ORDER BY id LIMIT ?
+            """, (after_id, last_id, ARCHIVE_TERMINAL, limit)).fetchall()
+            # A short batch means everything up to last_id has been seen,
+            # including entries skipped as echoes of other peers' changes
+            to_id = entries[-1][0] if len(entries) == limit else last_id
+            for _, changed_at, table, row_id, op, new_values in entries:
+                values = dict(zip(columns[table], json.loads(new_values))) if new_values else None
+                change = changes.setdefault((table, row_id), [op, changed_at, values])
+                change[0] = 'D' if op == 'D' else 'U'
+                change[1:] = [changed_at, values]
+    finally:
+        conn.execute("COMMIT")
+
+    rows = []
+    for (table, row_id), (op, version, values) in changes.items():
+        if values:
+            for column in LOCAL_COLUMNS.get(table, ()):
+                values.pop(column, None)
+            for column, parent in FOREIGN_KEYS.get(table, {}).items():
+                if column in values:
+                    values[column] = keys.global_key(parent, values[column])
+        origin, origin_id = keys.global_key(table, row_id)
+        rows.append([table, origin, origin_id, op, version, values])
+
+    return {'format': 1, 'store': keys.store, 'from_id': after_id, 'to_id': to_id, 'rows': rows}
+
+
+def local_edit_version(conn, table, local_id):
+    # Time of the newest change made on this store's own tills, if any
+    return conn.execute("""
+        SELECT MAX(changed_at) FROM ChangeJournal
+        WHERE table_name = ? AND row_id = ? AND (terminal IS NULL OR terminal NOT LIKE 'sync:%')
+    """, (table, local_id)).fetchone()[0]
+
+
+def apply_changeset(conn, changeset):
+    # Applies a peer's change set in one transaction. A row is applied only if
+    # its version (change time at the source) is newer than both the version
+    # already applied and any local edit; otherwise the newer side wins, so
+    # re-applying the same set changes nothing.
+    start = time.perf_counter()
+    sender = changeset['store']
+    set_terminal(conn, SYNC_TERMINAL + sender)
+    keys = KeyMap(conn)
+    columns = {table: set(value_columns(conn, table)) - LOCAL_COLUMNS.get(table, set())
+               for table in TRACKED_TABLES}
+    applied = skipped = conflicts = 0
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table, origin, origin_id, op, version, values in changeset['rows']:
+            if table not in TRACKED_TABLES:
+                continue
+            key = TRACKED_TABLES[table]
+            local_id, seen = keys.local_id(table, origin, origin_id)
+            if version <= seen:
+                skipped += 1
+                continue
+            edited = local_edit_version(conn, table, local_id) if local_id is not None else None
+            if edited is not None and edited >= version:
+                conflicts += 1
+                continue
+
+            if op == 'D':
+                if local_id is not None:
+                    conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (local_id,))
+            else:
+                values = {column: value for column, value in values.items() if column in columns[table]}
+                for column, parent in FOREIGN_KEYS.get(table, {}).items():
+                    if values.get(column) is not None:
+                        values[column] = keys.local_id(parent, *values[column])[0]
+                names = list(values)
+                exists = local_id is not None and conn.execute(
+                    f"SELECT 1 FROM {table} WHERE {key} = ?", (local_id,)).fetchone()
+                if exists:
+                    conn.execute(f"UPDATE {table} SET {', '.join(f'{name} = ?' for name in names)} "
+                                 f"WHERE {key} = ?", [values[name] for name in names] + [local_id])
+                elif origin == keys.store:
+                    # One of our own rows, deleted here and edited elsewhere
+                    conn.execute(f"INSERT INTO {table} ({key}, {', '.join(names)}) "
+                                 f"VALUES (?, {', '.join('?' * len(names))})",
+                                 [local_id] + [values[name] for name in names])
+                else:
+                    local_id = conn.execute(f"INSERT INTO {table} ({', '.join(names)}) "
+                                            f"VALUES ({', '.join('?' * len(names))})",
+                                            [values[name] for name in names]).lastrowid
+
+            conn.execute("""
+                INSERT OR REPLACE INTO SyncRow (table_name, origin, origin_id, local_id, version)
+                VALUES (?, ?, ?, ?, ?)
+            """, (table, origin, origin_id, local_id, version))
+            applied += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        set_terminal(conn)
+
+    seconds = time.perf_counter() - start
+    count = len(changeset['rows'])
+    return {
+        'rows': count,
+        'applied': applied,
+        'skipped': skipped,
+        'conflicts': conflicts,
+        'seconds': seconds,
+        'rows_per_sec': count / seconds if seconds > 0 else 0.0,
+    }
+
+
+def encode(message):
+    return zlib.compress(json.dumps(message, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+# File transport: one compressed change set per file
+
+def export_changes(db_name, out_dir=None, peer='file', full=False):
+    # Writes every pending batch for peer; returns the files written
+    conn = open_sync(db_name)
+    out_dir = out_dir or os.path.join(os.path.dirname(os.path.abspath(db_name)), SYNC_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    try:
+        while True:
+            changeset = build_changeset(conn, sent_id(conn, peer), full=full)
+            if not changeset['rows'] and not full:
+                mark_sent(conn, peer, changeset['to_id'])
+                break
+            path = os.path.join(out_dir, f"{changeset['store'][:8]}_{changeset['from_id']:012d}"
+                                         f"_{changeset['to_id']:012d}.sync")
+            with open(path + ".part", 'wb') as out:
+                out.write(encode(changeset))
+            os.replace(path + ".part", path)
+            paths.append(path)
+            mark_sent(conn, peer, changeset['to_id'])
+            full = False
+            if changeset['to_id'] <= changeset['from_id']:
+                break
+    finally:
+        conn.close()
+    return paths
+
+
+def import_changes(db_name, path):
+    conn = open_sync(db_name)
+    try:
+        with open(path, 'rb') as changes:
+            return apply_changeset(conn, decode(changes.read()))
+    finally:
+        conn.close()
+
+
+# Socket transport: length-prefixed compressed JSON messages. The store
+# sends a batch, the peer applies it and answers with its own batch for that
+# store, and each side records a batch as sent only once the other has
+# applied it. Exchanges repeat until both sides are drained.
+
+def send_message(sock, message):
+    data = encode(message)
+    sock.sendall(struct.pack('>Q', len(data)) + data)
+
+
+def receive_message(sock):
+    header = receive_exact(sock, 8)
+    if header is None:
+        return None
+    return decode(receive_exact(sock, struct.unpack('>Q', header)[0]))
+
+
+def receive_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            if chunks:
+                raise ConnectionError("peer closed the connection mid-message")
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class SyncHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        conn = open_sync(self.server.db_name)
+        try:
+            while True:
+                message = receive_message(self.request)
+                if message is None:
+                    break
+                if message['type'] == 'changes':
+                    result = apply_changeset(conn, message['changeset'])
+                    peer = message['changeset']['store']
+                    reply = build_changeset(conn, sent_id(conn, peer))
+                    send_message(self.request, {'type': 'changes', 'result': result, 'changeset': reply})
+                elif message['type'] == 'ack':
+                    mark_sent(conn, message['store'], message['to_id'])
+                    send_message(self.request, {'type': 'ok'})
+        finally:
+            conn.close()
+
+
+def serve(db_name, host='127.0.0.1', port=SYNC_PORT):
+    server = socketserver.ThreadingTCPServer((host, port), SyncHandler)
+    server.db_name = db_name
+    server.daemon_threads = True
+    return server
+
+
+def sync_with_peer(db_name, host='127.0.0.1', port=SYNC_PORT, full=False):
+    # Returns totals for both directions; raises OSError when the peer is
+    # unreachable, so an offline store just tries again later
+    conn = open_sync(db_name)
+    totals = {'sent': 0, 'received': 0, 'conflicts': 0, 'seconds': 0.0}
+    try:
+        with socket.create_connection((host, port), timeout=SOCKET_TIMEOUT) as sock:
+            peer = f"{host}:{port}"
+            while True:
+                changeset = build_changeset(conn, sent_id(conn, peer), full=full)
+                full = False
+                send_message(sock, {'type': 'changes', 'changeset': changeset})
+                reply = receive_message(sock)
+                if reply is None:
+                    raise ConnectionError("peer closed the connection")
+                mark_sent(conn, peer, changeset['to_id'])
+                result = apply_changeset(conn, reply['changeset'])
+                send_message(sock, {'type': 'ack', 'store': store_id(conn),
+                                    'to_id': reply['changeset']['to_id']})
+                receive_message(sock)
+
+                totals['sent'] += reply['result']['rows']
+                totals['received'] += result['rows']
+                totals['conflicts'] += reply['result']['conflicts'] + result['conflicts']
+                totals['seconds'] += reply['result']['seconds'] + result['seconds']
+                if not changeset['rows'] and not reply['changeset']['rows']:
+                    break
+    finally:
+        conn.close()
+    rows = totals['sent'] + totals['received']
+    totals['rows_per_sec'] = rows / totals['seconds'] if totals['seconds'] > 0 else 0.0
+    return totals
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Ship store changes to and from head office")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write pending changes to files")
+    export.add_argument('db')
+    export.add_argument('out_dir', nargs='?')
+    export.add_argument('--peer', default='file')
+    export.add_argument('--full', action='store_true', help="send every row, to seed a new peer")
+    apply = commands.add_parser('import', help="apply change set files")
+    apply.add_argument('db')
+    apply.add_argument('files', nargs='+')
+    server = commands.add_parser('serve', help="accept stores over a socket")
+    server.add_argument('db')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=SYNC_PORT)
+    push = commands.add_parser('sync', help="exchange changes with a serving peer")
+    push.add_argument('db')
+    push.add_argument('--host', default='127.0.0.1')
+    push.add_argument('--port', type=int, default=SYNC_PORT)
+    push.add_argument('--full', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        for path in export_changes(args.db, args.out_dir, args.peer, args.full):
+            print(path)
+    elif args.command == 'import':
+        for path in args.files:
+            result = import_changes(args.db, path)
+            print(f"{os.path.basename(path)}: {result['applied']} applied, {result['skipped']} already had, "
+                  f"{result['conflicts']} conflicts, {result['rows_per_sec']:.0f} rows/s")
+    elif args.command == 'serve':
+        with serve(args.db, args.host, args.port) as sync_server:
+            print(f"Serving {args.db} on {args.host}:{args.port}")
+            sync_server.serve_forever()
+    else:
+        totals = sync_with_peer(args.db, args.host, args.port, args.full)
+        print(f"sent {totals['sent']}, received {totals['received']}, "
+              f"{totals['conflicts']} conflicts, {totals['rows_per_sec']:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
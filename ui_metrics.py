@@ -0,0 +1,231 @@
+import functools
+import os
+import time
+import tkinter as tk
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from write_queue import percentile
+
+# The lag probe asks for a callback every LAG_INTERVAL_MS; how late it runs
+# is how long the event loop was busy with something else
+LAG_INTERVAL_MS = 100
+LAG_SAMPLES = 600
+OVERLAY_REFRESH_MS = 1000
+# A lag summary row is logged this often while metrics are on
+LAG_LOG_SECONDS = 10
+RECENT_SPANS = 200
+UI_METRICS_LOG = 'ui_metrics.csv'
+
+
+def metrics_log_path(db_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), UI_METRICS_LOG)
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def measured(kind):
+    # Decorates StoreInventoryApp methods: 'build' for show_* screens,
+    # 'populate' for table loaders. When metrics are off the only cost is
+    # one attribute check per call.
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.ui_metrics
+            if not metrics.enabled:
+                return method(self, *args, **kwargs)
+            with metrics.measure(kind, method.__name__):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class UIMetrics:
+    # Event-loop lag, time per screen build and table population (with the
+    # SQL share taken from the query cache and Tk's layout pass timed
+    # separately), and tracemalloc memory growth per screen. Off by default:
+    # no probe is scheduled, tracemalloc isn't running and nothing is logged.
+    def __init__(self, root, log_file, sql_seconds=lambda: 0.0):
+        self.root = root
+        self.log_file = log_file
+        self.sql_seconds = sql_seconds
+        self.enabled = False
+        self.generation = 0
+        self.started_tracing = False
+        self.baseline = None
+        self.overlay = None
+        self.expected = 0.0
+        self.last_lag_log = 0.0
+        self.lag_ms = deque(maxlen=LAG_SAMPLES)
+        self.spans = deque(maxlen=RECENT_SPANS)
+        # name -> {'kind', 'calls', 'last_ms', 'max_ms', 'sql_ms', 'layout_ms',
+        #          'first_kb', 'last_kb', 'widgets', 'toplevels'}
+        self.summary = {}
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.generation += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.baseline = tracemalloc.take_snapshot()
+        self.lag_ms.clear()
+        self.last_lag_log = time.perf_counter()
+        self.expected = time.perf_counter() + LAG_INTERVAL_MS / 1000
+        self.root.after(LAG_INTERVAL_MS, self.probe, self.generation)
+        self.refresh_overlay(self.generation)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.log_lag()
+        self.enabled = False
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.baseline = None
+        if self.overlay is not None:
+            self.overlay.destroy()
+            self.overlay = None
+
+    def probe(self, generation):
+        # A probe from before the last disable/enable lets its chain die
+        if not self.enabled or generation != self.generation:
+            return
+        now = time.perf_counter()
+        self.lag_ms.append(max(0.0, (now - self.expected) * 1000))
+        self.expected = now + LAG_INTERVAL_MS / 1000
+        self.root.after(LAG_INTERVAL_MS, self.probe, generation)
+
+    def lag_stats(self):
+        samples = sorted(self.lag_ms)
+        return {
+            'samples': len(samples),
+            'p50_ms': percentile(samples, 0.50),
+            'p95_ms': percentile(samples, 0.95),
+            'max_ms': samples[-1] if samples else 0.0,
+        }
+
+    @contextmanager
+    def measure(self, kind, name):
+        start = time.perf_counter()
+        sql_start = self.sql_seconds()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            sql = self.sql_seconds() - sql_start
+            layout = 0.0
+            if kind == 'build':
+                # Geometry and drawing normally happen later, at idle; do them
+                # now so they are charged to the screen that caused them
+                layout_start = time.perf_counter()
+                self.root.update_idletasks()
+                layout = time.perf_counter() - layout_start
+            self.record(kind, name, seconds, sql, layout, memory_start)
+
+    def record(self, kind, name, seconds, sql, layout, memory_start):
+        memory = tracemalloc.get_traced_memory()[0]
+        widgets = toplevels = None
+        if kind == 'build':
+            widgets = count_widgets(self.root)
+            toplevels = sum(1 for child in self.root.winfo_children()
+                            if child.winfo_class() == 'Toplevel')
+        span = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'kind': kind,
+            'name': name,
+            'ms': seconds * 1000,
+            'sql_ms': sql * 1000,
+            'layout_ms': layout * 1000,
+            'memory_kb': (memory - memory_start) / 1024,
+            'widgets': widgets,
+            'toplevels': toplevels,
+        }
+        self.spans.append(span)
+
+        entry = self.summary.setdefault(name, {'kind': kind, 'calls': 0, 'max_ms': 0.0,
+                                               'first_kb': memory / 1024})
+        entry['calls'] += 1
+        entry['last_ms'] = span['ms']
+        entry['max_ms'] = max(entry['max_ms'], span['ms'])
+        entry['sql_ms'] = span['sql_ms']
+        entry['layout_ms'] = span['layout_ms']
+        # Traced memory after each visit; growth across repeat visits of the
+        # same screen is what a leak looks like
+        entry['last_kb'] = memory / 1024
+        entry['widgets'] = widgets
+        entry['toplevels'] = toplevels
+        self.log(span)
+
+    def log(self, span):
+        try:
+            is_new = not os.path.exists(self.log_file)
+            with open(self.log_file, 'a') as log:
+                if is_new:
+                    log.write("time,kind,name,ms,sql_ms,layout_ms,memory_kb,widgets,toplevels\n")
+                log.write(f"{span['time']},{span['kind']},{span['name']},{span['ms']:.1f},"
+                          f"{span['sql_ms']:.1f},{span['layout_ms']:.1f},{span['memory_kb']:.1f},"
+                          f"{'' if span['widgets'] is None else span['widgets']},"
+                          f"{'' if span['toplevels'] is None else span['toplevels']}\n")
+        except OSError:
+            pass
+
+    def log_lag(self):
+        # Event-loop lag over the probe's recent samples (about a minute) as a
+        # 'lag' row: ms is the 95th percentile, the name carries the maximum
+        stats = self.lag_stats()
+        if stats['samples']:
+            self.log({'time': datetime.now().isoformat(timespec='seconds'), 'kind': 'lag',
+                      'name': f"max {stats['max_ms']:.0f}ms", 'ms': stats['p95_ms'],
+                      'sql_ms': 0.0, 'layout_ms': 0.0, 'memory_kb': 0.0,
+                      'widgets': None, 'toplevels': None})
+        self.last_lag_log = time.perf_counter()
+
+    def overlay_text(self):
+        lag = self.lag_stats()
+        text = f"lag p95 {lag['p95_ms']:.0f} ms, max {lag['max_ms']:.0f} ms"
+        builds = [span for span in self.spans if span['kind'] == 'build']
+        if builds:
+            last = builds[-1]
+            text += (f"  |  {last['name']} {last['ms']:.0f} ms "
+                     f"(sql {last['sql_ms']:.0f}, layout {last['layout_ms']:.0f})"
+                     f"  |  {last['widgets']} widgets, {last['toplevels']} dialogs")
+        text += f"  |  traced {tracemalloc.get_traced_memory()[0] / (1024 * 1024):.1f} MB"
+        return text
+
+    def refresh_overlay(self, generation):
+        if not self.enabled or generation != self.generation:
+            return
+        if self.overlay is None or not self.overlay.winfo_exists():
+            self.overlay = tk.Label(self.root, bg='#2C3E50', fg='#ECF0F1', font=('Consolas', 9),
+                                    padx=8, pady=2)
+            self.overlay.place(relx=1.0, rely=1.0, anchor='se')
+        self.overlay.config(text=self.overlay_text())
+        self.overlay.lift()
+        if time.perf_counter() - self.last_lag_log >= LAG_LOG_SECONDS:
+            self.log_lag()
+        self.root.after(OVERLAY_REFRESH_MS, self.refresh_overlay, generation)
+
+    def top_allocations(self, limit=10):
+        # Source lines that grew the most since metrics were switched on
+        if not self.enabled or self.baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),))
+        return [(str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                for stat in snapshot.compare_to(self.baseline, 'lineno')[:limit]]
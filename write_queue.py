@@ -0,0 +1,242 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from db_schema import connect, upgrade_schema
+
+# The most writes folded into one commit
+MAX_BATCH = 100
+# Batches and writes remembered for the statistics
+STATS_SAMPLES = 1000
+
+
+def percentile(sorted_values, fraction):
+    # Same as load_test.percentile, without importing the load tester at startup
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+class WriteQueue:
+    # Group commit. One writer thread owns the connection and commits as soon
+    # as there is work: a lone write is committed straight away, and writes
+    # queued from other threads while a commit is on its way to disk are run
+    # together in the next transaction, each in its own savepoint so a
+    # failing write is rolled back alone, and committed with a single fsync.
+    # A caller's future resolves only once that COMMIT has returned, so
+    # nothing is reported saved before it is on disk. Work functions must
+    # not commit themselves, except jobs submitted alone.
+    def __init__(self, db_name, max_batch=MAX_BATCH):
+        self.db_name = db_name
+        self.max_batch = max_batch
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.batch_sizes = deque(maxlen=STATS_SAMPLES)
+        self.commit_ms = deque(maxlen=STATS_SAMPLES)
+        self.latency_ms = deque(maxlen=STATS_SAMPLES)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, work, alone=False):
+        # work(conn) runs on the writer thread; returns a Future of its result.
+        # alone=True runs it by itself, outside any transaction, for work that
+        # commits in batches of its own (archiving, merging, pruning); it must
+        # not leave a transaction open.
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise sqlite3.ProgrammingError("write queue is closed")
+            self.pending.append((work, future, time.perf_counter(), alone))
+            self.condition.notify()
+        return future
+
+    def write(self, work, timeout=None):
+        # Blocks until the write is committed; returns work's result or raises its error
+        return self.submit(work).result(timeout)
+
+    def write_alone(self, work, timeout=None):
+        # Same, for work that manages its own transactions
+        return self.submit(work, alone=True).result(timeout)
+
+    def execute(self, sql, params=(), timeout=None):
+        # One statement; returns the cursor's lastrowid
+        return self.write(lambda conn: conn.execute(sql, params).lastrowid, timeout)
+
+    def next_batch(self):
+        # Whatever is queued now, without waiting for more; a job submitted
+        # alone always makes a batch of its own
+        with self.condition:
+            while not self.pending and not self.closed:
+                self.condition.wait()
+            if not self.pending:
+                return None
+            if self.pending[0][3]:
+                return [self.pending.popleft()]
+            batch = []
+            while self.pending and len(batch) < self.max_batch and not self.pending[0][3]:
+                batch.append(self.pending.popleft())
+            return batch
+
+    def run(self):
+        conn = connect(self.db_name)
+        conn.isolation_level = None
+        # FULL: COMMIT doesn't return before the fsync, WAL mode included
+        conn.execute("PRAGMA synchronous = FULL")
+        try:
+            while True:
+                batch = self.next_batch()
+                if batch is None:
+                    break
+                if batch[0][3]:
+                    self.run_alone(conn, batch[0])
+                else:
+                    self.commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def run_alone(self, conn, job):
+        work, future, queued, _ = job
+        try:
+            result = work(conn)
+            if conn.in_transaction:
+                raise sqlite3.ProgrammingError("work submitted alone left a transaction open")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self.condition:
+                self.failed += 1
+            future.set_exception(e)
+            return
+        with self.condition:
+            self.writes += 1
+            self.latency_ms.append((time.perf_counter() - queued) * 1000)
+        future.set_result(result)
+
+    def commit_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for work, future, queued, _ in batch:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    outcomes.append((future, queued, work(conn), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO queued_write")
+                    outcomes.append((future, queued, None, e))
+                conn.execute("RELEASE queued_write")
+            commit_start = time.perf_counter()
+            conn.execute("COMMIT")
+            committed = time.perf_counter()
+        except sqlite3.Error as e:
+            # Nothing in the batch reached the disk
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self.condition:
+                self.failed += len(batch)
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        with self.condition:
+            self.batches += 1
+            self.writes += len(batch)
+            self.batch_sizes.append(len(batch))
+            self.commit_ms.append((committed - commit_start) * 1000)
+            for future, queued, _, error in outcomes:
+                self.latency_ms.append((committed - queued) * 1000)
+                if error:
+                    self.failed += 1
+        for future, _, result, error in outcomes:
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self.condition:
+            sizes = list(self.batch_sizes)
+            commits = sorted(self.commit_ms)
+            latencies = sorted(self.latency_ms)
+            return {
+                'batches': self.batches,
+                'writes': self.writes,
+                'failed': self.failed,
+                'queued': len(self.pending),
+                'avg_batch': sum(sizes) / len(sizes) if sizes else 0.0,
+                'max_batch': max(sizes, default=0),
+                'commit_p50_ms': percentile(commits, 0.50),
+                'commit_p99_ms': percentile(commits, 0.99),
+                'latency_p50_ms': percentile(latencies, 0.50),
+                'latency_p99_ms': percentile(latencies, 0.99),
+            }
+
+    def close(self, timeout=5.0):
+        # Writes already queued are still committed
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+
+if __name__ == "__main__":
+    # Burst of sales from several threads, one commit each vs. group commit,
+    # against a scratch copy of the database
+    import os
+    import shutil
+    import sys
+    import tempfile
+    from datetime import datetime
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'store_inventory.db'
+    writers, per_writer = 8, 50
+    scratch_dir = tempfile.mkdtemp()
+    db_name = os.path.join(scratch_dir, os.path.basename(source))
+    shutil.copyfile(source, db_name)
+
+    conn = connect(db_name)
+    upgrade_schema(conn)
+    conn.commit()
+    product_id = conn.execute("SELECT MIN(id_product) FROM Product").fetchone()[0]
+    customer_id = conn.execute("SELECT MIN(id_customer) FROM Customer").fetchone()[0]
+    conn.close()
+    if product_id is None or customer_id is None:
+        sys.exit("the database needs at least one product and one customer")
+    sql = """
+        INSERT INTO Sale (id_product, id_customer, quantity, total_price, sale_date)
+        VALUES (?, ?, 1, 1.0, ?)
+    """
+
+    def direct():
+        conn = connect(db_name, timeout=30)
+        for _ in range(per_writer):
+            conn.execute(sql, (product_id, customer_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+        conn.close()
+
+    queue = WriteQueue(db_name)
+
+    def queued():
+        for _ in range(per_writer):
+            queue.execute(sql, (product_id, customer_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    try:
+        for label, target in (("commit per write", direct), ("group commit", queued)):
+            threads = [threading.Thread(target=target) for _ in range(writers)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - start
+            print(f"{label}: {writers * per_writer} writes in {seconds:.2f}s "
+                  f"({writers * per_writer / seconds:.0f}/s)")
+        queue.close()
+        print(queue.stats())
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)